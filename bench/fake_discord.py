@@ -0,0 +1,251 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web, WSMsgType
+
+BOT_ID = 1 << 40
+USER_ID = 2 << 40
+HEARTBEAT_INTERVAL = 41250
+
+
+def snowflake(index, offset=0):
+    # Guild ids put the index in the timestamp bits so (id >> 22) % shards spreads them.
+    return (index << 22) | offset
+
+
+def iso_now():
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+
+
+def user_payload(user_id, name, bot=False):
+    return {
+        "id": str(user_id), "username": name, "discriminator": "0", "global_name": name,
+        "avatar": None, "bot": bot, "public_flags": 0, "flags": 0,
+    }
+
+
+def json_response(data, status=200, headers=None):
+    # discord.py only decodes bodies whose content type is exactly "application/json".
+    return web.Response(
+        body=json.dumps(data).encode(), status=status, headers=dict(headers or {}, **{"Content-Type": "application/json"})
+    )
+
+
+class FakeGuild:
+    def __init__(self, index, channels):
+        self.id = snowflake(index + 1, 1)
+        self.channel_ids = [snowflake(index + 1, 2 + i) for i in range(channels)]
+
+    def payload(self):
+        return {
+            "id": str(self.id), "name": f"bench-{self.id}", "icon": None, "owner_id": str(USER_ID),
+            "unavailable": False, "member_count": 2, "large": False, "features": [],
+            "emojis": [], "stickers": [], "members": [], "presences": [], "voice_states": [],
+            "threads": [], "stage_instances": [], "guild_scheduled_events": [],
+            "roles": [{
+                "id": str(self.id), "name": "@everyone", "permissions": "2048", "position": 0,
+                "color": 0, "hoist": False, "managed": False, "mentionable": False, "flags": 0,
+            }],
+            "channels": [{
+                "id": str(channel_id), "type": 0, "name": f"bench-{i}", "position": i,
+                "guild_id": str(self.id), "permission_overwrites": [], "nsfw": False,
+            } for i, channel_id in enumerate(self.channel_ids)],
+            "mfa_level": 0, "verification_level": 0, "explicit_content_filter": 0,
+            "default_message_notifications": 0, "premium_tier": 0, "nsfw_level": 0,
+            "preferred_locale": "en-US", "system_channel_flags": 0, "afk_timeout": 300,
+            "joined_at": iso_now(),
+        }
+
+
+class ShardConnection:
+    def __init__(self, ws):
+        self.ws = ws
+        self.shard = (0, 1)
+        self.sequence = 0
+        self.ready = asyncio.Event()
+
+    async def send(self, op, data=None, event=None):
+        payload = {"op": op, "d": data, "s": None, "t": event}
+        if op == 0:
+            self.sequence += 1
+            payload["s"] = self.sequence
+        await self.ws.send_str(json.dumps(payload))
+
+
+class FakeDiscord:
+    # Just enough of the gateway and REST API for discord.py to log in, receive guilds and
+    # messages, and reply. Every reply is matched against the oldest outstanding command
+    # in its channel to measure dispatch-to-reply latency; a reply with several lines (merged
+    # by the bot's send scheduler) answers that many commands. With ``rate_limit`` =
+    # (limit, seconds) message sends are limited per channel like Discord does, with
+    # X-RateLimit headers on every reply and a 429 once the bucket is empty.
+    def __init__(self, guilds=10, channels=3, shard_count=1, rate_limit=None):
+        self.guilds = [FakeGuild(i, channels) for i in range(guilds)]
+        self.shard_count = shard_count
+        self.connections = []
+        self.message_ids = itertools.count(1)
+        self.pending = defaultdict(deque)
+        self.latencies = []
+        self.replies = 0
+        self.rest_calls = defaultdict(int)
+        self.rate_limit = rate_limit
+        self.buckets = {}
+        self.rate_limited = 0
+        self.messages_sent = 0
+        self.url = None
+        self._runner = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_get("/gateway", self.gateway)
+        app.router.add_route("*", "/api/v10/{path:.*}", self.rest)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        for connection in list(self.connections):
+            await connection.ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def wait_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        while len([c for c in self.connections if c.ready.is_set()]) < self.shard_count:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"only {len(self.connections)}/{self.shard_count} shards identified")
+            await asyncio.sleep(0.05)
+
+    def shard_for(self, guild_id):
+        shard_id = (guild_id >> 22) % self.shard_count
+        for connection in self.connections:
+            if connection.shard[0] == shard_id and connection.ready.is_set():
+                return connection
+        return None
+
+    async def gateway(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        connection = ShardConnection(ws)
+        self.connections.append(connection)
+        await connection.send(10, {"heartbeat_interval": HEARTBEAT_INTERVAL})
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                if data["op"] == 1:
+                    await connection.send(11)
+                elif data["op"] == 2:
+                    await self.identify(connection, data["d"])
+        finally:
+            self.connections.remove(connection)
+        return ws
+
+    async def identify(self, connection, data):
+        connection.shard = tuple(data.get("shard") or (0, 1))
+        shard_id, shard_count = connection.shard
+        guilds = [g for g in self.guilds if (g.id >> 22) % shard_count == shard_id]
+        await connection.send(0, {
+            "v": 10, "user": user_payload(BOT_ID, "bench-bot", bot=True),
+            "guilds": [{"id": str(g.id), "unavailable": True} for g in guilds],
+            "session_id": f"bench-{shard_id}", "resume_gateway_url": self.url.replace("http", "ws", 1) + "/gateway",
+            "shard": [shard_id, shard_count], "application": {"id": str(BOT_ID), "flags": 0},
+        }, "READY")
+        for guild in guilds:
+            await connection.send(0, guild.payload(), "GUILD_CREATE")
+        connection.ready.set()
+
+    async def rest(self, request):
+        path = request.match_info["path"]
+        self.rest_calls[f"{request.method} {path.split('/')[0]}"] += 1
+        if path == "users/@me":
+            return json_response(user_payload(BOT_ID, "bench-bot", bot=True))
+        if path == "oauth2/applications/@me":
+            return json_response({
+                "id": str(BOT_ID), "name": "bench-bot", "description": "", "icon": None,
+                "bot_public": True, "bot_require_code_grant": False, "verify_key": "",
+                "owner": user_payload(USER_ID, "bench-user"), "flags": 0,
+            })
+        if path == "gateway":
+            return json_response({"url": self.url.replace("http", "ws", 1) + "/gateway"})
+        if path == "gateway/bot":
+            return json_response({
+                "url": self.url.replace("http", "ws", 1) + "/gateway", "shards": self.shard_count,
+                "session_start_limit": {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 16},
+            })
+        parts = path.split("/")
+        if request.method == "POST" and len(parts) == 3 and parts[0] == "channels" and parts[2] == "messages":
+            channel_id = int(parts[1])
+            headers = {}
+            if self.rate_limit is not None:
+                headers = self.take_token(channel_id)
+                if headers is None:
+                    reset_after = self.buckets[channel_id][1] - time.monotonic()
+                    return json_response(
+                        {"message": "You are being rate limited.", "retry_after": reset_after, "global": False}, 429,
+                        self.rate_limit_headers(channel_id, reset_after, Via="1.1 bench", **{"Retry-After": f"{reset_after:.3f}"}),
+                    )
+            body = await request.json() if request.content_type == "application/json" else {}
+            content = body.get("content") or ""
+            pending = self.pending[channel_id]
+            now = time.perf_counter()
+            for _ in range(min(len(pending), content.count("\n") + 1)):
+                self.latencies.append(now - pending.popleft())
+            self.replies += content.count("\n") + 1
+            self.messages_sent += 1
+            return json_response(self.message(channel_id, None, BOT_ID, content, bot=True), headers=headers)
+        return json_response({})
+
+    def take_token(self, channel_id):
+        # Rate limit headers for an allowed send, None when the channel's bucket is empty.
+        limit, period = self.rate_limit
+        now = time.monotonic()
+        bucket = self.buckets.get(channel_id)
+        if bucket is None or now >= bucket[1]:
+            bucket = self.buckets[channel_id] = [limit, now + period]
+        if bucket[0] <= 0:
+            self.rate_limited += 1
+            return None
+        bucket[0] -= 1
+        return self.rate_limit_headers(channel_id, bucket[1] - now)
+
+    def rate_limit_headers(self, channel_id, reset_after, **extra):
+        limit, _ = self.rate_limit
+        return dict({
+            "X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": str(max(0, self.buckets[channel_id][0])),
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}", "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+            "X-RateLimit-Bucket": "bench-messages",
+        }, **extra)
+
+    def message(self, channel_id, guild_id, author_id, content, bot=False):
+        data = {
+            "id": str(snowflake(int(time.time() * 1000) - 1420070400000, next(self.message_ids) & 0x3FFFFF)),
+            "channel_id": str(channel_id), "content": content, "timestamp": iso_now(),
+            "edited_timestamp": None, "tts": False, "mention_everyone": False, "mentions": [],
+            "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0,
+            "author": user_payload(author_id, "bench-bot" if bot else "bench-user", bot=bot),
+        }
+        if guild_id is not None:
+            data["guild_id"] = str(guild_id)
+            data["member"] = {"roles": [], "joined_at": iso_now(), "deaf": False, "mute": False, "flags": 0}
+        return data
+
+    async def send_message(self, guild, channel_id, content, expects_reply):
+        connection = self.shard_for(guild.id)
+        if connection is None:
+            return False
+        if expects_reply:
+            self.pending[channel_id].append(time.perf_counter())
+        await connection.send(0, self.message(channel_id, guild.id, USER_ID, content), "MESSAGE_CREATE")
+        return True
+
+    def unanswered(self):
+        return sum(len(pending) for pending in self.pending.values())
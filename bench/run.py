@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from supervisor import BotSupervisor
+from bench.fake_discord import FakeDiscord
+from utils.ipc import LOG, STARTUP, EXIT
+from utils.msglog import MODES
+from utils.procstats import process_stats
+from utils.profiles import CACHE_PROFILES
+
+PREFIX = "!"
+DEFAULT_MIX = "!ping=5,!testing=1,hello there=10"
+SAMPLE_INTERVAL = 0.5
+COMPARED = ("events_per_s", "replies_per_s", "p50_ms", "p99_ms", "cpu_percent", "rss_peak_mb")
+
+
+def parse_mix(spec):
+    # "!ping=5,hello=10" -> contents and weights. Only prefixed entries are expected to reply.
+    contents, weights = [], []
+    for item in spec.split(","):
+        content, _, weight = item.rpartition("=")
+        if not content:
+            content, weight = weight, "1"
+        contents.append(content)
+        weights.append(float(weight))
+    return contents, weights
+
+
+def parse_rate_limit(spec):
+    # "5/5" -> 5 messages per 5 seconds per channel; None or "" -> unlimited.
+    if not spec:
+        return None
+    limit, _, period = spec.partition("/")
+    return int(limit), float(period or 1)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.processes = max(1, args.processes)
+        self.shard_count = max(args.shards, self.processes if self.processes > 1 else 1)
+        self.fake = FakeDiscord(args.guilds, args.channels, self.shard_count, parse_rate_limit(args.rate_limit))
+        self.supervisor = None
+        self.startup = []
+        self.errors = []
+        self.rss_peak = 0
+
+    def options(self):
+        options = {
+            "endpoint": self.fake.url, "processes": self.processes, "message_log": {"mode": self.args.message_log},
+            "send_scheduler": not self.args.no_send_scheduler, "cache_profile": self.args.cache_profile,
+        }
+        if self.shard_count > 1:
+            options.update(sharded=True, shard_count=self.shard_count)
+        if self.args.cog_concurrency:
+            options["cog_concurrency"] = self.args.cog_concurrency
+        return options
+
+    def pids(self):
+        return [w.process.pid for w in self.supervisor.workers if w.process is not None and w.process.is_alive()]
+
+    def cpu_seconds(self):
+        stats = [process_stats(pid) for pid in self.pids()]
+        if not stats or None in stats:
+            return None
+        return sum(cpu for cpu, _ in stats)
+
+    async def drain(self):
+        # The bot blocks once its pipe fills up, so keep reading it for the whole run.
+        while True:
+            for worker, kind, payload in self.supervisor.poll(1000):
+                if kind == LOG:
+                    self.errors.extend(f"{source}: {text}" for _, level, source, text in payload if level == "ERROR")
+                elif kind == STARTUP:
+                    self.startup.append(payload["total_ms"])
+                elif kind == EXIT:
+                    self.errors.append(f"worker {worker.index} exited with code {payload['exitcode']}")
+            await asyncio.sleep(0.02)
+
+    async def sample(self):
+        while True:
+            stats = [process_stats(pid) for pid in self.pids()]
+            if stats and None not in stats:
+                self.rss_peak = max(self.rss_peak, sum(rss for _, rss in stats))
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    async def replay(self, duration, rng):
+        contents, weights = parse_mix(self.args.mix)
+        guilds = self.fake.guilds
+        sent = 0
+        started = time.perf_counter()
+        while True:
+            elapsed = time.perf_counter() - started
+            if elapsed >= duration:
+                return sent, elapsed
+            # Catch up on whatever is due in one burst so sleep granularity does not cap the rate.
+            due = int(elapsed * self.args.rate) - sent
+            for content in rng.choices(contents, weights, k=due):
+                guild = guilds[sent % len(guilds)]
+                await self.fake.send_message(guild, rng.choice(guild.channel_ids), content, content.startswith(PREFIX))
+                sent += 1
+            await asyncio.sleep(0.005)
+
+    async def run(self):
+        args = self.args
+        rng = random.Random(args.seed)
+        await self.fake.start()
+        self.supervisor = BotSupervisor("bench.token.value", self.options())
+        self.supervisor.start()
+        tasks = [asyncio.create_task(self.drain()), asyncio.create_task(self.sample())]
+        try:
+            await self.fake.wait_ready(args.ready_timeout)
+            if args.warmup:
+                await self.replay(args.warmup, rng)
+                await self.settle(args.drain)
+            self.fake.latencies.clear()
+            self.fake.pending.clear()
+            replies = self.fake.replies
+            rate_limited, messages_sent = self.fake.rate_limited, self.fake.messages_sent
+            cpu_before, wall_before = self.cpu_seconds(), time.perf_counter()
+            sent, elapsed = await self.replay(args.duration, rng)
+            await self.settle(args.drain)
+            cpu_after, wall = self.cpu_seconds(), time.perf_counter() - wall_before
+            latencies = self.fake.latencies
+            return {
+                "guilds": args.guilds, "shards": self.shard_count, "processes": self.processes,
+                "rate": args.rate, "message_log": args.message_log, "duration_s": round(elapsed, 3), "mix": args.mix,
+                "events": sent, "events_per_s": round(sent / elapsed, 1),
+                "replies": self.fake.replies - replies,
+                "replies_per_s": round((self.fake.replies - replies) / wall, 1),
+                "unanswered": self.fake.unanswered(),
+                "messages_sent": self.fake.messages_sent - messages_sent,
+                "rate_limited": self.fake.rate_limited - rate_limited,
+                "rate_limit": args.rate_limit, "send_scheduler": not args.no_send_scheduler,
+                "cache_profile": args.cache_profile,
+                "p50_ms": self.ms(percentile(latencies, 0.50)),
+                "p99_ms": self.ms(percentile(latencies, 0.99)),
+                "max_ms": self.ms(max(latencies, default=None)),
+                "cpu_percent": None if cpu_before is None or cpu_after is None else round((cpu_after - cpu_before) / wall * 100, 1),
+                "rss_peak_mb": round(self.rss_peak / 2**20, 1) if self.rss_peak else None,
+                "startup_ms": [round(ms, 1) for ms in self.startup],
+                "errors": self.errors[:20],
+            }
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.supervisor.stop()
+            await self.fake.stop()
+
+    async def settle(self, timeout):
+        deadline = time.perf_counter() + timeout
+        while self.fake.unanswered() and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+
+    @staticmethod
+    def ms(seconds):
+        return None if seconds is None else round(seconds * 1000, 3)
+
+
+def report(result, baseline=None):
+    print(f"{result['events']} events over {result['duration_s']} s "
+          f"({result['guilds']} guilds, {result['shards']} shards, {result['processes']} processes)")
+    for key in COMPARED + ("max_ms", "replies", "messages_sent", "rate_limited", "unanswered"):
+        line = f"  {key:<14} {result[key] if result.get(key) is not None else 'n/a'}"
+        old = (baseline or {}).get(key)
+        if old and result.get(key) is not None:
+            line += f"  (baseline {old}, {(result[key] - old) / old * 100:+.1f}%)"
+        print(line)
+    if result["errors"]:
+        print("Errors:")
+        for error in result["errors"]:
+            print(f"  {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Replay synthetic traffic through bot_core against a local Discord stand-in.")
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--channels", type=int, default=3, help="text channels per guild")
+    parser.add_argument("--rate", type=float, default=200, help="messages per second")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--drain", type=float, default=5, help="seconds to wait for outstanding replies")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma separated content=weight; prefixed entries must reply")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--cog-concurrency", type=int, default=0)
+    parser.add_argument("--rate-limit", metavar="N/SECONDS", help="limit message sends per channel, e.g. 5/5 like Discord")
+    parser.add_argument("--no-send-scheduler", action="store_true", help="send replies directly instead of through bot.sender")
+    parser.add_argument("--cache-profile", choices=list(CACHE_PROFILES), default="balanced", help="gateway cache profile in the bot")
+    parser.add_argument("--message-log", choices=MODES, default="all", help="message log policy in the bot")
+    parser.add_argument("--ready-timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the result to this file")
+    parser.add_argument("--baseline", help="compare against a result written with --json")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(Benchmark(args).run())
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(result, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    return 1 if result["unanswered"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
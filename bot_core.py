@@ -1,72 +1,397 @@
-import discord
-from discord.ext import commands
+import ast
 import os
-import multiprocessing
+import signal
 import sys
-import io
 import logging
-import queue
 import asyncio
+import threading
+import time
+from utils.ipc import Channel, RecordBatcher, ACK, COMMAND, STARTUP, SHARD, METRICS, LOG_FLUSH_INTERVAL, LOG_FLUSH_SIZE
+from utils import cache
+from utils.memreport import memory_report
+from utils.metrics import BotMetrics
+from utils.msglog import MessageLogPolicy
+from utils.sender import SendScheduler
+from utils.storage import Storage
+from utils.profiler import DEFAULT_INTERVAL, SamplingProfiler
+from utils.procstats import process_stats
+from utils.profiles import CACHE_PROFILES, COG_LOAD_CONCURRENCY
+from utils.cogindex import CogIndex
+
+METRICS_INTERVAL = 2.0
+LOOP_LAG_INTERVAL = 0.1
+COMMAND_PREFIX = "!"
+SUPPRESSED_SUMMARY_INTERVAL = 10.0
 
 bot = None
-process = None
+message_log = None
+cache_profile = None
+profiler = SamplingProfiler()
+cog_index = CogIndex("cogs")
+
+class ChannelLogHandler(logging.Handler):
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+
+    def emit(self, record):
+        try:
+            self.records.add(record.levelname, record.name, record.getMessage())
+        except Exception:
+            self.handleError(record)
+
+class ChannelWriter:
+    # Stands in for sys.stdout in the bot process so print() output from cogs reaches the manager.
+    def __init__(self, records, level="INFO", source="stdout"):
+        self.records = records
+        self.level = level
+        self.source = source
+        self._buffer = ""
+
+    def write(self, data):
+        self._buffer += data
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            if line:
+                self.records.add(self.level, self.source, line)
+        return len(data)
+
+    def flush(self):
+        pass
+
+async def flush_records(records):
+    while True:
+        await asyncio.sleep(0 if len(records) >= LOG_FLUSH_SIZE else LOG_FLUSH_INTERVAL)
+        records.flush()
+
+async def send_metrics(metrics, bot_channel):
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL)
+        bot_channel.send(METRICS, metrics.snapshot())
+
+async def measure_loop_lag(metrics):
+    # How late a timer fires is how long other callbacks held the loop.
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        metrics.loop_lag.record(max(0.0, time.perf_counter() - started - LOOP_LAG_INTERVAL) * 1000)
+
+async def report_suppressed(records):
+    while True:
+        await asyncio.sleep(SUPPRESSED_SUMMARY_INTERVAL)
+        suppressed = message_log.take_suppressed()
+        if suppressed:
+            records.add("INFO", "discord.client", f"{suppressed} messages suppressed by the message log rate limit")
+
+def command_key(ctx):
+    return (ctx.cog.qualified_name if ctx.cog else "-", ctx.command.qualified_name)
+
+async def handle_command(message, bot_channel):
+    op = message["op"]
+    name = message.get("name")
+    started = time.perf_counter()
+    ack = {"id": message["id"], "op": op, "name": name, "ok": True, "error": None, "data": None}
+    try:
+        if op == "reload":
+            # Cached results may come from code that is being replaced.
+            cache.registry.wipe(f"cogs.{name}")
+            await bot.reload_extension(f"cogs.{name}")
+        elif op == "load":
+            await bot.load_extension(f"cogs.{name}")
+        elif op == "unload":
+            cache.registry.wipe(f"cogs.{name}")
+            await bot.unload_extension(f"cogs.{name}")
+        elif op == "status":
+            ack["data"] = {
+                "user": str(bot.user) if bot.user else None,
+                "guilds": len(bot.guilds),
+                "latency": bot.latency,
+                "extensions": sorted(bot.extensions),
+            }
+        elif op == "ping":
+            pass
+        elif op == "memory":
+            stats = process_stats(os.getpid())
+            ack["data"] = memory_report(bot, stats[1] if stats else None, cache.registry.stats(), cache_profile)
+        elif op == "profile":
+            # Runs on the event loop thread, which is the one the profiler samples.
+            if message["args"]["action"] == "start":
+                profiler.start(message["args"].get("interval") or DEFAULT_INTERVAL)
+            else:
+                ack["data"] = profiler.stop()
+        elif op == "log_policy":
+            message_log.configure(**message["args"])
+            ack["data"] = message_log.settings()
+        elif op == "shutdown":
+            await bot.close()
+        else:
+            raise ValueError(f"Unknown command {op}")
+    except Exception as e:
+        ack["ok"] = False
+        ack["error"] = str(e)
+    ack["ms"] = (time.perf_counter() - started) * 1000
+    bot_channel.send(ACK, ack)
+
+def read_cog_requires(path):
+    # A cog can declare ``REQUIRES = ["other_cog"]`` at module level to be loaded after those cogs.
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError, ValueError):
+        return []
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == "REQUIRES" for t in node.targets):
+            try:
+                return [str(name) for name in ast.literal_eval(node.value)]
+            except (ValueError, TypeError):
+                return []
+    return []
+
+def find_cycles(requires):
+    in_cycle = set()
+    visiting, visited = [], set()
+    def visit(name):
+        if name in visiting:
+            in_cycle.update(visiting[visiting.index(name):])
+            return
+        if name in visited:
+            return
+        visiting.append(name)
+        for dep in requires.get(name, ()):
+            visit(dep)
+        visiting.pop()
+        visited.add(name)
+    for name in requires:
+        visit(name)
+    return in_cycle
+
+async def load_cogs(names, records, concurrency=COG_LOAD_CONCURRENCY):
+    # Loads extensions concurrently (at most ``concurrency`` at a time), each one waiting
+    # for the cogs it REQUIRES. Returns (name, ms, ok, error) for every cog.
+    requires = {}
+    for name in names:
+        deps = read_cog_requires(cog_index.source(name))
+        missing = [dep for dep in deps if dep not in names]
+        if missing:
+            records.add("WARNING", "discord.ext.commands.bot", f"Cog {name} requires missing cogs: {', '.join(missing)}")
+        requires[name] = [dep for dep in deps if dep in names]
+    for name in find_cycles(requires):
+        records.add("WARNING", "discord.ext.commands.bot", f"Cog {name} is part of a dependency cycle; ignoring its REQUIRES")
+        requires[name] = []
+
+    loaded = {name: asyncio.Event() for name in names}
+    failed = set()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results = []
+
+    async def load(name):
+        elapsed = 0.0
+        try:
+            for dep in requires[name]:
+                await loaded[dep].wait()
+            broken = [dep for dep in requires[name] if dep in failed]
+            if broken:
+                raise Exception(f"required cog {', '.join(broken)} failed to load")
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    await bot.load_extension(f"cogs.{name}")
+                finally:
+                    elapsed = (time.perf_counter() - started) * 1000
+            results.append((name, elapsed, True, None))
+            records.add("INFO", "discord.ext.commands.bot", f"Loaded cog {name} in {elapsed:.1f} ms")
+        except Exception as e:
+            failed.add(name)
+            results.append((name, elapsed, False, str(e)))
+            records.add("ERROR", "discord.ext.commands.bot", f"Failed to load cog {name}: {str(e)}")
+        finally:
+            loaded[name].set()
+
+    await asyncio.gather(*(load(name) for name in names))
+    return results
+
+def listen_for_commands(bot_channel, loop):
+    while True:
+        message = bot_channel.recv()
+        if message is None:
+            asyncio.run_coroutine_threadsafe(bot.close(), loop)
+            return
+        kind, payload = message
+        if kind == COMMAND:
+            asyncio.run_coroutine_threadsafe(handle_command(payload, bot_channel), loop)
+
+async def bot_main(token, bot_channel, options=None):
+    # discord.py is only imported here, in the bot process, to keep the manager's startup light.
+    import discord
+    import yarl
+    from discord.ext import commands
+    global bot, message_log, cache_profile
+    options = options or {}
+    if options.get("endpoint"):
+        # Point REST and the gateway at a local stand-in (see bench/).
+        endpoint = options["endpoint"].rstrip("/")
+        discord.http.Route.BASE = f"{endpoint}/api/v10"
+        discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(endpoint.replace("http", "ws", 1) + "/gateway")
+    # Checked by the daemon before launch.
+    cache_profile = options.get("cache_profile") or "balanced"
+    gateway = gateway_settings(discord, CACHE_PROFILES[cache_profile])
+    metrics = BotMetrics()
+    metrics.caches = cache.registry.stats
+    # Cogs send through bot.sender; with the scheduler off it passes sends straight through
+    # but still counts them and any 429s.
+    sender = SendScheduler(metrics.sender, enabled=options.get("send_scheduler", True))
+    if options.get("sharded"):
+        bot = commands.AutoShardedBot(
+            command_prefix=COMMAND_PREFIX, http_trace=sender.trace_config(),
+            shard_count=options.get("shard_count"), shard_ids=options.get("shard_ids"), **gateway,
+        )
+    else:
+        bot = commands.Bot(command_prefix=COMMAND_PREFIX, http_trace=sender.trace_config(), **gateway)
+    bot.sender = sender
+    bot.storage = Storage(options.get("storage_path") or os.path.join("data", "bot.db"))
+    bot.storage.start()
+
+    records = RecordBatcher(bot_channel)
+    handler = ChannelLogHandler(records)
+    handler.setLevel(logging.INFO)
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.INFO)
 
-async def bot_main(token, log_queue):
-    global bot
-    intents = discord.Intents.default()
-    intents.message_content = True
-    bot = commands.Bot(command_prefix="!", intents=intents)
-    
-    logging.basicConfig(level=logging.INFO)
-    logger = logging.getLogger('discord')
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
-    logger.addHandler(handler)
-    
     original_stdout = sys.stdout
-    sys.stdout = io.StringIO()
-    
+    sys.stdout = ChannelWriter(records)
+    flusher = asyncio.create_task(flush_records(records))
+    message_log = MessageLogPolicy(COMMAND_PREFIX, **options.get("message_log", {}))
+    metric_tasks = [
+        asyncio.create_task(send_metrics(metrics, bot_channel)),
+        asyncio.create_task(measure_loop_lag(metrics)),
+        asyncio.create_task(report_suppressed(records)),
+    ]
+    threading.Thread(target=listen_for_commands, args=(bot_channel, asyncio.get_running_loop()), daemon=True).start()
+    # The supervisor stops workers with SIGTERM. Closing the bot instead of dying lets the
+    # finally block below commit storage writes, flush logs and send the last metrics.
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(bot.close()))
+
     @bot.event
     async def on_ready():
-        log_queue.put(f"INFO discord.client Connected as {bot.user}")
-    
+        records.add("INFO", "discord.client", f"Connected as {bot.user}")
+
+    def shard_status(shard_id, state):
+        shard_id = shard_id if shard_id is not None else (bot.shard_id or 0)
+        bot_channel.send(SHARD, {"shard": shard_id, "state": state, "guilds": len(bot.guilds)})
+
+    @bot.event
+    async def on_shard_connect(shard_id):
+        shard_status(shard_id, "connecting")
+
+    @bot.event
+    async def on_shard_ready(shard_id):
+        shard_status(shard_id, "ready")
+
+    @bot.event
+    async def on_shard_resumed(shard_id):
+        shard_status(shard_id, "ready")
+
+    @bot.event
+    async def on_shard_disconnect(shard_id):
+        shard_status(shard_id, "disconnected")
+
+    def shard_listener(state):
+        async def listener():
+            shard_status(None, state)
+        return listener
+
+    if not options.get("sharded"):
+        for event, state in (("on_connect", "connecting"), ("on_ready", "ready"), ("on_resumed", "ready"), ("on_disconnect", "disconnected")):
+            bot.add_listener(shard_listener(state), event)
+
     @bot.event
     async def on_message(message):
-        log_queue.put(f"INFO discord.client {message.author}: {message.content}")
+        if message_log.allow(message.content):
+            records.add("INFO", "discord.client", f"{message.author}: {message.content}")
         await bot.process_commands(message)
-    
+
+    @bot.before_invoke
+    async def start_command_timer(ctx):
+        ctx.metrics_started = time.perf_counter()
+
+    @bot.after_invoke
+    async def record_command(ctx):
+        # Runs whether the command body returned or raised.
+        metrics.record_command(*command_key(ctx), (time.perf_counter() - ctx.metrics_started) * 1000, ctx.command_failed)
+
     @bot.event
     async def on_command_error(ctx, error):
-        log_queue.put(f"ERROR discord.ext.commands.bot {error}")
-    
-    for file in os.listdir("cogs"):
-        if file.endswith(".py"):
-            try:
-                cog_name = file[:-3]
-                await bot.load_extension(f"cogs.{cog_name}")
-                log_queue.put(f"INFO discord.ext.commands.bot Loaded cog {cog_name}")
-            except Exception as e:
-                log_queue.put(f"ERROR discord.ext.commands.bot Failed to load cog {file}: {str(e)}")
-    
-    await bot.start(token)
-    
-    sys.stdout = original_stdout
-
-def start_bot(token, log_queue):
-    global process
-    process = multiprocessing.Process(target=lambda: asyncio.run(bot_main(token, log_queue)))
-    process.start()
-
-def stop_bot():
-    global process
-    if process:
-        process.terminate()
-        process = None
-
-def reload_cog(cog_name):
-    global bot
-    if bot:
-        try:
-            asyncio.run_coroutine_threadsafe(bot.reload_extension(f"cogs.{cog_name}"), bot.loop)
-        except Exception as e:
-            raise Exception(f"Failed to reload cog {cog_name}: {str(e)}")
\ No newline at end of file
+        if ctx.command is not None and not hasattr(ctx, "metrics_started"):
+            metrics.record_error(*command_key(ctx))
+        records.add("ERROR", "discord.ext.commands.bot", str(error))
+
+    concurrency = options.get("cog_concurrency", COG_LOAD_CONCURRENCY)
+    started = time.perf_counter()
+    cog_index.refresh()
+    names = cog_index.extensions()
+    if options.get("cogs") is not None:
+        # A bot can be limited to a subset of cogs/; names that do not exist are reported.
+        for name in sorted(set(options["cogs"]) - set(names)):
+            records.add("WARNING", "discord.ext.commands.bot", f"Cog {name} not found in cogs/")
+        names = [name for name in names if name in options["cogs"]]
+    results = await load_cogs(names, records, concurrency)
+    bot_channel.send(STARTUP, {
+        "cogs": results,
+        "total_ms": (time.perf_counter() - started) * 1000,
+        "concurrency": concurrency,
+    })
+
+    # Exit code 1 asks the supervisor for a restart; a rejected token or a shutdown does not.
+    exit_code = 0
+    try:
+        await bot.start(token)
+    except discord.LoginFailure as e:
+        records.add("ERROR", "discord.client", f"Bot stopped: {str(e)}")
+    except Exception as e:
+        records.add("ERROR", "discord.client", f"Bot stopped: {str(e)}")
+        exit_code = 1
+    finally:
+        if not bot.is_closed():
+            await bot.close()
+        flusher.cancel()
+        sender.close()
+        if profiler.running:
+            profiler.stop()
+        await bot.storage.close()
+        for task in metric_tasks:
+            task.cancel()
+        bot_channel.send(METRICS, metrics.snapshot())
+        records.flush()
+        sys.stdout = original_stdout
+    return exit_code
+
+def gateway_settings(discord, profile):
+    # Bot keyword arguments for one of utils.profiles.CACHE_PROFILES.
+    intents = discord.Intents.default()
+    intents.message_content = True
+    for flag in profile["intents_on"]:
+        setattr(intents, flag, True)
+    for flag in profile["intents_off"]:
+        if hasattr(intents, flag):
+            setattr(intents, flag, False)
+    if profile["member_cache"] is None:
+        member_cache = discord.MemberCacheFlags.from_intents(intents)
+    else:
+        member_cache = discord.MemberCacheFlags.none()
+        for flag in profile["member_cache"]:
+            setattr(member_cache, flag, True)
+    return {
+        "intents": intents, "max_messages": profile["max_messages"], "member_cache_flags": member_cache,
+        "chunk_guilds_at_startup": profile["chunk_guilds"],
+    }
+
+def run_bot(token, conn, options=None):
+    # A forked worker inherits the daemon's signal setup; without this a SIGTERM for the
+    # worker would also wake the daemon's event loop as if it were meant for the daemon.
+    # bot_main installs its own SIGTERM handler on the worker's loop.
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    if options and options.get("nice"):
+        os.nice(options["nice"])
+    sys.exit(asyncio.run(bot_main(token, Channel(conn), options)))
@@ -0,0 +1,166 @@
+import argparse
+import os
+import sys
+import time
+
+from utils.logbuffer import LogEntry, format_entry
+from utils.memreport import format_memory_report
+from utils.profiler import format_summary
+from utils.profiles import CACHE_PROFILES, load_bot_profiles, parse_tokens
+from utils.rpc import DEFAULT_ADDRESS, RpcClient, RpcError, connect_or_spawn
+
+# Command line front-end for daemon.py: python botctl.py status | start NAME | stop NAME | ...
+TOKEN_FILE = "token.enc"
+SEARCH_LEVELS = {"warning": ["WARNING", "ERROR", "CRITICAL"], "error": ["ERROR", "CRITICAL"], "info": ["INFO"]}
+
+def format_bots(status, profiles):
+    stats = {entry["name"]: entry for entry in status["bots"]}
+    lines = [f"{'Bot':<16} {'state':<10} {'procs':>5} {'CPU%':>5} {'MB':>6} {'rst':>3} {'uptime':>8}"]
+    for name in list(profiles) + sorted(stats.keys() - profiles.keys()):
+        entry = stats.get(name)
+        if entry is None:
+            lines.append(f"{name[:16]:<16} {'stopped':<10}")
+            continue
+        cpu = "-" if entry["cpu_percent"] is None else f"{entry['cpu_percent']:.0f}"
+        rss = "-" if entry["rss"] is None else f"{entry['rss'] / 2**20:.0f}"
+        uptime = "-" if entry["uptime"] is None else f"{entry['uptime']:.0f}s"
+        lines.append(
+            f"{name[:16]:<16} {entry['state']:<10} {entry['alive']:>2}/{entry['processes']:<2} {cpu:>5} {rss:>6} "
+            f"{entry['restarts']:>3} {uptime:>8}"
+        )
+    ready = sum(1 for _, _, state in status["shards"] if state == "ready")
+    lines.append(f"Cogs: {status['cogs']} | Shards ready: {ready}/{len(status['shards'])} | Hot reload: {'on' if status['hot_reload'] else 'off'}")
+    return "\n".join(lines)
+
+def read_token(name, token_env):
+    # From an environment variable, or the encrypted token file after a password prompt.
+    if token_env:
+        token = os.environ.get(token_env)
+        if not token:
+            raise SystemExit(f"{token_env} is not set")
+        return token
+    if not os.path.exists(TOKEN_FILE):
+        raise SystemExit(f"No {TOKEN_FILE}; save a token in the manager or pass --token-env")
+    import getpass
+    from utils.encrypt import KeySession
+    password = getpass.getpass("Master password: ")
+    try:
+        tokens = parse_tokens(KeySession(TOKEN_FILE).unlock(password), name)
+    except Exception:
+        raise SystemExit("Invalid master password or corrupted token file")
+    if name not in tokens:
+        raise SystemExit(f"No token stored for {name}")
+    return tokens[name]
+
+def print_entries(records):
+    for record in records:
+        print(format_entry(LogEntry(*record)), flush=True)
+
+def follow_logs(address, history):
+    # Streams until interrupted; the bots are not affected when this client goes away.
+    closed = []
+    client = RpcClient(
+        address, on_close=lambda: closed.append(True),
+        on_event=lambda event, data: print_entries(data) if event == "log" else
+        print(f"... {data} log lines skipped", flush=True) if event == "dropped" else None,
+    )
+    try:
+        client.request("subscribe", history=history)
+        while not closed:
+            time.sleep(0.2)
+        print("Daemon connection closed", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        client.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python botctl.py", description="Control the bot daemon.")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="daemon socket path, or host:port")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="list bots and their state")
+    start = commands.add_parser("start", help="start a bot; the daemon is started when needed")
+    start.add_argument("name")
+    start.add_argument("--token-env", metavar="VAR", help="read the token from this environment variable")
+    start.add_argument("--cache-profile", choices=list(CACHE_PROFILES), help="override the bot's gateway cache profile for this launch")
+    commands.add_parser("stop", help="stop a bot").add_argument("name")
+    commands.add_parser("reload", help="reload changed cogs").add_argument("name", nargs="?")
+    commands.add_parser("memory", help="break a bot's memory down by cache").add_argument("name")
+    profile = commands.add_parser("profile", help="start or stop the sampling profiler in a bot")
+    profile.add_argument("name")
+    profile.add_argument("action", choices=("start", "stop"))
+    profile.add_argument("--interval", type=float, default=10, metavar="MS", help="sampling interval (start)")
+    profile.add_argument("--top", type=int, default=15, help="rows per section (stop)")
+    logs = commands.add_parser("logs", help="print recent log lines")
+    logs.add_argument("-n", "--lines", type=int, default=100)
+    logs.add_argument("-f", "--follow", action="store_true", help="keep streaming new lines")
+    search = commands.add_parser("search", help="search the stored logs")
+    search.add_argument("--level", choices=sorted(SEARCH_LEVELS))
+    search.add_argument("--source")
+    search.add_argument("--keyword")
+    search.add_argument("--since", type=float, metavar="SECONDS", help="only the last SECONDS")
+    search.add_argument("--limit", type=int, default=1000)
+    commands.add_parser("hot-reload", help="turn hot reload on or off").add_argument("state", choices=("on", "off"))
+    commands.add_parser("shutdown", help="stop every bot and the daemon")
+    args = parser.parse_args(argv)
+
+    if args.command == "logs" and args.follow:
+        return follow_logs(args.address, args.lines)
+    try:
+        client = connect_or_spawn(args.address) if args.command == "start" else RpcClient(args.address)
+    except (OSError, RpcError) as e:
+        print(f"Bot daemon not reachable at {args.address}: {e}", file=sys.stderr)
+        return 1
+    try:
+        profiles = load_bot_profiles()
+        if args.command == "status":
+            print(format_bots(client.request("status"), profiles))
+        elif args.command == "start":
+            if args.name not in profiles:
+                print(f"No bot named {args.name}; add it in the manager first", file=sys.stderr)
+                return 1
+            token = read_token(args.name, args.token_env)
+            options = dict(profiles[args.name])
+            if args.cache_profile:
+                options["cache_profile"] = args.cache_profile
+            print(format_bots(client.request("start", name=args.name, token=token, options=options), profiles))
+        elif args.command == "stop":
+            print(format_bots(client.request("stop", name=args.name), profiles))
+        elif args.command == "reload":
+            changes = client.request("reload", name=args.name)
+            print(", ".join(f"{op} {', '.join(names)}" for op, names in changes.items() if names) or "No cog changes")
+        elif args.command == "memory":
+            for index, report in client.request("memory", name=args.name):
+                print("\n".join(format_memory_report(args.name, index, report)) if report else f"{args.name} w{index}: no answer")
+        elif args.command == "profile":
+            result = client.request("profile", name=args.name, action=args.action, interval=args.interval / 1000, top=args.top)
+            if args.action == "start":
+                print(f"Profiling {args.name}; run 'profile {args.name} stop' for the results")
+            else:
+                print("\n".join(format_summary(args.name, result)))
+        elif args.command == "logs":
+            records = []
+            client.on_event = lambda event, data: records.extend(data) if event == "log" else None
+            client.request("subscribe", history=args.lines)
+            print_entries(records)
+        elif args.command == "search":
+            result = client.request(
+                "search", levels=SEARCH_LEVELS.get(args.level), source=args.source, keyword=args.keyword,
+                since=time.time() - args.since if args.since else None, limit=args.limit,
+            )
+            print_entries(result["entries"])
+            print(f"{len(result['entries'])} matches, {result['blocks_read']}/{result['blocks_total']} blocks read in {result['ms']:.0f} ms", file=sys.stderr)
+        elif args.command == "hot-reload":
+            client.request("hot_reload", enabled=args.state == "on")
+        elif args.command == "shutdown":
+            client.request("shutdown")
+    except RpcError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,9 @@ class Ping(commands.Cog):
     
     @commands.command()
     async def ping(self, ctx):
-        await ctx.send("Pong!")
+        # Goes through the bot's send scheduler; replies queued behind a rate limit are
+        # merged into one message instead of each waiting for its own slot.
+        await self.bot.sender.send(ctx, "Pong!", merge=True)
 
 async def setup(bot):
-    await bot.add_cog(Ping(bot))
\ No newline at end of file
+    await bot.add_cog(Ping(bot))
@@ -0,0 +1,540 @@
+import argparse
+import asyncio
+import functools
+import hmac
+import json
+import os
+import signal
+import sys
+import time
+from collections import Counter
+
+from supervisor import BotFleet
+from utils.cogindex import CogIndex
+from utils.file_tools import save_file
+from utils.ipc import LOG, ACK, STARTUP, SHARD, EXIT, METRICS, HEALTH
+from utils.logbuffer import LogEntry, RingBuffer
+from utils.logstore import LogStore
+from utils.metrics import MetricsSummary, MetricsServer, render_prometheus, encode_snapshot
+from utils.profiler import collapsed_lines, summarize
+from utils.profiles import CACHE_PROFILES, load_bot_profiles
+from utils.rpc import DEFAULT_ADDRESS, MAX_FRAME, RpcClient, encode, load_secret, tcp_address
+from utils.watcher import CogHashes, CogWatcher
+
+PUMP_MIN_INTERVAL = 0.01
+PUMP_MAX_INTERVAL = 0.1
+LOG_BATCH_SIZE = 5000
+HISTORY_SIZE = 2000
+STATUS_INTERVAL = 1.0
+CLIENT_BUFFER_LIMIT = 8 * 2**20
+LOG_DIRECTORY = "logs"
+METRICS_PORT = 9464
+REPORT_TIMEOUT = 10.0
+PROFILE_DIRECTORY = "profiles"
+
+class Client:
+    # One connected front-end. Log frames are skipped while the client's socket buffer is
+    # over CLIENT_BUFFER_LIMIT, so a slow client never holds up the daemon or the others;
+    # it is told how many records it missed once it catches up.
+    def __init__(self, writer, authenticated):
+        self.writer = writer
+        self.task = asyncio.current_task()
+        self.authenticated = authenticated
+        self.logs = False
+        self.dropped = 0
+
+    def send(self, frame, records=0):
+        transport = self.writer.transport
+        if transport.is_closing():
+            return
+        if records:
+            if transport.get_write_buffer_size() > CLIENT_BUFFER_LIMIT:
+                self.dropped += records
+                return
+            if self.dropped:
+                transport.write(encode({"event": "dropped", "data": self.dropped}))
+                self.dropped = 0
+        transport.write(frame)
+
+class BotDaemon:
+    # Owns the bots, their logs and metrics without any GUI. Clients (the manager window,
+    # botctl.py) connect over utils.rpc; bots keep running when they disconnect.
+    def __init__(self, address=DEFAULT_ADDRESS, metrics_port=METRICS_PORT, log_directory=LOG_DIRECTORY):
+        self.address = address
+        self.metrics_port = metrics_port
+        self.fleet = BotFleet()
+        self.metrics = MetricsSummary()
+        self.metrics_server = None
+        self.log_store = LogStore(log_directory)
+        self.history = RingBuffer(HISTORY_SIZE)
+        self.clients = set()
+        self.shard_states = {}
+        self.cog_index = CogIndex("cogs")
+        self.cog_hashes = CogHashes(self.cog_index)
+        self.cog_watcher = None
+        self.hot_reload = False
+        self._pending_logs = []
+        # (bot, worker index, request id) -> future for an ack an RPC is waiting on.
+        self._waiting = {}
+        # Bots whose workers are running the sampling profiler.
+        self.profiling = set()
+        # Bot name -> future for workers still being stopped in an executor.
+        self.stopping_bots = {}
+        self._status_changed = False
+        self._stopping = None
+        self._loop = None
+        # Shared secret TCP clients must send first; None on a Unix socket.
+        self._secret = None
+
+    def log(self, message, level="INFO"):
+        self._pending_logs.append(LogEntry(time.time(), level, "daemon", message))
+
+    async def serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        tcp = tcp_address(self.address)
+        if tcp is not None:
+            self._secret = load_secret(create=True)
+            server = await asyncio.start_server(self.handle_client, *tcp, limit=MAX_FRAME)
+        else:
+            self._claim_socket()
+            # The socket file is created owner-only rather than chmod'ed afterwards, which would
+            # leave a window where anyone can connect.
+            umask = os.umask(0o077)
+            try:
+                server = await asyncio.start_unix_server(self.handle_client, self.address, limit=MAX_FRAME)
+            finally:
+                os.umask(umask)
+            os.chmod(self.address, 0o600)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(sig, self._stopping.set)
+            except (NotImplementedError, AttributeError, ValueError):
+                pass
+        self.log_store.start()
+        self.cog_index.refresh()
+        self.cog_watcher = CogWatcher(
+            self.cog_index, lambda changes: self._loop.call_soon_threadsafe(self.on_cog_files_changed)
+        )
+        self.cog_watcher.start()
+        if self.metrics_port:
+            try:
+                self.metrics_server = MetricsServer(lambda: render_prometheus(self.metrics), port=self.metrics_port)
+                self.metrics_server.start()
+                self.log(f"Prometheus metrics at {self.metrics_server.url}")
+            except OSError as e:
+                self.log(f"Metrics endpoint unavailable: {str(e)}", "WARNING")
+        self.log(f"Daemon listening on {self.address} (pid {os.getpid()})")
+        tasks = [asyncio.create_task(self.pump()), asyncio.create_task(self.report_status())]
+        try:
+            await self._stopping.wait()
+        finally:
+            server.close()
+            for task in tasks:
+                task.cancel()
+            # Each bot can take seconds to stop; the loop keeps serving the shutdown meanwhile.
+            await self._loop.run_in_executor(None, self.fleet.close)
+            if self.stopping_bots:
+                await asyncio.wait(list(self.stopping_bots.values()))
+            clients = list(self.clients)
+            for client in clients:
+                client.writer.close()
+            if clients:
+                # Lets each handler see its connection close instead of being cancelled.
+                await asyncio.wait([client.task for client in clients], timeout=1.0)
+            self.cog_watcher.stop()
+            if self.metrics_server is not None:
+                self.metrics_server.stop()
+            self.log("Daemon stopped")
+            self.flush_logs()
+            self.log_store.close()
+            if tcp is None:
+                try:
+                    os.unlink(self.address)
+                except OSError:
+                    pass
+
+    def _claim_socket(self):
+        # A socket file left behind by a crashed daemon is removed; a live daemon is not.
+        if not os.path.exists(self.address):
+            return
+        try:
+            RpcClient(self.address, timeout=1.0).close()
+        except OSError:
+            os.unlink(self.address)
+            return
+        raise SystemExit(f"A daemon is already listening on {self.address}")
+
+    async def handle_client(self, reader, writer):
+        client = Client(writer, authenticated=self._secret is None)
+        self.clients.add(client)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                reply = {"id": message.get("id")}
+                try:
+                    if not client.authenticated and message.get("method") != "auth":
+                        raise ValueError("Authentication required")
+                    method = getattr(self, "rpc_" + str(message.get("method")), None)
+                    if method is None:
+                        raise ValueError(f"Unknown method {message.get('method')}")
+                    result = method(client, **(message.get("params") or {}))
+                    if asyncio.iscoroutine(result):
+                        result = await result
+                    reply["result"] = result
+                except Exception as e:
+                    reply["error"] = str(e)
+                client.send(encode(reply))
+                if not client.authenticated:
+                    # One attempt per connection.
+                    break
+        finally:
+            self.clients.discard(client)
+            writer.close()
+
+    def broadcast(self, event, data, records=0, logs_only=False):
+        # Encoded once and written to every client as the same bytes.
+        frame = encode({"event": event, "data": data})
+        for client in list(self.clients):
+            if client.authenticated and (client.logs or not logs_only):
+                client.send(frame, records)
+
+    def status(self):
+        return {
+            "bots": self.fleet.stats(),
+            "shards": [[bot, shard, state] for (bot, shard), state in self.shard_states.items()],
+            "hot_reload": self.hot_reload,
+            "profiling": sorted(self.profiling),
+            "cogs": len(self.cog_index.extension_files()),
+        }
+
+    async def report_status(self):
+        # CPU and memory change all the time, so status also goes out on a timer.
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            if self.clients:
+                self.broadcast("status", self.status())
+
+    async def pump(self):
+        interval = PUMP_MIN_INTERVAL
+        while True:
+            count = self.flush_logs()
+            if count >= LOG_BATCH_SIZE:
+                interval = PUMP_MIN_INTERVAL
+            elif count:
+                interval = max(PUMP_MIN_INTERVAL, interval / 2)
+            else:
+                interval = min(PUMP_MAX_INTERVAL, interval * 2)
+            await asyncio.sleep(interval)
+
+    def flush_logs(self):
+        batch, self._pending_logs = self._pending_logs, []
+        batch.extend(self.drain_bots(LOG_BATCH_SIZE))
+        if batch:
+            self.log_store.append(batch)
+            self.history.extend(batch)
+            self.broadcast("log", batch, records=len(batch), logs_only=True)
+        if self._status_changed:
+            self._status_changed = False
+            self.broadcast("status", self.status())
+        return len(batch)
+
+    def drain_bots(self, limit):
+        batch = []
+        if not self.fleet.bots:
+            return batch
+        multi_bot = len(self.fleet.bots) > 1
+        for bot, worker, kind, payload in self.fleet.poll(limit):
+            if kind == LOG:
+                # Sources name the bot and worker only when that is ambiguous.
+                prefix = (f"{bot.name}/" if multi_bot else "") + (f"w{worker.index}/" if len(bot.workers) > 1 else "")
+                if prefix:
+                    batch.extend(LogEntry(ts, level, prefix + source, text) for ts, level, source, text in payload)
+                else:
+                    batch.extend(LogEntry(*record) for record in payload)
+            elif kind == ACK:
+                waiter = self._waiting.pop((bot.name, worker.index, payload["id"]), None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(payload)
+                else:
+                    batch.append(self.ack_entry(payload, bot.name))
+            elif kind == STARTUP:
+                batch.extend(self.startup_report(payload, bot.name))
+            elif kind == METRICS:
+                self.metrics.update((bot.name, worker.index), payload)
+                self.broadcast("metrics", {"bot": bot.name, "worker": worker.index, "snapshot": encode_snapshot(payload)})
+            elif kind == SHARD:
+                self.shard_states[(bot.name, payload["shard"])] = payload["state"]
+                self._status_changed = True
+            elif kind == EXIT:
+                for shard_id in worker.shard_ids:
+                    self.shard_states[(bot.name, shard_id)] = "down"
+                self._status_changed = True
+                if payload["restart_in"] is None:
+                    message = f"{bot.name}: process {worker.index} exited with code {payload['exitcode']}"
+                else:
+                    message = f"{bot.name}: process {worker.index} crashed with code {payload['exitcode']}, restarting in {payload['restart_in']} s"
+                batch.append(LogEntry(time.time(), "WARNING", "daemon", message))
+            elif kind == HEALTH:
+                reason = "stopped responding" if payload["state"] == "unresponsive" else "is over its memory limit"
+                batch.append(LogEntry(time.time(), "ERROR", "daemon", f"{bot.name}: process {worker.index} {reason} ({payload['detail']}), killing it"))
+        for name, bot in list(self.fleet.bots.items()):
+            if not bot.is_alive():
+                self.stop_bot(name)
+                batch.append(LogEntry(time.time(), "INFO", "daemon", f"{name} stopped"))
+        return batch
+
+    @staticmethod
+    def ack_entry(ack, bot_name):
+        target = f"{bot_name}: cog {ack['name']}" if ack["name"] else bot_name
+        if ack["ok"]:
+            return LogEntry(time.time(), "INFO", "daemon", f"{target}: {ack['op']} done in {ack['ms']:.1f} ms")
+        return LogEntry(time.time(), "ERROR", "daemon", f"{target}: {ack['op']} failed after {ack['ms']:.1f} ms: {ack['error']}")
+
+    @staticmethod
+    def startup_report(report, bot_name):
+        cogs = sorted(report["cogs"], key=lambda cog: cog[1], reverse=True)
+        failed = sum(1 for cog in cogs if not cog[2])
+        entries = [LogEntry(
+            time.time(), "WARNING" if failed else "INFO", "daemon",
+            f"{bot_name} startup: {len(cogs) - failed}/{len(cogs)} cogs loaded in {report['total_ms']:.1f} ms "
+            f"(concurrency {report['concurrency']})"
+        )]
+        for name, ms, ok, error in cogs[:5]:
+            entries.append(LogEntry(time.time(), "INFO" if ok else "ERROR", "daemon", f"  {name}: {ms:.1f} ms" + ("" if ok else f" ({error})")))
+        return entries
+
+    def stop_bot(self, name):
+        # The bot leaves the fleet at once. Joining its processes can take seconds, so that
+        # runs in an executor; the returned future is done once they are gone.
+        bot = self.fleet.remove(name)
+        self.profiling.discard(name)
+        self.shard_states = {key: state for key, state in self.shard_states.items() if key[0] != name}
+        self._status_changed = True
+        if bot is None:
+            stopped = self._loop.create_future()
+            stopped.set_result(None)
+            return stopped
+        stopped = self.stopping_bots[name] = self._loop.run_in_executor(None, bot.stop)
+        stopped.add_done_callback(functools.partial(self._bot_stopped, name))
+        return stopped
+
+    def _bot_stopped(self, name, stopped):
+        if self.stopping_bots.get(name) is stopped:
+            del self.stopping_bots[name]
+        if not stopped.cancelled() and stopped.exception() is not None:
+            self.log(f"{name}: stopping failed: {str(stopped.exception())}", "ERROR")
+
+    def apply_cog_changes(self, changes, names=None):
+        for bot in list(self.fleet.bots.values()):
+            if names is not None and bot.name not in names:
+                continue
+            # Bots limited to a cog set only hear about those cogs.
+            allowed = bot.options.get("cogs")
+            try:
+                for op, cogs in changes.items():
+                    for cog in cogs:
+                        if allowed is None or cog in allowed:
+                            bot.broadcast(op, cog)
+            except Exception as e:
+                self.log(f"{bot.name}: {str(e)}", "ERROR")
+        summary = ", ".join(f"{op} {', '.join(cogs)}" for op, cogs in changes.items() if cogs)
+        if summary:
+            self.log(f"Cog changes: {summary}")
+
+    def on_cog_files_changed(self):
+        self._status_changed = True
+        if self.hot_reload and self.fleet.bots:
+            changes = self.cog_hashes.scan()
+            if any(changes.values()):
+                self.apply_cog_changes(changes)
+
+    # RPC methods: rpc_<name>(client, **params). Results must be JSON types.
+
+    def rpc_auth(self, client, secret):
+        if self._secret is not None and not hmac.compare_digest(str(secret).encode(), self._secret.encode()):
+            raise ValueError("Wrong daemon secret")
+        client.authenticated = True
+        return True
+
+    def rpc_status(self, client):
+        return self.status()
+
+    def rpc_subscribe(self, client, logs=True, history=HISTORY_SIZE):
+        # Replays the recent log lines and current metrics, then streams from here on.
+        client.logs = logs
+        if logs and history:
+            entries = self.history.slice(len(self.history) - history, len(self.history))
+            if entries:
+                client.send(encode({"event": "log", "data": entries}), len(entries))
+        for (bot, worker), snapshot in list(self.metrics.snapshots.items()):
+            client.send(encode({"event": "metrics", "data": {"bot": bot, "worker": worker, "snapshot": encode_snapshot(snapshot)}}))
+        return self.status()
+
+    async def rpc_start(self, client, name, token, options=None):
+        if name in self.stopping_bots:
+            # Its old processes may still hold the storage file and the gateway session.
+            await asyncio.wait([self.stopping_bots[name]])
+        if options is None:
+            profiles = load_bot_profiles()
+            if name not in profiles:
+                raise ValueError(f"No bot named {name} in the bot profiles")
+            options = profiles[name]
+        if options.get("cache_profile", "balanced") not in CACHE_PROFILES:
+            raise ValueError(f"Unknown cache profile {options['cache_profile']}")
+        self.cog_index.refresh()
+        if not self.fleet.bots:
+            # Hot reload compares against what the first running bot loaded.
+            self.cog_hashes.reset()
+            self.cog_hashes.scan()
+        self.shard_states = {key: state for key, state in self.shard_states.items() if key[0] != name}
+        self.metrics.clear(name)
+        bot = self.fleet.start(name, token, options)
+        self.log(f"{name}: launch initiated ({len(bot.workers)} process(es))")
+        self._status_changed = True
+        return self.status()
+
+    async def rpc_stop(self, client, name):
+        if name not in self.fleet.bots:
+            raise ValueError(f"Bot {name} is not running")
+        self._pending_logs.extend(self.drain_bots(LOG_BATCH_SIZE))
+        await asyncio.wait([self.stop_bot(name)])
+        self.log(f"{name} stopped")
+        return self.status()
+
+    def rpc_reload(self, client, name=None):
+        if not self.fleet.bots:
+            raise ValueError("No bot is running")
+        self.cog_index.refresh()
+        changes = self.cog_hashes.scan()
+        if any(changes.values()):
+            self.apply_cog_changes(changes, None if name is None else [name])
+        else:
+            self.log("No cog changes to reload")
+        return changes
+
+    def rpc_configure(self, client, name, message_log=None, max_rss_mb=None):
+        # Settings that apply to a running bot without a relaunch.
+        bot = self.fleet.get(name)
+        if max_rss_mb is not None:
+            bot.update_options(max_rss_mb=max_rss_mb)
+        if message_log is not None:
+            bot.update_options(message_log=dict(message_log))
+            bot.broadcast("log_policy", **message_log)
+        return self.status()
+
+    def rpc_hot_reload(self, client, enabled):
+        self.hot_reload = bool(enabled)
+        self.log(f"Hot reload {'enabled' if self.hot_reload else 'disabled'} ({self.cog_watcher.mode})")
+        if self.hot_reload:
+            self.on_cog_files_changed()
+        self._status_changed = True
+        return self.status()
+
+    async def request_workers(self, name, op, **args):
+        # Sends ``op`` to every worker of a bot and waits for the acks: [[worker index, ack or
+        # None], ...], None for a worker that did not answer within REPORT_TIMEOUT.
+        bot = self.fleet.get(name)
+        waiting = {}
+        for worker in bot.workers:
+            request_id = worker.channel.request(op, **args) if worker.channel is not None else None
+            if request_id is not None:
+                waiting[(name, worker.index, request_id)] = self._loop.create_future()
+        if not waiting:
+            raise ValueError(f"Bot {name} is not reachable")
+        self._waiting.update(waiting)
+        try:
+            await asyncio.wait(list(waiting.values()), timeout=REPORT_TIMEOUT)
+        finally:
+            for key in waiting:
+                self._waiting.pop(key, None)
+        acks = []
+        for (_, index, _), future in sorted(waiting.items(), key=lambda item: item[0][1]):
+            acks.append([index, future.result() if future.done() else None])
+        return acks
+
+    async def rpc_memory(self, client, name):
+        # [[worker index, report or None], ...]
+        reports = []
+        for index, ack in await self.request_workers(name, "memory"):
+            if ack is not None and not ack["ok"]:
+                raise ValueError(f"{name}: memory report failed: {ack['error']}")
+            reports.append([index, ack["data"] if ack is not None else None])
+        return reports
+
+    async def rpc_profile(self, client, name, action, interval=None, top=15):
+        # "start" switches the sampling profiler on in every worker of the bot. "stop" collects
+        # the samples, writes them to PROFILE_DIRECTORY as collapsed stacks (prefixed with the
+        # worker when there are several) and returns a summary.
+        if action not in ("start", "stop"):
+            raise ValueError(f"Unknown profile action {action}")
+        acks = await self.request_workers(name, "profile", action=action, interval=interval)
+        errors = [f"process {index}: {ack['error'] if ack else 'no answer'}" for index, ack in acks if not ack or not ack["ok"]]
+        if action == "start":
+            if len(errors) < len(acks):
+                # Marked even when only some workers started, so it can be stopped again.
+                self.profiling.add(name)
+                self._status_changed = True
+            if errors:
+                raise ValueError(f"{name}: profiler not started in {', '.join(errors)}")
+            self.log(f"{name}: profiler started")
+            return {"profiling": True}
+        self.profiling.discard(name)
+        self._status_changed = True
+        stacks = Counter()
+        samples = 0
+        seconds = 0.0
+        # Busy share across the workers that measured it: busy seconds over their run time.
+        busy = [0.0, 0.0]
+        for index, ack in acks:
+            if ack and ack["ok"]:
+                result = ack["data"]
+                samples += result["samples"]
+                seconds = max(seconds, result["seconds"])
+                if result.get("busy_seconds") is not None:
+                    busy[0] += result["busy_seconds"]
+                    busy[1] += result["seconds"]
+                prefix = f"w{index};" if len(acks) > 1 else ""
+                for stack, count in result["stacks"]:
+                    stacks[prefix + stack] += count
+        if not samples and errors:
+            raise ValueError(f"{name}: no profile collected ({', '.join(errors)})")
+        path = os.path.join(PROFILE_DIRECTORY, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        os.makedirs(PROFILE_DIRECTORY, exist_ok=True)
+        await self._loop.run_in_executor(None, save_file, path, "\n".join(collapsed_lines(stacks)) + "\n")
+        self.log(f"{name}: profiler stopped, {samples} samples written to {path}")
+        for error in errors:
+            self.log(f"{name}: profile incomplete, {error}", "WARNING")
+        return {
+            "samples": samples, "seconds": seconds, "busy": busy[0] / busy[1] if busy[1] else None, "path": path,
+            "top": summarize(stacks, top),
+        }
+
+    async def rpc_search(self, client, **query):
+        result = await self._loop.run_in_executor(None, lambda: self.log_store.query(**query))
+        return {"entries": result.entries, "blocks_read": result.blocks_read, "blocks_total": result.blocks_total, "ms": result.ms}
+
+    def rpc_shutdown(self, client):
+        self._stopping.set()
+        return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python daemon.py", description="Run the bots headless; control them with botctl.py or the manager.")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Unix socket path, or host:port for TCP")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Prometheus endpoint port, 0 to disable")
+    parser.add_argument("--log-directory", default=LOG_DIRECTORY)
+    args = parser.parse_args(argv)
+    asyncio.run(BotDaemon(args.address, args.metrics_port, args.log_directory).serve())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
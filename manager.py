@@ -1,41 +1,99 @@
+import time
+STARTED = time.perf_counter()
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox, Toplevel
 from tkinter.scrolledtext import ScrolledText
-from tkinter import Menu
-import pygments.lexers
-from pygments.token import Token
-from pygments import lex
+from tkinter import Menu, ttk
+import tkinter.font as tkfont
 import os
+import sys
+import json
 import threading
-import queue
-import time
-from bot_core import start_bot, stop_bot, reload_cog
-from utils.encrypt import encrypt_token, decrypt_token, get_master_password
-from utils.file_tools import save_file, load_file
+from bisect import bisect_left
+from collections import deque
+from utils.encrypt import KeySession
+from utils.file_tools import FileWorker
+from utils.highlight import HighlightWorker, HighlightJob, TAGS, shift_line
+from utils.logbuffer import LogEntry, RingBuffer, format_entry
+from utils.memreport import format_memory_report
+from utils.profiler import format_summary
+from utils.metrics import MetricsSummary, decode_snapshot
+from utils.msglog import MODES as MESSAGE_LOG_MODES
+from utils.cogindex import CogIndex
+from utils.watcher import CogWatcher
+from utils.profiles import CACHE_PROFILES, DEFAULT_BOT, load_bot_profiles, save_bot_profiles, parse_tokens
+from utils.rpc import DEFAULT_ADDRESS, RpcClient, RpcError, connect_or_spawn
+
+LOG_PUMP_MIN_INTERVAL = 10
+LOG_PUMP_MAX_INTERVAL = 250
+LOG_BATCH_SIZE = 5000
+CONSOLE_RETENTION = 10000
+LEVEL_TAGS = {"ERROR": "error", "CRITICAL": "error", "WARNING": "warning"}
+TOKEN_FILE = "token.enc"
+DAEMON_RETRY_INTERVAL = 2000
+PROFILE_INTERVAL = 0.01
+# How long closing the window waits for queued saves to reach the disk.
+CLOSE_SAVE_TIMEOUT = 10.0
+PROFILE_TOP = 25
+SESSION_CHECK_INTERVAL = 5000
+SEARCH_LIMIT = 5000
+SEARCH_LEVELS = {
+    "Any level": None, "WARNING+": ["WARNING", "ERROR", "CRITICAL"], "ERROR+": ["ERROR", "CRITICAL"], "INFO": ["INFO"],
+}
+SEARCH_PERIODS = {"All time": None, "Last 15 min": 900, "Last hour": 3600, "Last 24 h": 86400}
 
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("dark-blue")
 
 class CodeEditor(tk.Frame):
-    def __init__(self, master, **kwargs):
+    # call_soon and poll_soon are the manager's: highlight results reach the Tk thread
+    # through its pump like every other worker result.
+    def __init__(self, master, call_soon, poll_soon, highlight_delay=40, viewport_threshold=5000,
+                 highlight_limit=20000, viewport_margin=60, **kwargs):
         super().__init__(master, bg="#1e1e2e", **kwargs)
+        self.poll_soon = poll_soon
+        self.highlight_delay = highlight_delay
+        self.viewport_threshold = viewport_threshold
+        self.highlight_limit = highlight_limit
+        self.viewport_margin = viewport_margin
+        self.highlight_worker = HighlightWorker(lambda result: call_soon(self.on_highlight_result, result))
+        self.highlight_worker.start()
+        self.bind("<Destroy>", self.on_destroy, add="+")
+        self._version = 0
+        self._pending_edits = []
+        self._pending_touch = None
+        self._pending_reset = None
+        self._in_flight = False
+        self._resubmit = False
+        self._highlight_job = None
+        self._viewport_job = None
+        self._highlight_mode = "full"
+        self._tagged = None
         self.text = ScrolledText(
             self, wrap="none", bg="#1e1e2e", fg="#f8f8f2", insertbackground="#ff79c6",
             font=("Courier New", 14), borderwidth=0, undo=True, autoseparators=True, maxundo=-1
         )
         self.text.pack(side="right", fill="both", expand=True, padx=(0, 10), pady=10)
+        self.text.configure(yscrollcommand=self.on_yview)
         
-        self.line_numbers = tk.Text(
-            self, width=4, bg="#282a36", fg="#6272a4", font=("Courier New", 14), bd=0
-        )
-        self.line_numbers.pack(side="left", fill="y", padx=(10, 5))
-        self.line_numbers.config(state="disabled")
+        # The gutter only draws the numbers of the lines currently on screen.
+        self.gutter_font = tkfont.Font(family="Courier New", size=14)
+        self.line_numbers = tk.Canvas(self, width=50, bg="#282a36", bd=0, highlightthickness=0)
+        self.line_numbers.pack(side="left", fill="y", padx=(10, 5), pady=10)
+        self._gutter_state = None
+        self._gutter_job = None
+        
+        # Route every insert/delete through _dispatch so the highlighter knows which lines changed.
+        self._widget_cmd = self.text._w + "_orig"
+        self.tk.call("rename", self.text._w, self._widget_cmd)
+        self.tk.createcommand(self.text._w, self._dispatch)
         
         self.text.bind("<KeyRelease>", self.on_key_release)
         self.text.bind("<MouseWheel>", self.on_mouse_wheel)
         self.text.bind("<Shift-MouseWheel>", self.on_shift_mouse_wheel)
         self.text.bind("<KeyPress>", self.handle_key_press)
+        self.text.bind("<Configure>", self.schedule_line_numbers)
         self.tag_configure("keyword", foreground="#ff79c6")
         self.tag_configure("builtin", foreground="#8be9fd")
         self.tag_configure("string", foreground="#50fa7b")
@@ -43,11 +101,10 @@ class CodeEditor(tk.Frame):
         self.tag_configure("number", foreground="#bd93f9")
         self.tag_configure("operator", foreground="#ff5555")
         self.tag_configure("name", foreground="#f8f8f2")
-        self.update_line_numbers()
+        self.schedule_line_numbers()
     
     def on_mouse_wheel(self, event):
         self.text.yview_scroll(int(-event.delta / 120), "units")
-        self.line_numbers.yview_scroll(int(-event.delta / 120), "units")
         return "break"
     
     def on_shift_mouse_wheel(self, event):
@@ -69,8 +126,8 @@ class CodeEditor(tk.Frame):
             self.text.delete("sel.first", "sel.last") if selected_text else None
             self.text.insert(tk.INSERT, char + (selected_text or "") + pairs[char])
             self.text.mark_set(tk.INSERT, f"{tk.INSERT} - {len(pairs[char])} chars")
-            self.update_line_numbers()
-            self.highlight()
+            self.schedule_line_numbers()
+            self.schedule_highlight()
             return "break"
         elif char in pairs.values():
             current_pos = self.text.index(tk.INSERT)
@@ -81,41 +138,221 @@ class CodeEditor(tk.Frame):
         return None
     
     def on_key_release(self, event=None):
-        self.update_line_numbers()
-        self.highlight()
+        self.schedule_line_numbers()
+        self.schedule_highlight()
+    
+    def schedule_line_numbers(self, event=None):
+        if self._gutter_job is None:
+            self._gutter_job = self.after_idle(self.update_line_numbers)
     
     def update_line_numbers(self):
-        self.line_numbers.config(state="normal")
-        self.line_numbers.delete(1.0, tk.END)
-        line_count = int(self.text.index(tk.END).split('.')[0]) - 1
-        for i in range(1, line_count + 1):
-            self.line_numbers.insert(tk.END, f"{i}\n")
-        self.line_numbers.config(state="disabled")
+        if self._gutter_job is not None:
+            self.after_cancel(self._gutter_job)
+            self._gutter_job = None
+        top = self.text.index("@0,0")
+        line_count = int(self.text.index("end - 1 chars").split(".")[0])
+        info = self.text.dlineinfo(top)
+        line = int(top.split(".")[0])
+        state = (line, info and info[1], line_count, self.text.winfo_height(), self.gutter_font.cget("size"))
+        if state == self._gutter_state:
+            return
+        self._gutter_state = state
+        
+        digit_width = self.gutter_font.measure("0")
+        width = digit_width * max(3, len(str(line_count))) + 10
+        if int(self.line_numbers.cget("width")) != width:
+            self.line_numbers.configure(width=width)
+        self.line_numbers.delete("all")
+        while info is not None and line <= line_count:
+            self.line_numbers.create_text(
+                width - 5, info[1], anchor="ne", text=str(line), font=self.gutter_font, fill="#6272a4"
+            )
+            line += 1
+            info = self.text.dlineinfo(f"{line}.0")
+    
+    def set_font_size(self, size):
+        self.text.configure(font=("Courier New", size))
+        self.gutter_font.configure(size=size)
+        self.update_line_numbers()
+    
+    def _dispatch(self, operation, *args):
+        if operation in ("insert", "delete", "replace") and args:
+            self._track_edit(operation, args)
+        return self.tk.call((self._widget_cmd, operation) + args)
+    
+    def _line_of(self, index):
+        line = int(self.tk.call(self._widget_cmd, "index", index).split(".")[0])
+        last = int(self.tk.call(self._widget_cmd, "index", "end - 1 chars").split(".")[0])
+        return min(line, last) - 1
+    
+    def _track_edit(self, operation, args):
+        try:
+            first = self._line_of(args[0])
+            if operation == "insert":
+                removed, added = 0, sum(chars.count("\n") for chars in args[1::2])
+            else:
+                end = args[1] if len(args) > 1 else f"{args[0]} + 1 chars"
+                removed = self._line_of(end) - first
+                added = sum(chars.count("\n") for chars in args[2::2]) if operation == "replace" else 0
+        except tk.TclError:
+            return
+        self._version += 1
+        self._pending_edits.append((first, removed, added))
+        if self._tagged is not None:
+            lo, hi = self._tagged
+            self._tagged = (shift_line(lo, first, removed, added), shift_line(hi, first, removed, added))
+    
+    def on_yview(self, first, last):
+        self.text.vbar.set(first, last)
+        self.schedule_line_numbers()
+        if self._highlight_mode == "viewport" and self._viewport_job is None:
+            self._viewport_job = self.after_idle(self.update_viewport)
+    
+    def update_viewport(self):
+        self._viewport_job = None
+        if self._highlight_mode == "viewport":
+            self.highlight()
+    
+    def schedule_highlight(self):
+        if self._highlight_job is not None:
+            self.after_cancel(self._highlight_job)
+        self._highlight_job = self.after(self.highlight_delay, self.highlight)
     
     def highlight(self):
-        content = self.text.get("1.0", tk.END)
-        self.text.mark_set("current", "1.0")
-        tags = ["keyword", "builtin", "string", "comment", "number", "operator", "name"]
-        for tag in tags:
-            self.text.tag_remove(tag, "1.0", tk.END)
-        
-        for token, value in lex(content, pygments.lexers.PythonLexer()):
-            end = self.text.index(f"current + {len(value)} chars")
-            if token in Token.Keyword or token in Token.Keyword.Namespace:
-                self.text.tag_add("keyword", "current", end)
-            elif token in Token.Name.Builtin:
-                self.text.tag_add("builtin", "current", end)
-            elif token in Token.String:
-                self.text.tag_add("string", "current", end)
-            elif token in Token.Comment:
-                self.text.tag_add("comment", "current", end)
-            elif token in Token.Number:
-                self.text.tag_add("number", "current", end)
-            elif token in Token.Operator:
-                self.text.tag_add("operator", "current", end)
-            elif token in Token.Name:
-                self.text.tag_add("name", "current", end)
-            self.text.mark_set("current", end)
+        # Lexing runs on highlight_worker; this only snapshots the buffer and hands it over.
+        if self._highlight_job is not None:
+            self.after_cancel(self._highlight_job)
+            self._highlight_job = None
+        if self._in_flight:
+            self._resubmit = True
+            return
+        line_count = int(self.text.index("end - 1 chars").split(".")[0])
+        if line_count > self.highlight_limit:
+            mode = "off"
+        elif line_count > self.viewport_threshold:
+            mode = "viewport"
+        else:
+            mode = "full"
+        
+        if mode == "off":
+            if self._highlight_mode != "off":
+                self.remove_tags(0, line_count - 1)
+                self._tagged = None
+            self._highlight_mode = mode
+            self._pending_edits = []
+            self._pending_touch = None
+            self._pending_reset = True
+            return
+        if mode == "full" and self._highlight_mode != "full":
+            self._touch(0, line_count - 1)
+        self._highlight_mode = mode
+        
+        fills = []
+        if mode == "full":
+            window = (0, line_count - 1)
+        else:
+            lo, hi = self._viewport_window(line_count)
+            tagged = self._tagged
+            if tagged is None or tagged[1] < lo or hi < tagged[0]:
+                fills.append((lo, hi))
+                window = (lo, hi)
+            else:
+                if lo < tagged[0]:
+                    fills.append((lo, tagged[0] - 1))
+                if hi > tagged[1]:
+                    fills.append((tagged[1] + 1, hi))
+                window = (min(lo, tagged[0]), max(hi, tagged[1]))
+        if not fills and not self._pending_edits and self._pending_touch is None and not self._pending_reset:
+            if mode == "viewport":
+                self._trim_tags(lo, hi)
+            return
+        
+        job = HighlightJob(
+            self._version, self.text.get("1.0", "end - 1 chars"), self._pending_edits,
+            line_count if self._pending_reset else None, self._pending_touch, window, fills
+        )
+        self._pending_edits = []
+        self._pending_touch = None
+        self._pending_reset = None
+        self._in_flight = True
+        self.highlight_worker.jobs.put(job)
+        self.poll_soon()
+    
+    def on_destroy(self, event):
+        if event.widget is self:
+            self.highlight_worker.stop()
+    
+    def on_highlight_result(self, result):
+        self._in_flight = False
+        if result.version == self._version:
+            self._apply_result(result)
+        else:
+            # The buffer changed while the worker was lexing: drop the spans and make the
+            # next job retag that range, mapped through the edits made in the meantime.
+            if result.updated is not None and result.updated[0] <= result.updated[1]:
+                first, last = result.updated[:2]
+                for edit in self._pending_edits:
+                    first, last = shift_line(first, *edit), shift_line(last, *edit)
+                self._touch(first, last)
+            self._resubmit = True
+        if self._resubmit:
+            self._resubmit = False
+            self.highlight()
+    
+    def _apply_result(self, result):
+        if self._highlight_mode == "off":
+            return
+        tagged = self._tagged
+        if tagged is not None and (tagged[1] < result.window[0] or result.window[1] < tagged[0]):
+            self.remove_tags(*tagged)
+        if result.updated is not None:
+            self.apply_spans(*result.updated)
+        for fill in result.fills:
+            self.apply_spans(*fill)
+        self._tagged = result.window
+        if self._highlight_mode == "viewport":
+            self._trim_tags(*self._viewport_window(int(self.text.index("end - 1 chars").split(".")[0])))
+    
+    def _touch(self, first, last):
+        if self._pending_touch is None:
+            self._pending_touch = (first, last)
+        else:
+            self._pending_touch = (min(self._pending_touch[0], first), max(self._pending_touch[1], last))
+    
+    def _viewport_window(self, line_count):
+        top = int(self.text.index("@0,0").split(".")[0]) - 1
+        bottom = int(self.text.index(f"@0,{self.text.winfo_height()}").split(".")[0]) - 1
+        return max(0, top - self.viewport_margin), min(line_count - 1, bottom + self.viewport_margin)
+    
+    def _trim_tags(self, lo, hi):
+        # Large-file mode: drop tags once they are far off-screen.
+        tagged = self._tagged
+        if tagged is None:
+            return
+        keep = 2 * (hi - lo + 1)
+        if tagged[0] < lo - keep:
+            self.remove_tags(tagged[0], lo - keep - 1)
+            tagged = (lo - keep, tagged[1])
+        if tagged[1] > hi + keep:
+            self.remove_tags(hi + keep + 1, tagged[1])
+            tagged = (tagged[0], hi + keep)
+        self._tagged = tagged
+    
+    def remove_tags(self, first, last):
+        for tag in TAGS:
+            self.text.tag_remove(tag, f"{first + 1}.0", f"{last + 2}.0")
+    
+    def apply_spans(self, first, last, spans):
+        if last < first:
+            return
+        self.remove_tags(first, last)
+        ranges = [[] for _ in TAGS]
+        for i in range(0, len(spans), 4):
+            line = spans[i] + 1
+            ranges[spans[i + 3]].extend((f"{line}.{spans[i + 1]}", f"{line}.{spans[i + 2]}"))
+        for tag, indices in zip(TAGS, ranges):
+            if indices:
+                self.text.tag_add(tag, *indices)
     
     def get(self, start, end):
         return self.text.get(start, end)
@@ -141,24 +378,250 @@ class CodeEditor(tk.Frame):
     def mark_set(self, name, index):
         self.text.mark_set(name, index)
 
+class ConsoleView(tk.Frame):
+    # Keeps the last ``retention`` entries in a ring buffer and renders only the rows that
+    # fit in the widget, so memory and redraw cost stay flat however long the bot runs.
+    def __init__(self, master, retention=CONSOLE_RETENTION, height=10, **kwargs):
+        super().__init__(master, bg="#282a36", **kwargs)
+        self.live = self.entries = RingBuffer(retention)
+        self.height = height
+        self.follow = True
+        self._top_seq = 0
+        self.font = tkfont.Font(family="Courier New", size=12)
+        self.text = tk.Text(
+            self, state="disabled", height=height, bg="#282a36", fg="#f8f8f2",
+            font=self.font, borderwidth=0, wrap="none"
+        )
+        self.scrollbar = tk.Scrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.text.pack(side="left", fill="both", expand=True)
+        self.text.tag_configure("error", foreground="#ff5555")
+        self.text.tag_configure("info", foreground="#50fa7b")
+        self.text.tag_configure("warning", foreground="#f1fa8c")
+        self.text.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.text.bind("<Configure>", lambda event: self.render())
+    
+    def append(self, entries):
+        self.live.extend(entries)
+        if self.entries is self.live:
+            self.render()
+    
+    def set_retention(self, retention):
+        self.live.resize(retention)
+        self.render()
+    
+    def show_results(self, entries):
+        # Replaces the live view with search results until show_live() is called.
+        self.entries = RingBuffer(max(1, len(entries)))
+        self.entries.extend(entries)
+        self.follow = True
+        self.render()
+    
+    def show_live(self):
+        self.entries = self.live
+        self.follow = True
+        self.render()
+    
+    def rows(self):
+        height = self.text.winfo_height()
+        if height <= 1:
+            return self.height
+        return max(1, height // self.font.metrics("linespace"))
+    
+    def scroll_to(self, index):
+        rows = self.rows()
+        last = max(0, len(self.entries) - rows)
+        index = max(0, min(index, last))
+        self.follow = index >= last
+        self._top_seq = self.entries.first_seq + index
+        self.render()
+    
+    def on_mouse_wheel(self, event):
+        self.scroll_to(self._top_seq - self.entries.first_seq + int(-event.delta / 120) * 3)
+        return "break"
+    
+    def on_scrollbar(self, action, amount, unit=None):
+        top = self._top_seq - self.entries.first_seq
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.entries)))
+        elif unit == "pages":
+            self.scroll_to(top + int(amount) * self.rows())
+        else:
+            self.scroll_to(top + int(amount))
+    
+    def render(self):
+        rows = self.rows()
+        total = len(self.entries)
+        if self.follow:
+            top = max(0, total - rows)
+        else:
+            top = max(0, min(self._top_seq - self.entries.first_seq, total - rows))
+        self._top_seq = self.entries.first_seq + top
+        
+        chunks = []
+        for entry in self.entries.slice(top, top + rows):
+            tag = LEVEL_TAGS.get(entry.level, "info")
+            if chunks and chunks[-1] == tag:
+                chunks[-2] += f"\n{format_entry(entry)}"
+            else:
+                chunks += [("\n" if chunks else "") + format_entry(entry), tag]
+        self.text.config(state="normal")
+        self.text.delete("1.0", tk.END)
+        if chunks:
+            self.text.insert(tk.END, *chunks)
+        self.text.config(state="disabled")
+        if total:
+            self.scrollbar.set(top / total, min(1.0, (top + rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+class MetricsView(tk.Frame):
+    # Table of per-cog and per-command counters and latency quantiles, redrawn whenever a
+    # worker sends a new snapshot.
+    def __init__(self, master, height=10, **kwargs):
+        super().__init__(master, bg="#282a36", **kwargs)
+        self.text = tk.Text(
+            self, state="disabled", height=height, width=62, bg="#282a36", fg="#f8f8f2",
+            font=("Courier New", 12), borderwidth=0, wrap="none"
+        )
+        self.text.pack(fill="both", expand=True)
+        self.text.tag_configure("header", foreground="#bd93f9")
+        self.text.tag_configure("cog", foreground="#ff79c6")
+        self.text.tag_configure("error", foreground="#ff5555")
+    
+    @staticmethod
+    def format_ms(value):
+        return "-" if value is None else f"{value:.1f}"
+    
+    def row(self, name, calls, errors, latency):
+        return (f"{name[:26]:<26} {calls:>7} {errors:>5} "
+                f"{self.format_ms(latency.quantile(0.5)):>9} {self.format_ms(latency.quantile(0.99)):>9}")
+    
+    def render(self, summary):
+        commands, loop_lag = summary.merged()
+        sender = summary.sender()
+        chunks = [
+            f"Loop lag ms  p50 {self.format_ms(loop_lag.quantile(0.5))}  p99 {self.format_ms(loop_lag.quantile(0.99))}"
+            f"  max {self.format_ms(loop_lag.max if loop_lag.count else None)}\n", "header",
+            f"Sends {sender.sent}  merged {sender.merged}  429s {sender.rate_limited}  queued {sender.depth}"
+            f"  wait p99 {self.format_ms(sender.wait.quantile(0.99))}\n", "error" if sender.rate_limited else "header",
+            f"{'Cog / command':<26} {'calls':>7} {'err':>5} {'p50 ms':>9} {'p99 ms':>9}\n", "header",
+        ]
+        for cog, (calls, errors, latency) in sorted(summary.cogs(commands).items()):
+            chunks += [self.row(cog, calls, errors, latency) + "\n", "cog"]
+            for (command_cog, command), (calls, errors, latency) in sorted(commands.items()):
+                if command_cog == cog:
+                    chunks += [self.row(f"  {command}", calls, errors, latency) + "\n", "error" if errors else ()]
+        caches = summary.caches()
+        if caches:
+            chunks += [f"{'Cache':<18} {'hits':>7} {'miss':>6} {'evict':>6} {'shared':>6} {'MB / budget':>13}\n", "header"]
+            for cog, (hits, misses, evictions, coalesced, _, size, budget) in sorted(caches.items()):
+                chunks += [
+                    f"{cog[:18]:<18} {hits:>7} {misses:>6} {evictions:>6} {coalesced:>6} "
+                    f"{size / 2**20:>6.1f}/{budget / 2**20:<6.0f}\n", "cog",
+                ]
+        self.text.config(state="normal")
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, *chunks)
+        self.text.config(state="disabled")
+
+class BotsView(tk.Frame):
+    # One row per configured bot with its state and resources, redrawn from the daemon's
+    # status updates. Clicking a row selects that bot.
+    def __init__(self, master, on_select, height=6, **kwargs):
+        super().__init__(master, bg="#282a36", **kwargs)
+        self.on_select = on_select
+        self.names = []
+        self.text = tk.Text(
+            self, state="disabled", height=height, width=36, bg="#282a36", fg="#f8f8f2",
+            font=("Courier New", 11), borderwidth=0, wrap="none", cursor="hand2"
+        )
+        self.text.pack(fill="both", expand=True)
+        self.text.tag_configure("header", foreground="#bd93f9")
+        self.text.tag_configure("selected", background="#44475a")
+        self.text.tag_configure("running", foreground="#50fa7b")
+        self.text.tag_configure("degraded", foreground="#f1fa8c")
+        self.text.tag_configure("restarting", foreground="#ff5555")
+        self.text.bind("<Button-1>", self.on_click)
+    
+    def on_click(self, event):
+        line = int(self.text.index(f"@{event.x},{event.y}").split(".")[0]) - 2
+        if 0 <= line < len(self.names):
+            self.on_select(self.names[line])
+    
+    def render(self, names, stats, selected):
+        stats = {entry["name"]: entry for entry in stats}
+        self.names = list(names)
+        chunks = [f"{'Bot':<12} {'state':<10} {'CPU%':>5} {'MB':>5} {'rst':>3}\n", "header"]
+        for name in self.names:
+            entry = stats.get(name)
+            if entry is None:
+                line = f"{name[:12]:<12} {'stopped':<10} {'-':>5} {'-':>5} {'-':>3}"
+                tags = ()
+            else:
+                cpu = "-" if entry["cpu_percent"] is None else f"{entry['cpu_percent']:.0f}"
+                rss = "-" if entry["rss"] is None else f"{entry['rss'] / 2**20:.0f}"
+                line = f"{name[:12]:<12} {entry['state']:<10} {cpu:>5} {rss:>5} {entry['restarts']:>3}"
+                tags = (entry["state"],)
+            chunks += [line + "\n", tags + (("selected",) if name == selected else ())]
+        self.text.config(state="normal")
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, *chunks)
+        self.text.config(state="disabled")
+
 class DiscordBotManager(ctk.CTk):
-    def __init__(self):
+    def __init__(self, exit_after_paint=False):
         super().__init__()
+        self.exit_after_paint = exit_after_paint
+        self._painted = False
         self.title("Discord Bot Studio")
         self.geometry("1600x1000")
         self.resizable(True, True)
         
-        self.bot_process = None
-        self.log_queue = queue.Queue()
+        # Bots run in the daemon (daemon.py); this window is one of its clients and only
+        # mirrors the status, logs and metrics it pushes.
+        self.daemon = None
+        self.bot_stats = []
+        self.bot_profiles = load_bot_profiles()
+        self.selected_bot = next(iter(self.bot_profiles))
+        self.tokens = {}
+        self.shard_states = {}
+        self.cog_index = CogIndex("cogs")
+        self.cog_watcher = None
+        self.hot_reload = False
+        self.profiling = set()
+        self._tree_children = {}
+        self._ui_calls = deque()
+        self._pending_logs = deque()
+        self._log_pump_job = None
+        self._log_pump_interval = LOG_PUMP_MIN_INTERVAL
         self.current_file = None
-        self.bot_running = False
+        # Digest of current_file as last read or written; saves with the same content are skipped.
+        self.current_digest = None
+        # Line ending style of the open file, kept when it is saved.
+        self.current_newline = "\n"
+        self._open_id = 0
+        self.file_worker = FileWorker()
+        self.file_worker.start()
         self.sidebar_visible = True
         self.editor_font_size = 14
+        self.console_retention = CONSOLE_RETENTION
+        self.metrics = MetricsSummary()
+        self._search_id = 0
+        self.key_session = KeySession(TOKEN_FILE)
+        self._session_was_unlocked = False
         
         self.create_widgets()
         self.load_token()
-        
-        threading.Thread(target=self.process_logs, daemon=True).start()
+        self.check_session()
+        self.render_bots()
+        self.pump_logs()
+        self.bind("<Map>", self.on_map, add="+")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+    
+    @property
+    def launch_options(self):
+        return self.bot_profiles[self.selected_bot]
     
     def create_widgets(self):
         self.grid_columnconfigure(1, weight=1) 
@@ -180,12 +643,16 @@ class DiscordBotManager(ctk.CTk):
         self.sidebar.grid_columnconfigure(0, weight=1)
         
         ctk.CTkLabel(self.sidebar, text="Cogs Explorer", font=("Arial", 18, "bold"), text_color="#ff79c6").pack(pady=(10, 5))
-        self.file_tree = tk.Listbox(
-            self.sidebar, bg="#282a36", fg="#f8f8f2", font=("Arial", 14),
-            selectbackground="#44475a", selectforeground="#f8f8f2", borderwidth=0, highlightthickness=0
+        style = ttk.Style(self)
+        style.configure(
+            "Cogs.Treeview", background="#282a36", fieldbackground="#282a36", foreground="#f8f8f2",
+            font=("Arial", 14), rowheight=28, borderwidth=0
         )
+        style.map("Cogs.Treeview", background=[("selected", "#44475a")], foreground=[("selected", "#f8f8f2")])
+        style.layout("Cogs.Treeview", [("Treeview.treearea", {"sticky": "nswe"})])
+        self.file_tree = ttk.Treeview(self.sidebar, style="Cogs.Treeview", show="tree", selectmode="browse")
         self.file_tree.pack(fill="both", expand=True, padx=10, pady=5)
-        self.file_tree.bind("<<ListboxSelect>>", self.on_file_select)
+        self.file_tree.bind("<<TreeviewSelect>>", self.on_file_select)
         self.file_tree.bind("<Button-3>", self.show_context_menu)
         
         self.context_menu = Menu(self.file_tree, tearoff=0)
@@ -204,6 +671,20 @@ class DiscordBotManager(ctk.CTk):
             compound="left", border_width=2, border_color="#bd93f9"
         ).pack(pady=5)
         
+        ctk.CTkLabel(self.sidebar, text="Bots", font=("Arial", 18, "bold"), text_color="#ff79c6").pack(pady=(10, 5))
+        self.bots_view = BotsView(self.sidebar, self.select_bot)
+        self.bots_view.pack(fill="x", padx=10, pady=5)
+        bot_buttons = ctk.CTkFrame(self.sidebar, fg_color="#282a36")
+        bot_buttons.pack(pady=(0, 10))
+        ctk.CTkButton(
+            bot_buttons, text="➕ Add Bot", command=self.add_bot_dialog, width=120, corner_radius=10,
+            font=("Arial", 14, "bold"), fg_color="#bd93f9", hover_color="#ff79c6", text_color="#1e1e2e"
+        ).pack(side="left", padx=5)
+        ctk.CTkButton(
+            bot_buttons, text="🗑️ Remove", command=self.remove_bot, width=120, corner_radius=10,
+            font=("Arial", 14, "bold"), fg_color="#ff5555", hover_color="#ff79c6", text_color="#f8f8f2"
+        ).pack(side="left", padx=5)
+        
         self.main_frame = ctk.CTkFrame(self, corner_radius=15, fg_color="#1e1e2e")
         self.main_frame.grid(row=1, column=1, sticky="nsew", padx=(5, 10), pady=(5, 10))
         self.main_frame.grid_columnconfigure(0, weight=1)
@@ -215,9 +696,23 @@ class DiscordBotManager(ctk.CTk):
         ctk.CTkLabel(self.auth_frame, text="Master Password:", font=("Arial", 14), text_color="#f1fa8c").pack(side="left", padx=10)
         self.password_entry = ctk.CTkEntry(self.auth_frame, show="*", width=200, font=("Arial", 14))
         self.password_entry.pack(side="left", padx=5)
+        self.password_entry.bind("<Return>", lambda event: self.unlock_token())
+        self.unlock_button = ctk.CTkButton(
+            self.auth_frame, text="🔓 Unlock", command=self.toggle_session_lock, width=100, corner_radius=10,
+            font=("Arial", 14, "bold"), fg_color="#6272a4", hover_color="#bd93f9", text_color="#f8f8f2"
+        )
+        self.unlock_button.pack(side="left", padx=5)
+        
+        ctk.CTkLabel(self.auth_frame, text="Bot:", font=("Arial", 14), text_color="#f1fa8c").pack(side="left", padx=10)
+        self.bot_menu_var = tk.StringVar(value=self.selected_bot)
+        self.bot_menu = ctk.CTkOptionMenu(
+            self.auth_frame, values=list(self.bot_profiles), variable=self.bot_menu_var, command=self.select_bot,
+            width=140, font=("Arial", 14)
+        )
+        self.bot_menu.pack(side="left", padx=5)
         
         ctk.CTkLabel(self.auth_frame, text="Discord Token:", font=("Arial", 14), text_color="#f1fa8c").pack(side="left", padx=10)
-        self.token_entry = ctk.CTkEntry(self.auth_frame, show="*", width=350, font=("Arial", 14))
+        self.token_entry = ctk.CTkEntry(self.auth_frame, show="*", width=280, font=("Arial", 14))
         self.token_entry.pack(side="left", padx=5)
         
         ctk.CTkButton(
@@ -231,7 +726,7 @@ class DiscordBotManager(ctk.CTk):
         self.editor_frame.grid_columnconfigure(0, weight=1)
         self.editor_frame.grid_rowconfigure(0, weight=1)
         
-        self.editor = CodeEditor(self.editor_frame)
+        self.editor = CodeEditor(self.editor_frame, self.call_soon, self.poll_soon)
         self.editor.pack(fill="both", expand=True)
         
         self.button_frame = ctk.CTkFrame(self.main_frame, corner_radius=10, fg_color="#44475a")
@@ -257,29 +752,77 @@ class DiscordBotManager(ctk.CTk):
             font=("Arial", 14, "bold"), fg_color="#bd93f9", hover_color="#ff79c6", text_color="#1e1e2e",
             compound="left", border_width=2, border_color="#6272a4"
         ).pack(side="left", padx=5)
+        self.hot_reload_button = ctk.CTkButton(
+            self.button_frame, text="♻️ Hot Reload: Off", command=self.toggle_hot_reload, corner_radius=10,
+            font=("Arial", 14, "bold"), fg_color="#6272a4", hover_color="#8be9fd", text_color="#f8f8f2",
+            compound="left", border_width=2, border_color="#bd93f9"
+        )
+        self.hot_reload_button.pack(side="left", padx=5)
+        ctk.CTkButton(
+            self.button_frame, text="🚀 Launch Settings", command=self.open_launch_settings, corner_radius=10,
+            font=("Arial", 14, "bold"), fg_color="#6272a4", hover_color="#8be9fd", text_color="#f8f8f2",
+            compound="left", border_width=2, border_color="#bd93f9"
+        ).pack(side="left", padx=5)
+        ctk.CTkButton(
+            self.button_frame, text="🧠 Memory Report", command=self.memory_report, corner_radius=10,
+            font=("Arial", 14, "bold"), fg_color="#6272a4", hover_color="#8be9fd", text_color="#f8f8f2",
+            compound="left", border_width=2, border_color="#bd93f9"
+        ).pack(side="left", padx=5)
+        self.profile_button = ctk.CTkButton(
+            self.button_frame, text="🔥 Profile: Off", command=self.toggle_profiler, corner_radius=10,
+            font=("Arial", 14, "bold"), fg_color="#6272a4", hover_color="#8be9fd", text_color="#f8f8f2",
+            compound="left", border_width=2, border_color="#bd93f9"
+        )
+        self.profile_button.pack(side="left", padx=5)
         
         self.console_frame = ctk.CTkFrame(self.main_frame, corner_radius=10, fg_color="#282a36")
         self.console_frame.pack(fill="x", pady=(0, 10), padx=10)
         
         ctk.CTkLabel(self.console_frame, text="Console Output", font=("Arial", 14, "bold"), text_color="#f1fa8c").pack(anchor="w", padx=10, pady=5)
-        self.console = ScrolledText(
-            self.console_frame, state="disabled", height=10, bg="#282a36",
-            fg="#f8f8f2", font=("Courier New", 12), borderwidth=0
-        )
-        self.console.pack(fill="x", padx=10, pady=5)
-        self.console.tag_configure("error", foreground="#ff5555")
-        self.console.tag_configure("info", foreground="#50fa7b")
-        self.console.tag_configure("warning", foreground="#f1fa8c")
+        
+        self.filter_bar = ctk.CTkFrame(self.console_frame, corner_radius=10, fg_color="#44475a")
+        self.filter_bar.pack(fill="x", padx=10, pady=(0, 5))
+        self.search_level_var = tk.StringVar(value="Any level")
+        ctk.CTkOptionMenu(
+            self.filter_bar, values=list(SEARCH_LEVELS), variable=self.search_level_var, width=120, font=("Arial", 12)
+        ).pack(side="left", padx=5, pady=5)
+        self.search_period_var = tk.StringVar(value="All time")
+        ctk.CTkOptionMenu(
+            self.filter_bar, values=list(SEARCH_PERIODS), variable=self.search_period_var, width=120, font=("Arial", 12)
+        ).pack(side="left", padx=5, pady=5)
+        self.search_source_entry = ctk.CTkEntry(self.filter_bar, width=160, font=("Arial", 12), placeholder_text="Source (cog, logger)")
+        self.search_source_entry.pack(side="left", padx=5, pady=5)
+        self.search_keyword_entry = ctk.CTkEntry(self.filter_bar, width=240, font=("Arial", 12), placeholder_text="Keywords")
+        self.search_keyword_entry.pack(side="left", padx=5, pady=5)
+        for entry in (self.search_source_entry, self.search_keyword_entry):
+            entry.bind("<Return>", lambda event: self.search_logs())
+        ctk.CTkButton(
+            self.filter_bar, text="🔍 Search", command=self.search_logs, width=90, corner_radius=10,
+            font=("Arial", 12, "bold"), fg_color="#6272a4", hover_color="#bd93f9"
+        ).pack(side="left", padx=5, pady=5)
+        ctk.CTkButton(
+            self.filter_bar, text="📜 Live", command=self.show_live_logs, width=80, corner_radius=10,
+            font=("Arial", 12, "bold"), fg_color="#6272a4", hover_color="#bd93f9"
+        ).pack(side="left", padx=5, pady=5)
+        self.search_status = ctk.CTkLabel(self.filter_bar, text="Live", font=("Arial", 12), text_color="#f8f8f2")
+        self.search_status.pack(side="left", padx=10)
+        self.metrics_view = MetricsView(self.console_frame)
+        self.metrics_view.pack(side="right", fill="y", padx=(5, 10), pady=5)
+        self.console = ConsoleView(self.console_frame, retention=self.console_retention)
+        self.console.pack(side="left", fill="x", expand=True, padx=(10, 5), pady=5)
         
         # Status bar
         self.status_bar = ctk.CTkFrame(self.main_frame, height=30, fg_color="#44475a")
         self.status_bar.pack(fill="x", padx=10)
         self.status_label = ctk.CTkLabel(
-            self.status_bar, text="Bot: Offline | Cogs: 0", font=("Arial", 12), text_color="#f1fa8c"
+            self.status_bar, text="Bots: 0/1 running | Cogs: 0", font=("Arial", 12), text_color="#f1fa8c"
         )
         self.status_label.pack(side="left", padx=10)
         
         self.load_files()
+        # The explorer follows cogs/ from here on; hot reload is done by the daemon.
+        self.cog_watcher = CogWatcher(self.cog_index, self.on_cog_files_changed)
+        self.cog_watcher.start()
     
     def toggle_sidebar(self):
         if self.sidebar_visible:
@@ -292,43 +835,65 @@ class DiscordBotManager(ctk.CTk):
             self.sidebar_visible = True
     
     def show_context_menu(self, event):
-        selection = self.file_tree.curselection()
-        if selection:
-            self.file_tree.selection_set(selection)
+        row = self.file_tree.identify_row(event.y)
+        if row:
+            self.file_tree.selection_set(row)
             self.context_menu.post(event.x_root, event.y_root)
     
+    def selected_cog_file(self):
+        # Path of the selected file under cogs/ with "/" separators, None for folders.
+        selection = self.file_tree.selection()
+        if not selection or "folder" in self.file_tree.item(selection[0], "tags"):
+            return None
+        return selection[0]
+    
     def open_selected_file(self):
-        selection = self.file_tree.curselection()
-        if selection:
-            file_name = self.file_tree.get(selection[0]).replace("📜 ", "")
-            file_path = os.path.join("cogs", file_name)
-            content = load_file(file_path)
-            self.editor.delete(1.0, tk.END)
-            self.editor.insert(tk.END, content)
-            self.current_file = file_path
-            self.editor.highlight()
-            self.log(f"Opened {file_name}", tag="info")
+        # Read on the file worker; only the latest open is shown.
+        rel = self.selected_cog_file()
+        if rel:
+            self._open_id += 1
+            open_id = self._open_id
+            file_path = self.cog_index.path(rel)
+            self.file_worker.load(
+                file_path, lambda result, error: self.call_soon(self.on_file_loaded, open_id, rel, file_path, result, error)
+            )
+            self.poll_soon()
+    
+    def on_file_loaded(self, open_id, file_name, file_path, result, error):
+        if open_id != self._open_id:
+            return
+        if error is not None:
+            self.log(f"Error opening {file_name}: {str(error)}", tag="error")
+            return
+        content, digest, newline = result
+        self.editor.delete(1.0, tk.END)
+        self.editor.insert(tk.END, content)
+        self.current_file = file_path
+        self.current_digest = digest
+        self.current_newline = newline
+        self.editor.highlight()
+        self.log(f"Opened {file_name}", tag="info")
     
     def delete_selected_file(self):
-        selection = self.file_tree.curselection()
-        if selection:
-            file_name = self.file_tree.get(selection[0]).replace("📜 ", "")
-            file_path = os.path.join("cogs", file_name)
+        rel = self.selected_cog_file()
+        if rel:
+            file_name = rel
+            file_path = self.cog_index.path(rel)
             if messagebox.askyesno("Confirm Delete", f"Delete {file_name}?"):
                 try:
                     os.remove(file_path)
-                    self.load_files()
+                    self.refresh_cogs([rel.rpartition("/")[0]])
                     self.log(f"Deleted {file_name}", tag="info")
                     if self.current_file == file_path:
-                        self.current_file = None
+                        self.current_file = self.current_digest = None
                         self.editor.delete(1.0, tk.END)
                 except Exception as e:
                     self.log(f"Error deleting {file_name}: {str(e)}", tag="error")
     
     def rename_selected_file(self):
-        selection = self.file_tree.curselection()
-        if selection:
-            file_name = self.file_tree.get(selection[0]).replace("📜 ", "")
+        rel = self.selected_cog_file()
+        if rel:
+            folder, _, file_name = rel.rpartition("/")
             dialog = Toplevel(self)
             dialog.title("Rename Cog")
             dialog.geometry("400x150")
@@ -344,11 +909,11 @@ class DiscordBotManager(ctk.CTk):
                 if not new_name.endswith(".py") or not new_name[:-3].isidentifier():
                     messagebox.showerror("Error", "Invalid file name")
                     return
-                old_path = os.path.join("cogs", file_name)
-                new_path = os.path.join("cogs", new_name)
+                old_path = self.cog_index.path(rel)
+                new_path = self.cog_index.path(f"{folder}/{new_name}" if folder else new_name)
                 try:
                     os.rename(old_path, new_path)
-                    self.load_files()
+                    self.refresh_cogs([folder])
                     self.log(f"Renamed {file_name} to {new_name}", tag="info")
                     if self.current_file == old_path:
                         self.current_file = new_path
@@ -364,7 +929,7 @@ class DiscordBotManager(ctk.CTk):
     def open_editor_settings(self):
         dialog = Toplevel(self)
         dialog.title("Editor Settings")
-        dialog.geometry("400x150")
+        dialog.geometry("400x310")
         dialog.configure(bg="#282a36")
         
         ctk.CTkLabel(dialog, text="Font Size:", font=("Arial", 14), text_color="#f1fa8c").pack(pady=10)
@@ -372,19 +937,141 @@ class DiscordBotManager(ctk.CTk):
         font_size_entry.insert(0, str(self.editor_font_size))
         font_size_entry.pack(pady=5)
         
+        ctk.CTkLabel(dialog, text="Disable Highlighting Above (lines):", font=("Arial", 14), text_color="#f1fa8c").pack(pady=(10, 5))
+        highlight_limit_entry = ctk.CTkEntry(dialog, width=100, font=("Arial", 14))
+        highlight_limit_entry.insert(0, str(self.editor.highlight_limit))
+        highlight_limit_entry.pack(pady=5)
+        
+        ctk.CTkLabel(dialog, text="Console Retention (lines):", font=("Arial", 14), text_color="#f1fa8c").pack(pady=(10, 5))
+        retention_entry = ctk.CTkEntry(dialog, width=100, font=("Arial", 14))
+        retention_entry.insert(0, str(self.console_retention))
+        retention_entry.pack(pady=5)
+        
         def apply_settings():
             try:
                 new_size = int(font_size_entry.get())
+                highlight_limit = int(highlight_limit_entry.get())
+                retention = int(retention_entry.get())
                 if 8 <= new_size <= 24:
                     self.editor_font_size = new_size
-                    self.editor.text.configure(font=("Courier New", new_size))
-                    self.editor.line_numbers.configure(font=("Courier New", new_size))
-                    self.editor.update_line_numbers()
-                    self.editor.highlight()
+                    self.editor.set_font_size(new_size)
+                if highlight_limit > 0:
+                    self.editor.highlight_limit = highlight_limit
+                if retention > 0 and retention != self.console_retention:
+                    self.console_retention = retention
+                    self.console.set_retention(retention)
+                self.editor.highlight()
                 self.log("Editor settings updated", tag="info")
                 dialog.destroy()
             except ValueError:
-                messagebox.showerror("Error", "Invalid font size")
+                messagebox.showerror("Error", "Invalid editor setting")
+        
+        ctk.CTkButton(
+            dialog, text="Apply", command=apply_settings, corner_radius=10,
+            font=("Arial", 14, "bold"), fg_color="#bd93f9", hover_color="#ff79c6", text_color="#1e1e2e"
+        ).pack(pady=10)
+    
+    def open_launch_settings(self):
+        dialog = Toplevel(self)
+        dialog.title(f"Launch Settings: {self.selected_bot}")
+        dialog.geometry("400x990")
+        dialog.configure(bg="#282a36")
+        
+        ctk.CTkLabel(dialog, text="Cog Load Concurrency:", font=("Arial", 14), text_color="#f1fa8c").pack(pady=10)
+        concurrency_entry = ctk.CTkEntry(dialog, width=100, font=("Arial", 14))
+        concurrency_entry.insert(0, str(self.launch_options["cog_concurrency"]))
+        concurrency_entry.pack(pady=5)
+        
+        sharded_var = tk.BooleanVar(value=self.launch_options["sharded"])
+        ctk.CTkCheckBox(
+            dialog, text="Sharded (AutoShardedBot)", variable=sharded_var, font=("Arial", 14), text_color="#f1fa8c"
+        ).pack(pady=10)
+        
+        ctk.CTkLabel(dialog, text="Gateway Cache Profile:", font=("Arial", 14), text_color="#f1fa8c").pack(pady=(10, 5))
+        cache_profile_var = tk.StringVar(value=self.launch_options["cache_profile"])
+        ctk.CTkOptionMenu(dialog, values=list(CACHE_PROFILES), variable=cache_profile_var, font=("Arial", 14)).pack(pady=5)
+        
+        send_scheduler_var = tk.BooleanVar(value=self.launch_options["send_scheduler"])
+        ctk.CTkCheckBox(
+            dialog, text="Pace Sends by Rate Limit", variable=send_scheduler_var, font=("Arial", 14), text_color="#f1fa8c"
+        ).pack(pady=10)
+        
+        ctk.CTkLabel(dialog, text="Shard Count (0 = automatic):", font=("Arial", 14), text_color="#f1fa8c").pack(pady=(10, 5))
+        shard_count_entry = ctk.CTkEntry(dialog, width=100, font=("Arial", 14))
+        shard_count_entry.insert(0, str(self.launch_options["shard_count"] or 0))
+        shard_count_entry.pack(pady=5)
+        
+        ctk.CTkLabel(dialog, text="Processes:", font=("Arial", 14), text_color="#f1fa8c").pack(pady=(10, 5))
+        processes_entry = ctk.CTkEntry(dialog, width=100, font=("Arial", 14))
+        processes_entry.insert(0, str(self.launch_options["processes"]))
+        processes_entry.pack(pady=5)
+        
+        message_log = self.launch_options["message_log"]
+        ctk.CTkLabel(dialog, text="Message Log:", font=("Arial", 14), text_color="#f1fa8c").pack(pady=(10, 5))
+        message_log_var = tk.StringVar(value=message_log["mode"])
+        ctk.CTkOptionMenu(dialog, values=list(MESSAGE_LOG_MODES), variable=message_log_var, font=("Arial", 14)).pack(pady=5)
+        
+        ctk.CTkLabel(dialog, text="Sample 1 in N Messages:", font=("Arial", 14), text_color="#f1fa8c").pack(pady=(10, 5))
+        sample_entry = ctk.CTkEntry(dialog, width=100, font=("Arial", 14))
+        sample_entry.insert(0, str(message_log["sample_every"]))
+        sample_entry.pack(pady=5)
+        
+        ctk.CTkLabel(dialog, text="Rate Limit (messages/s):", font=("Arial", 14), text_color="#f1fa8c").pack(pady=(10, 5))
+        rate_entry = ctk.CTkEntry(dialog, width=100, font=("Arial", 14))
+        rate_entry.insert(0, str(message_log["rate"]))
+        rate_entry.pack(pady=5)
+        
+        ctk.CTkLabel(dialog, text="Cogs (comma separated, empty = all):", font=("Arial", 14), text_color="#f1fa8c").pack(pady=(10, 5))
+        cogs_entry = ctk.CTkEntry(dialog, width=300, font=("Arial", 14))
+        cogs_entry.insert(0, ", ".join(self.launch_options["cogs"] or []))
+        cogs_entry.pack(pady=5)
+        
+        ctk.CTkLabel(dialog, text="Memory Limit per Process (MB, 0 = none):", font=("Arial", 14), text_color="#f1fa8c").pack(pady=(10, 5))
+        memory_entry = ctk.CTkEntry(dialog, width=100, font=("Arial", 14))
+        memory_entry.insert(0, str(self.launch_options["max_rss_mb"]))
+        memory_entry.pack(pady=5)
+        
+        ctk.CTkLabel(dialog, text="CPU Priority (nice, 0-19):", font=("Arial", 14), text_color="#f1fa8c").pack(pady=(10, 5))
+        nice_entry = ctk.CTkEntry(dialog, width=100, font=("Arial", 14))
+        nice_entry.insert(0, str(self.launch_options["nice"]))
+        nice_entry.pack(pady=5)
+        
+        name = self.selected_bot
+        
+        def apply_settings():
+            try:
+                concurrency = int(concurrency_entry.get())
+                shard_count = int(shard_count_entry.get())
+                processes = int(processes_entry.get())
+                sample_every = int(sample_entry.get())
+                rate = float(rate_entry.get())
+                max_rss_mb = int(memory_entry.get())
+                nice = int(nice_entry.get())
+                if concurrency < 1 or shard_count < 0 or processes < 1 or sample_every < 1 or rate < 0:
+                    raise ValueError
+                if max_rss_mb < 0 or not 0 <= nice <= 19:
+                    raise ValueError
+                cogs = [cog.strip() for cog in cogs_entry.get().split(",") if cog.strip()] or None
+                policy = {"mode": message_log_var.get(), "sample_every": sample_every, "rate": rate}
+                self.bot_profiles[name].update(
+                    cog_concurrency=concurrency, sharded=sharded_var.get() or processes > 1,
+                    shard_count=shard_count or None, processes=processes, message_log=policy,
+                    cogs=cogs, max_rss_mb=max_rss_mb, nice=nice, send_scheduler=send_scheduler_var.get(),
+                    cache_profile=cache_profile_var.get(),
+                )
+                save_bot_profiles(self.bot_profiles)
+                if name in self.running_bots:
+                    # The message log policy and memory limit apply live; everything else
+                    # waits for a relaunch.
+                    self.daemon_call("configure", name=name, message_log=policy, max_rss_mb=max_rss_mb)
+                    self.log(f"{name}: message log set to {policy['mode']}; other launch settings apply on next launch", tag="info")
+                else:
+                    self.log(f"{name}: launch settings updated (applied on next launch)", tag="info")
+                dialog.destroy()
+            except ValueError:
+                messagebox.showerror("Error", "Invalid launch setting")
+            except Exception as e:
+                self.log(f"Error updating launch settings: {str(e)}", tag="error")
         
         ctk.CTkButton(
             dialog, text="Apply", command=apply_settings, corner_radius=10,
@@ -392,13 +1079,46 @@ class DiscordBotManager(ctk.CTk):
         ).pack(pady=10)
     
     def load_files(self):
-        self.file_tree.delete(0, tk.END)
-        cog_count = 0
-        for file in os.listdir("cogs"):
-            if file.endswith(".py"):
-                self.file_tree.insert(tk.END, f"📜 {file}")
-                cog_count += 1
-        self.update_status(cog_count=cog_count)
+        # Fills the explorer with a full walk of cogs/; later updates arrive as index changes.
+        self.apply_index_changes(self.cog_index.refresh())
+    
+    def refresh_cogs(self, dirs=None):
+        # Picks up our own file operations right away instead of waiting for the watcher.
+        self.apply_index_changes(self.cog_index.refresh(dirs))
+    
+    def apply_index_changes(self, changes):
+        # Touches only the rows that changed. Folders sort before files, both by name.
+        tree = self.file_tree
+        for rel in changes["removed"]:
+            parent, _, name = rel.rpartition("/")
+            if not tree.exists(rel):
+                continue
+            is_folder = "folder" in tree.item(rel, "tags")
+            siblings = self._tree_children.get(parent, [])
+            key = (not is_folder, name.lower(), name)
+            index = bisect_left(siblings, key)
+            if index < len(siblings) and siblings[index] == key:
+                del siblings[index]
+            self._tree_children.pop(rel, None)
+            tree.delete(rel)
+        for entry in changes["added"]:
+            parent, _, name = entry.rel.rpartition("/")
+            if tree.exists(entry.rel) or parent and not tree.exists(parent):
+                continue
+            siblings = self._tree_children.setdefault(parent, [])
+            key = (not entry.is_dir, name.lower(), name)
+            index = bisect_left(siblings, key)
+            siblings.insert(index, key)
+            tree.insert(
+                parent, index, iid=entry.rel, text=f"📁 {name}" if entry.is_dir else f"📜 {name}",
+                tags=("folder",) if entry.is_dir else ("file",)
+            )
+        if changes["added"] or changes["removed"]:
+            self.update_status()
+    
+    def on_cog_files_changed(self, changes):
+        # Runs on the watcher thread.
+        self.call_soon(self.apply_index_changes, changes)
     
     def on_file_select(self, event):
         self.open_selected_file()
@@ -423,23 +1143,30 @@ class DiscordBotManager(ctk.CTk):
             if not cog_name:
                 messagebox.showerror("Error", "Cog name cannot be empty")
                 return
-            file_path = os.path.join("cogs", f"{cog_name}.py")
+            file_path = self.cog_index.path(f"{cog_name}.py")
             template = f"""from discord.ext import commands
 
 class {cog_name.capitalize()}(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # Durable key/value state for this cog. get() is served from memory when it can and
+        # writes are committed in batches on a background thread; await set() to wait for
+        # the commit. Use incr()/update() for read-modify-writes, so concurrent commands do
+        # not lose updates. bot.storage.execute()/fetchall() work on tables of your own.
+        self.store = bot.storage.namespace("{cog_name.lower()}")
     
     @commands.command()
     async def {command_name.lower()}(self, ctx):
-        await ctx.send("Command {command_name.lower()} executed!")
+        uses = await self.store.incr("uses")
+        await ctx.send(f"Command {command_name.lower()} executed! (used {{uses}} times)")
 
 async def setup(bot):
     await bot.add_cog({cog_name.capitalize()}(bot))
 """
-            save_file(file_path, template)
-            self.load_files()
-            self.log(f"New cog {cog_name}.py created with command !{command_name}", tag="info")
+            self.file_worker.save(
+                file_path, template, lambda result, error: self.call_soon(self.on_cog_created, cog_name, command_name, error)
+            )
+            self.poll_soon()
             dialog.destroy()
         
         ctk.CTkButton(
@@ -447,97 +1174,501 @@ async def setup(bot):
             font=("Arial", 14, "bold"), fg_color="#bd93f9", hover_color="#ff79c6", text_color="#1e1e2e"
         ).pack(pady=10)
     
+    def on_cog_created(self, cog_name, command_name, error):
+        if error is not None:
+            self.log(f"Error creating {cog_name}.py: {str(error)}", tag="error")
+            return
+        self.refresh_cogs([""])
+        self.log(f"New cog {cog_name}.py created with command !{command_name}", tag="info")
+    
     def save_current_file(self):
-        if not hasattr(self, "current_file") or self.current_file is None:
+        if self.current_file is None:
             messagebox.showwarning("Warning", "No file selected. Please select a cog from the explorer.")
             self.log("No file selected for saving", tag="error")
             return
-        content = self.editor.get(1.0, tk.END).strip()
-        save_file(self.current_file, content)
+        # Only the snapshot of the text happens here; encoding, hashing and the atomic
+        # write run on the file worker. "end-1c" leaves out the newline Tk always adds.
+        file_path = self.current_file
+        content = self.editor.get(1.0, "end-1c")
+        self.file_worker.save(
+            file_path, content, lambda result, error: self.call_soon(self.on_file_saved, file_path, result, error),
+            digest=self.current_digest, newline=self.current_newline,
+        )
+        self.poll_soon()
+    
+    def on_file_saved(self, file_path, result, error):
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to save file: {str(error)}")
+            self.log(f"Error saving {file_path}: {str(error)}", tag="error")
+            return
+        digest, written = result
+        if file_path == self.current_file:
+            self.current_digest = digest
+        if not written:
+            self.log(f"No changes to save in {file_path}", tag="info")
+            return
         messagebox.showinfo("Saved", "File saved successfully")
-        self.log(f"Saved {self.current_file}", tag="info")
+        self.log(f"Saved {file_path}", tag="info")
     
     def save_token(self):
         token = self.token_entry.get()
-        password = self.password_entry.get()
-        if token and password:
+        if not token:
+            return
+        self.tokens[self.selected_bot] = token
+        tokens = dict(self.tokens)
+        if self.key_session.unlocked:
+            # The cached key makes saving instant; no key derivation here.
             try:
-                encrypted = encrypt_token(token, password)
-                with open("token.enc", "wb") as f:
-                    f.write(encrypted)
-                messagebox.showinfo("Success", "Token encrypted and saved")
-                self.log("Token saved successfully", tag="info")
+                self.key_session.save(json.dumps(tokens))
+                self.on_token_saved(None)
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to save token: {str(e)}")
-                self.log(f"Error saving token: {str(e)}", tag="error")
+                self.on_token_saved(e)
+            return
+        password = self.password_entry.get()
+        if not password:
+            messagebox.showerror("Error", "Enter the master password to save the token")
+            return
+        self.log("Deriving key...", tag="info")
+        
+        def unlocked(stored, error):
+            if error is None:
+                try:
+                    # Keep the tokens of other bots that are only in the file so far.
+                    merged = dict(parse_tokens(stored, DEFAULT_BOT), **tokens)
+                    self.key_session.save(json.dumps(merged))
+                    self.call_soon(self.tokens.update, merged)
+                except Exception as e:
+                    error = e
+            self.call_soon(self.on_token_saved, error)
+        
+        self.key_session.unlock_async(password, unlocked)
+        self.poll_soon()
+    
+    def on_token_saved(self, error):
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to save token: {str(error)}")
+            self.log(f"Error saving token: {str(error)}", tag="error")
+            return
+        self.password_entry.delete(0, tk.END)
+        self.on_session_unlocked()
+        messagebox.showinfo("Success", "Token encrypted and saved")
+        self.log("Token saved successfully", tag="info")
     
     def load_token(self):
-        if os.path.exists("token.enc"):
-            password = self.password_entry.get()
-            if not password:
-                password = get_master_password()
-                self.password_entry.insert(0, password)
+        if os.path.exists(TOKEN_FILE):
+            self.log("Encrypted token found: enter the master password and press 🔓 Unlock", tag="info")
+    
+    def toggle_session_lock(self):
+        if self.key_session.unlocked:
+            self.lock_session("Session locked")
+        else:
+            self.unlock_token()
+    
+    def unlock_token(self):
+        password = self.password_entry.get()
+        if not password:
+            return
+        self.unlock_button.configure(state="disabled", text="⏳ Unlocking")
+        self.key_session.unlock_async(password, lambda token, error: self.call_soon(self.on_token_unlocked, token, error))
+        self.poll_soon()
+    
+    def on_token_unlocked(self, token, error):
+        self.unlock_button.configure(state="normal")
+        if error is not None:
+            self.unlock_button.configure(text="🔓 Unlock")
+            messagebox.showerror("Error", "Invalid master password or corrupted token")
+            self.log(f"Error loading token: {str(error)}", tag="error")
+            return
+        self.password_entry.delete(0, tk.END)
+        if token is not None:
             try:
-                with open("token.enc", "rb") as f:
-                    encrypted = f.read()
-                token = decrypt_token(encrypted, password)
-                self.token_entry.insert(0, token)
-                self.log("Token loaded successfully", tag="info")
-            except Exception as e:
-                messagebox.showerror("Error", "Invalid master password or corrupted token")
-                self.log(f"Error loading token: {str(e)}", tag="error")
+                tokens = parse_tokens(token, self.selected_bot)
+            except ValueError as e:
+                self.log(f"Error reading tokens: {str(e)}", tag="error")
+                tokens = {}
+            # Tokens typed since launch win over the stored ones.
+            self.tokens = dict(tokens, **self.tokens)
+            self.show_token()
+            self.log(f"Tokens loaded for {', '.join(sorted(tokens)) or 'no bots'}", tag="info")
+        self.on_session_unlocked()
+    
+    def on_session_unlocked(self):
+        self._session_was_unlocked = True
+        self.unlock_button.configure(text="🔐 Lock")
+        self.log(f"Session unlocked; it locks after {self.key_session.timeout // 60} min without use", tag="info")
+    
+    def lock_session(self, reason):
+        self.key_session.lock()
+        self._session_was_unlocked = False
+        self.unlock_button.configure(text="🔓 Unlock")
+        if not self.running_bots:
+            self.tokens = {}
+            self.token_entry.delete(0, tk.END)
+        self.log(reason, tag="info")
+    
+    def check_session(self):
+        if self._session_was_unlocked and not self.key_session.unlocked:
+            self.lock_session("Session locked after inactivity")
+        self.after(SESSION_CHECK_INTERVAL, self.check_session)
+    
+    def show_token(self):
+        self.token_entry.delete(0, tk.END)
+        self.token_entry.insert(0, self.tokens.get(self.selected_bot, ""))
+    
+    def select_bot(self, name):
+        if name == self.selected_bot or name not in self.bot_profiles:
+            return
+        token = self.token_entry.get()
+        if token:
+            self.tokens[self.selected_bot] = token
+        self.selected_bot = name
+        self.bot_menu_var.set(name)
+        self.show_token()
+        self.update_profile_button()
+        self.update_status()
+        self.render_bots()
+    
+    def add_bot_dialog(self):
+        dialog = Toplevel(self)
+        dialog.title("Add Bot")
+        dialog.geometry("400x150")
+        dialog.configure(bg="#282a36")
+        
+        ctk.CTkLabel(dialog, text="Bot Name:", font=("Arial", 14), text_color="#f1fa8c").pack(pady=10)
+        name_entry = ctk.CTkEntry(dialog, width=200, font=("Arial", 14))
+        name_entry.pack(pady=5)
+        
+        def add_bot():
+            name = name_entry.get().strip()
+            if not name or "/" in name or name in self.bot_profiles:
+                messagebox.showerror("Error", "Invalid or duplicate bot name")
+                return
+            # New bots start from the selected bot's settings.
+            self.bot_profiles[name] = json.loads(json.dumps(self.launch_options))
+            save_bot_profiles(self.bot_profiles)
+            self.bot_menu.configure(values=list(self.bot_profiles))
+            self.select_bot(name)
+            self.log(f"Added bot {name}; set its token and press 🔒 Save Token", tag="info")
+            dialog.destroy()
+        
+        ctk.CTkButton(
+            dialog, text="Add", command=add_bot, corner_radius=10,
+            font=("Arial", 14, "bold"), fg_color="#bd93f9", hover_color="#ff79c6", text_color="#1e1e2e"
+        ).pack(pady=10)
+    
+    def remove_bot(self):
+        name = self.selected_bot
+        if name in self.running_bots:
+            messagebox.showerror("Error", f"Stop {name} before removing it")
+            return
+        if len(self.bot_profiles) == 1:
+            messagebox.showerror("Error", "At least one bot is needed")
+            return
+        if not messagebox.askyesno("Confirm Remove", f"Remove bot {name}? Its stored token is dropped on the next save."):
+            return
+        del self.bot_profiles[name]
+        self.tokens.pop(name, None)
+        save_bot_profiles(self.bot_profiles)
+        self.bot_menu.configure(values=list(self.bot_profiles))
+        self.token_entry.delete(0, tk.END)
+        self.selected_bot = None
+        self.select_bot(next(iter(self.bot_profiles)))
+        self.log(f"Removed bot {name}", tag="info")
+    
+    @property
+    def running_bots(self):
+        return {entry["name"] for entry in self.bot_stats}
     
     def launch_bot(self):
-        if self.bot_process is None:
-            token = self.token_entry.get()
-            if token:
-                self.bot_process = threading.Thread(target=start_bot, args=(token, self.log_queue))
-                self.bot_process.start()
-                self.bot_running = True
-                self.log("Bot launch initiated", tag="info")
-                self.update_status()
+        name = self.selected_bot
+        if name in self.running_bots:
+            self.log(f"{name} is already running", tag="warning")
+            return
+        token = self.token_entry.get()
+        if token:
+            self.tokens[name] = token
+            self.key_session.touch()
+            self.metrics.clear(name)
+            self.daemon_call("start", self.on_daemon_status, name=name, token=token, options=self.launch_options)
     
     def stop_bot(self):
-        if self.bot_process:
-            stop_bot()
-            self.bot_process = None
-            self.bot_running = False
-            self.log("Bot stopped", tag="info")
-            self.update_status()
+        name = self.selected_bot
+        if name in self.running_bots:
+            self.daemon_call("stop", self.on_daemon_status, name=name)
     
     def reload_cogs(self):
-        if self.bot_process:
-            try:
-                for file in os.listdir("cogs"):
-                    if file.endswith(".py"):
-                        cog_name = file[:-3]
-                        reload_cog(cog_name)
-                        self.log(f"Cog {cog_name} reloaded", tag="info")
-            except Exception as e:
-                self.log(f"Error reloading cogs: {str(e)}", tag="error")
+        if self.running_bots:
+            self.daemon_call("reload")
+    
+    def memory_report(self):
+        name = self.selected_bot
+        if name not in self.running_bots:
+            self.log(f"{name} is not running", tag="warning")
+            return
+        self.daemon_call("memory", lambda reports: self.show_memory_report(name, reports), name=name)
+    
+    def show_memory_report(self, name, reports):
+        for index, report in reports:
+            if report is None:
+                self.log(f"{name} w{index}: no memory report (process busy or restarting)", tag="warning")
+                continue
+            for line in format_memory_report(name, index, report):
+                self.log(line, tag="info")
+    
+    def toggle_profiler(self):
+        # Samples the selected bot's event loop until pressed again; the results open in a window.
+        name = self.selected_bot
+        if name not in self.running_bots:
+            self.log(f"{name} is not running", tag="warning")
+            return
+        if name in self.profiling:
+            self.profile_button.configure(text="🔥 Profile: Stopping...")
+            self.daemon_call("profile", lambda result: self.show_profile(name, result), name=name, action="stop", top=PROFILE_TOP)
+        else:
+            self.daemon_call("profile", name=name, action="start", interval=PROFILE_INTERVAL)
+    
+    def update_profile_button(self):
+        self.profile_button.configure(text=f"🔥 Profile: {'On' if self.selected_bot in self.profiling else 'Off'}")
     
-    def process_logs(self):
-        while True:
+    def show_profile(self, name, result):
+        self.update_profile_button()
+        dialog = Toplevel(self)
+        dialog.title(f"Profile: {name}")
+        dialog.geometry("900x600")
+        dialog.configure(bg="#282a36")
+        text = ScrolledText(
+            dialog, bg="#282a36", fg="#f8f8f2", font=("Courier New", 12), borderwidth=0, wrap="none"
+        )
+        text.pack(fill="both", expand=True, padx=10, pady=10)
+        text.tag_configure("header", foreground="#bd93f9")
+        for line in format_summary(name, result):
+            text.insert(tk.END, line + "\n", () if line.startswith(" ") else "header")
+        text.config(state="disabled")
+    
+    def toggle_hot_reload(self):
+        self.daemon_call("hot_reload", self.on_daemon_status, enabled=not self.hot_reload)
+    
+    def connect_daemon(self, spawn=True):
+        # Connecting (and starting the daemon when nobody listens) happens on a worker thread.
+        def run():
             try:
-                message = self.log_queue.get_nowait()
-                tag = "error" if "ERROR" in message else ("warning" if "WARNING" in message else "info")
-                self.log(message, tag=tag)
-            except queue.Empty:
-                pass
-            time.sleep(0.1)
+                if spawn:
+                    client = connect_or_spawn(DEFAULT_ADDRESS, on_event=self.on_daemon_event, on_close=self.on_daemon_closed)
+                else:
+                    client = RpcClient(DEFAULT_ADDRESS, on_event=self.on_daemon_event, on_close=self.on_daemon_closed)
+            except (OSError, RpcError) as e:
+                self.call_soon(self.on_daemon_unavailable, str(e), spawn)
+                return
+            self.call_soon(self.on_daemon_connected, client)
+        
+        threading.Thread(target=run, name="daemon-connect", daemon=True).start()
+        self.poll_soon()
+    
+    def on_daemon_connected(self, client):
+        if client.closed:
+            self.on_daemon_unavailable("connection closed", True)
+            return
+        self.daemon = client
+        self.log(f"Connected to the bot daemon at {DEFAULT_ADDRESS}", tag="info")
+        self.daemon_call("subscribe", self.on_daemon_status)
+    
+    def on_daemon_unavailable(self, reason, report):
+        # Reported once; later retries stay quiet until they succeed.
+        if report:
+            self.log(f"Bot daemon unavailable ({reason}); retrying", tag="warning")
+        self.after(DAEMON_RETRY_INTERVAL, self.connect_daemon, False)
+    
+    def on_daemon_closed(self):
+        self.call_soon(self.on_daemon_lost)
+    
+    def on_daemon_lost(self):
+        if self.daemon is None or not self.daemon.closed:
+            return
+        self.daemon = None
+        self.bot_stats = []
+        self.shard_states = {}
+        self.profiling = set()
+        self.update_profile_button()
+        self.log("Lost the connection to the bot daemon; reconnecting", tag="warning")
+        self.render_bots()
+        self.update_status()
+        self.after(DAEMON_RETRY_INTERVAL, self.connect_daemon, False)
+    
+    def daemon_call(self, method, on_result=None, **params):
+        # Replies come back on the RPC reader thread and are handed to the Tk thread.
+        if self.daemon is None:
+            self.log("Not connected to the bot daemon", tag="error")
+            return
+        
+        def done(result, error):
+            if error is not None:
+                self.call_soon(self.log, f"{method} failed: {error}", "error")
+            elif on_result is not None:
+                self.call_soon(on_result, result)
+        
+        self.daemon.call(method, done, **params)
+        self.poll_soon()
+    
+    def on_daemon_event(self, event, data):
+        # Runs on the RPC reader thread. Log lines go straight into the pump's queue.
+        if event == "log":
+            self._pending_logs.extend(LogEntry(*record) for record in data)
+        elif event == "dropped":
+            self._pending_logs.append(LogEntry(time.time(), "WARNING", "manager", f"{data} log lines skipped while the console caught up"))
+        elif event == "status":
+            self.call_soon(self.on_daemon_status, data)
+        elif event == "metrics":
+            self.call_soon(self.on_daemon_metrics, data)
+    
+    def on_daemon_status(self, status):
+        self.bot_stats = status["bots"]
+        self.shard_states = {(bot, shard): state for bot, shard, state in status["shards"]}
+        if status["hot_reload"] != self.hot_reload:
+            self.hot_reload = status["hot_reload"]
+            self.hot_reload_button.configure(text=f"♻️ Hot Reload: {'On' if self.hot_reload else 'Off'}")
+        self.profiling = set(status["profiling"])
+        self.update_profile_button()
+        self.update_status()
+        self.render_bots()
+    
+    def on_daemon_metrics(self, data):
+        self.metrics.update((data["bot"], data["worker"]), decode_snapshot(data["snapshot"]))
+        self.metrics_view.render(self.metrics)
+    
+    def call_soon(self, callback, *args):
+        # Lets worker threads run code on the Tk thread; picked up by the next pump_logs tick.
+        self._ui_calls.append((callback, args))
+    
+    def poll_soon(self):
+        # Drops the pump to its fastest rate while a worker thread result is expected.
+        self._log_pump_interval = LOG_PUMP_MIN_INTERVAL
+        if self._log_pump_job is not None:
+            self.after_cancel(self._log_pump_job)
+            self._log_pump_job = self.after(LOG_PUMP_MIN_INTERVAL, self.pump_logs)
+    
+    def render_bots(self):
+        self.bots_view.render(self.bot_profiles, self.bot_stats, self.selected_bot)
+    
+    def search_logs(self):
+        # Queries run on a worker thread; only the latest search is shown.
+        self._search_id += 1
+        search_id = self._search_id
+        period = SEARCH_PERIODS[self.search_period_var.get()]
+        query = {
+            "levels": SEARCH_LEVELS[self.search_level_var.get()],
+            "source": self.search_source_entry.get().strip() or None,
+            "keyword": self.search_keyword_entry.get().strip() or None,
+            "since": time.time() - period if period else None,
+            "limit": SEARCH_LIMIT,
+        }
+        self.search_status.configure(text="Searching...")
+        self.daemon_call("search", lambda result: self.show_search_results(search_id, result), **query)
+    
+    def show_search_results(self, search_id, result):
+        if search_id != self._search_id:
+            return
+        entries = [LogEntry(*record) for record in result["entries"]]
+        self.console.show_results(entries)
+        more = "+" if len(entries) >= SEARCH_LIMIT else ""
+        self.search_status.configure(
+            text=f"{len(entries)}{more} matches, {result['blocks_read']}/{result['blocks_total']} blocks read in {result['ms']:.0f} ms"
+        )
+    
+    def show_live_logs(self):
+        self._search_id += 1
+        self.console.show_live()
+        self.search_status.configure(text="Live")
+    
+    def on_map(self, event):
+        if event.widget is self and not self._painted:
+            self._painted = True
+            self.after_idle(self.on_first_paint)
+    
+    def on_first_paint(self):
+        # Work that does not need to happen before the window is visible starts here.
+        paint_ms = (time.perf_counter() - STARTED) * 1000
+        if self.exit_after_paint:
+            print(f"First paint after {paint_ms:.0f} ms", flush=True)
+            self.quit()
+            return
+        self.log(f"Window ready in {paint_ms:.0f} ms", tag="info")
+        self.connect_daemon()
+    
+    def on_close(self):
+        # Saves and new cogs still queued on the file worker are written before the window
+        # goes away; the worker is a daemon thread and would be cut off at exit.
+        self.file_worker.stop()
+        self.file_worker.join(timeout=CLOSE_SAVE_TIMEOUT)
+        if self.file_worker.is_alive():
+            messagebox.showwarning("Warning", "Files were still being saved when the window closed; check the last changes.")
+        self.destroy()
+    
+    def pump_logs(self):
+        # Runs on the Tk thread: drains everything that is waiting in one batch and polls
+        # faster while messages keep arriving, backing off when the queue is idle.
+        self._log_pump_job = None
+        while self._ui_calls:
+            callback, args = self._ui_calls.popleft()
+            callback(*args)
+        batch = []
+        while self._pending_logs and len(batch) < LOG_BATCH_SIZE:
+            batch.append(self._pending_logs.popleft())
+        
+        if batch:
+            self.console.append(batch)
+        if len(batch) >= LOG_BATCH_SIZE:
+            self._log_pump_interval = LOG_PUMP_MIN_INTERVAL
+        elif batch:
+            self._log_pump_interval = max(LOG_PUMP_MIN_INTERVAL, self._log_pump_interval // 2)
+        else:
+            self._log_pump_interval = min(LOG_PUMP_MAX_INTERVAL, self._log_pump_interval * 2)
+        self._log_pump_job = self.after(self._log_pump_interval, self.pump_logs)
     
     def log(self, message, tag="info"):
-        self.console.config(state="normal")
-        self.console.insert(tk.END, f"{message}\n", tag)
-        self.console.see(tk.END)
-        self.console.config(state="disabled")
-    
-    def update_status(self, cog_count=None):
-        if cog_count is None:
-            cog_count = len([f for f in os.listdir("cogs") if f.endswith(".py")])
-        status = "Online" if self.bot_running else "Offline"
-        self.status_label.configure(text=f"Bot: {status} | Cogs: {cog_count}")
+        # Safe from any thread; messages logged on the Tk thread are flushed on the next idle.
+        level = {"error": "ERROR", "warning": "WARNING"}.get(tag, "INFO")
+        self._pending_logs.append(LogEntry(time.time(), level, "manager", message))
+        if threading.current_thread() is threading.main_thread() and self._log_pump_job is not None:
+            self.after_cancel(self._log_pump_job)
+            self._log_pump_job = self.after_idle(self.pump_logs)
+    
+    def update_status(self):
+        cog_count = len(self.cog_index.extension_files())
+        text = f"Bots: {len(self.bot_stats)}/{len(self.bot_profiles)} running | Cogs: {cog_count}"
+        if self.daemon is None:
+            text += " | Daemon: not connected"
+        bot = next((entry for entry in self.bot_stats if entry["name"] == self.selected_bot), None)
+        if bot is not None:
+            states = [state for (name, _), state in self.shard_states.items() if name == bot["name"]]
+            ready = sum(1 for state in states if state == "ready")
+            text += f" | {bot['name']}: Shards {ready}/{len(states) or '?'} ready, Processes {bot['alive']}/{bot['processes']}"
+        self.status_label.configure(text=text)
+
+def profile_imports(top=25):
+    # Starts the manager under ``-X importtime``, closes it at first paint and lists the
+    # imports that cost the most.
+    import subprocess
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--exit-after-paint"],
+        capture_output=True, text=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            imports.append((int(cumulative), int(own), name.rstrip()))
+    print(result.stdout.strip() or "The manager exited before its first paint")
+    for title, key in (("cumulative", lambda item: item[0]), ("self", lambda item: item[1])):
+        print(f"\nSlowest imports by {title} time:")
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for cumulative, own, name in sorted(imports, key=key, reverse=True)[:top]:
+            print(f"{cumulative / 1000:>14.1f} {own / 1000:>9.1f}  {name}")
+    return result.returncode
 
 if __name__ == "__main__":
-    app = DiscordBotManager()
+    if "--profile-imports" in sys.argv:
+        sys.exit(profile_imports())
+    app = DiscordBotManager(exit_after_paint="--exit-after-paint" in sys.argv)
     app.mainloop()
\ No newline at end of file
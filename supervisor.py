@@ -0,0 +1,298 @@
+import os
+import threading
+import time
+from utils.ipc import Channel, ACK, EXIT, HEALTH
+from utils.procstats import process_stats
+
+# Process management for the bots. This module is all the manager needs; bot_core (and with
+# it asyncio and discord.py) is only imported when a worker process is spawned.
+RESTART_BACKOFF = (1, 2, 5, 10, 30, 60)
+STABLE_AFTER = 60
+CHECK_INTERVAL = 0.5
+HEALTH_INTERVAL = 10.0
+HEALTH_TIMEOUT = 30.0
+STATS_INTERVAL = 2.0
+
+def split_shards(shard_count, processes):
+    # Contiguous shard id ranges, one per worker process.
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+class Worker:
+    def __init__(self, index, options):
+        self.index = index
+        self.options = options
+        self.process = None
+        self.channel = None
+        self.started = 0.0
+        self.failures = 0
+        self.restarts = 0
+        self.restart_at = None
+        # Set when check() stopped the process itself (health or memory). Such a worker is
+        # restarted even when it exits cleanly, as it does on SIGTERM.
+        self.killed = False
+        # Health: any message proves the bot's event loop is running; a ping is only sent
+        # after HEALTH_INTERVAL of silence.
+        self.last_seen = 0.0
+        self.ping_sent = None
+        self.cpu_percent = None
+        self.rss = None
+        self._cpu_sample = None
+
+    @property
+    def shard_ids(self):
+        return self.options.get("shard_ids") or [0]
+
+class BotSupervisor:
+    # Owns one bot's worker processes: one per shard range when ``processes`` > 1. poll() is
+    # driven by the caller's loop; it drains every worker channel, pings silent workers,
+    # kills hung ones or ones over ``max_rss_mb`` and restarts crashed workers with an
+    # increasing backoff.
+    def __init__(self, token, options=None, name="bot"):
+        self.name = name
+        self.token = token
+        self.options = dict(options or {})
+        # Each bot keeps its cogs' storage (bot.storage) in a file of its own.
+        self.options.setdefault("storage_path", os.path.join("data", f"{name}.db"))
+        self.workers = []
+        self.started = None
+        processes = self.options.get("processes", 1)
+        if processes > 1:
+            shard_count = self.options.get("shard_count") or processes
+            for index, shard_ids in enumerate(split_shards(shard_count, processes)):
+                worker_options = dict(self.options, sharded=True, shard_count=shard_count, shard_ids=shard_ids)
+                self.workers.append(Worker(index, worker_options))
+        else:
+            self.workers.append(Worker(0, self.options))
+
+    def start(self):
+        self.started = time.time()
+        for worker in self.workers:
+            self._spawn(worker)
+
+    def _spawn(self, worker):
+        import multiprocessing
+        from bot_core import run_bot
+        parent_conn, child_conn = multiprocessing.Pipe()
+        worker.process = multiprocessing.Process(
+            target=run_bot, args=(self.token, child_conn, worker.options), daemon=True,
+            name=f"bot-{self.name}-{worker.index}"
+        )
+        worker.process.start()
+        child_conn.close()
+        worker.channel = Channel(parent_conn)
+        worker.started = worker.last_seen = time.monotonic()
+        worker.ping_sent = None
+        worker.restart_at = None
+        worker.killed = False
+        worker.cpu_percent = worker.rss = worker._cpu_sample = None
+
+    def poll(self, limit):
+        messages = []
+        for worker in self.workers:
+            if worker.channel is not None:
+                messages.extend(self.read(worker, limit - len(messages)))
+        messages.extend(self.check())
+        return messages
+
+    def read(self, worker, limit):
+        messages = []
+        received = worker.channel.receive(max(0, limit))
+        if received:
+            worker.last_seen = time.monotonic()
+            worker.ping_sent = None
+        for kind, payload in received:
+            if kind == ACK and payload["op"] == "ping":
+                continue
+            messages.append((worker, kind, payload))
+        return messages
+
+    def check(self):
+        # Exits, restarts, health and limits; cheap enough to run a few times per second.
+        messages = []
+        now = time.monotonic()
+        max_rss = self.options.get("max_rss_mb") or 0
+        for worker in self.workers:
+            if worker.channel is not None:
+                if not worker.process.is_alive():
+                    messages.extend((worker, kind, payload) for kind, payload in worker.channel.receive(1 << 30))
+                    worker.channel.close()
+                    worker.channel = None
+                    delay = None
+                    if worker.process.exitcode != 0 or worker.killed:
+                        if now - worker.started > STABLE_AFTER:
+                            worker.failures = 0
+                        delay = RESTART_BACKOFF[min(worker.failures, len(RESTART_BACKOFF) - 1)]
+                        worker.failures += 1
+                        worker.restart_at = now + delay
+                    messages.append((worker, EXIT, {"exitcode": worker.process.exitcode, "restart_in": delay}))
+                elif worker.ping_sent is not None and now - worker.ping_sent > HEALTH_TIMEOUT:
+                    # A hung or stopped process may never act on SIGTERM.
+                    worker.process.kill()
+                    worker.killed = True
+                    messages.append((worker, HEALTH, {"state": "unresponsive", "detail": f"no reply for {now - worker.last_seen:.0f} s"}))
+                    worker.ping_sent = None
+                    worker.last_seen = now
+                elif max_rss and worker.rss is not None and worker.rss > max_rss * 2**20:
+                    worker.process.terminate()
+                    worker.killed = True
+                    messages.append((worker, HEALTH, {"state": "memory", "detail": f"{worker.rss / 2**20:.0f} MB over the {max_rss} MB limit"}))
+                    worker.rss = None
+                elif worker.ping_sent is None and now - worker.last_seen > HEALTH_INTERVAL:
+                    worker.ping_sent = now
+                    worker.channel.request("ping")
+            elif worker.restart_at is not None and now >= worker.restart_at:
+                worker.restarts += 1
+                self._spawn(worker)
+        return messages
+
+    def sample(self):
+        # Called from the stats thread; updates each worker's CPU share and RSS.
+        for worker in self.workers:
+            process = worker.process
+            stats = process_stats(process.pid) if process is not None and worker.channel is not None else None
+            if stats is None:
+                worker.cpu_percent = worker.rss = worker._cpu_sample = None
+                continue
+            cpu, worker.rss = stats
+            now = time.monotonic()
+            if worker._cpu_sample is not None:
+                last_cpu, last_time = worker._cpu_sample
+                worker.cpu_percent = (cpu - last_cpu) / max(now - last_time, 1e-6) * 100
+            worker._cpu_sample = (cpu, now)
+
+    def stats(self):
+        alive = sum(1 for worker in self.workers if worker.channel is not None)
+        restarting = any(worker.restart_at is not None for worker in self.workers)
+        cpu = [worker.cpu_percent for worker in self.workers if worker.cpu_percent is not None]
+        rss = [worker.rss for worker in self.workers if worker.rss is not None]
+        if alive == len(self.workers):
+            state = "running"
+        elif alive or restarting:
+            state = "restarting" if restarting and not alive else "degraded"
+        else:
+            state = "stopped"
+        return {
+            "name": self.name, "state": state, "alive": alive, "processes": len(self.workers),
+            "cpu_percent": sum(cpu) if cpu else None, "rss": sum(rss) if rss else None,
+            "restarts": sum(worker.restarts for worker in self.workers),
+            "uptime": time.time() - self.started if self.started and alive else None,
+        }
+
+    def update_options(self, **options):
+        # Applies to workers started or restarted from now on.
+        self.options.update(options)
+        for worker in self.workers:
+            worker.options.update(options)
+
+    def broadcast(self, op, name=None, **args):
+        sent = [worker.channel.request(op, name, **args) for worker in self.workers if worker.channel is not None]
+        if not any(sent):
+            raise Exception(f"Bot {self.name} is not reachable")
+        return sent
+
+    def is_alive(self):
+        return any(worker.channel is not None or worker.restart_at is not None for worker in self.workers)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.restart_at = None
+            if worker.process is not None and worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.kill()
+                    worker.process.join(timeout=1)
+            if worker.channel is not None:
+                worker.channel.close()
+                worker.channel = None
+
+class BotFleet:
+    # Several named bots, each with its own token, options and BotSupervisor. poll() makes
+    # one wait() over every worker pipe and only reads the ones that have data, so idle bots
+    # cost nothing per tick; exits, health and limits are checked every CHECK_INTERVAL. CPU
+    # and memory are sampled on a background thread and read through stats().
+    def __init__(self, stats_interval=STATS_INTERVAL):
+        self.bots = {}
+        self.stats_interval = stats_interval
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._sampler = None
+
+    def start(self, name, token, options=None):
+        if name in self.bots:
+            raise Exception(f"Bot {name} is already running")
+        bot = BotSupervisor(token, options, name=name)
+        bot.start()
+        with self._lock:
+            self.bots[name] = bot
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample, name="bot-stats", daemon=True)
+            self._sampler.start()
+        return bot
+
+    def remove(self, name):
+        # Takes a bot out of the fleet without stopping it, for callers that stop it elsewhere.
+        with self._lock:
+            return self.bots.pop(name, None)
+
+    def stop(self, name):
+        bot = self.remove(name)
+        if bot is not None:
+            bot.stop()
+        return bot is not None
+
+    def stop_all(self):
+        for name in list(self.bots):
+            self.stop(name)
+
+    def get(self, name):
+        bot = self.bots.get(name)
+        if bot is None:
+            raise Exception(f"Bot {name} is not running")
+        return bot
+
+    def send(self, name, op, cog=None, **args):
+        return self.get(name).broadcast(op, cog, **args)
+
+    def poll(self, limit):
+        # (bot, worker, kind, payload) for everything waiting, at most ``limit`` messages
+        # plus exit and health events.
+        from multiprocessing.connection import wait
+        messages = []
+        owners = {
+            worker.channel.conn: (bot, worker)
+            for bot in list(self.bots.values()) for worker in bot.workers if worker.channel is not None
+        }
+        for conn in (wait(list(owners), timeout=0) if owners else ()):
+            if len(messages) >= limit:
+                break
+            bot, worker = owners[conn]
+            messages.extend((bot,) + message for message in bot.read(worker, limit - len(messages)))
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + CHECK_INTERVAL
+            for bot in list(self.bots.values()):
+                messages.extend((bot,) + message for message in bot.check())
+        return messages
+
+    def stats(self):
+        return [bot.stats() for bot in list(self.bots.values())]
+
+    def _sample(self):
+        while not self._stop_event.wait(self.stats_interval):
+            for bot in list(self.bots.values()):
+                bot.sample()
+
+    def close(self):
+        self._stop_event.set()
+        self.stop_all()
@@ -0,0 +1,276 @@
+import asyncio
+import functools
+import inspect
+import sys
+import time
+from collections import OrderedDict
+
+# Used when a cog module does not set CACHE_BUDGET_MB.
+DEFAULT_BUDGET_MB = 16
+_SIZE_DEPTH = 4
+
+
+def mark_coroutine(obj):
+    # Makes asyncio.iscoroutinefunction() true for ``obj``, which discord.py checks before
+    # accepting a command or listener callback. markcoroutinefunction is Python 3.12+.
+    if hasattr(inspect, "markcoroutinefunction"):
+        inspect.markcoroutinefunction(obj)
+    else:
+        obj._is_coroutine = asyncio.coroutines._is_coroutine
+
+
+def estimate_size(value, depth=_SIZE_DEPTH):
+    # Rough bytes held by ``value``: getsizeof plus containers, __dict__ and __slots__ a few
+    # levels deep. Good enough for budgets; @cached(size=...) can replace it.
+    size = sys.getsizeof(value, 64)
+    if depth <= 0 or isinstance(value, (str, bytes, bytearray, int, float, bool)) or value is None:
+        return size
+    depth -= 1
+    if isinstance(value, dict):
+        return size + sum(estimate_size(k, depth) + estimate_size(v, depth) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(estimate_size(item, depth) for item in value)
+    if hasattr(value, "__dict__"):
+        size += estimate_size(vars(value), depth)
+    for slot in getattr(type(value), "__slots__", ()):
+        size += estimate_size(getattr(value, slot, None), depth)
+    return size
+
+
+class CacheEntry:
+    __slots__ = ("value", "expires", "size")
+
+    def __init__(self, value, expires, size):
+        self.value = value
+        self.expires = expires
+        self.size = size
+
+
+class CacheOwner:
+    # Everything cached by one module (a cog), sharing its memory budget. ``order`` holds
+    # (cache, key) pairs least recently used first, across all of the module's caches.
+    def __init__(self, module):
+        self.module = module
+        self.budget = None
+        self.caches = []
+        self.order = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def attach(self, cache):
+        if not self.caches:
+            # First cache since the module was (re)loaded, which has finished importing by now.
+            self.budget = int(getattr(sys.modules.get(self.module), "CACHE_BUDGET_MB", DEFAULT_BUDGET_MB) * 2**20)
+        self.caches.append(cache)
+
+    def wipe(self):
+        # Counters survive a reload so the manager's totals keep counting up.
+        for cache in self.caches:
+            cache.entries.clear()
+            cache.owner = None
+            cache.retired = True
+        self.caches = []
+        self.order.clear()
+        self.bytes = 0
+
+    def evict_to_budget(self):
+        while self.bytes > self.budget and self.order:
+            (cache, key), _ = self.order.popitem(last=False)
+            cache.discard(key)
+            self.evictions += 1
+
+    def stats(self):
+        entries = sum(len(cache.entries) for cache in self.caches)
+        return (self.hits, self.misses, self.evictions, self.coalesced, entries, self.bytes, self.budget or 0)
+
+
+class CacheRegistry:
+    # One per bot process, holding an owner for every module that has cached something.
+    def __init__(self):
+        self.owners = {}
+
+    def owner(self, module):
+        owner = self.owners.get(module)
+        if owner is None:
+            owner = self.owners[module] = CacheOwner(module)
+        return owner
+
+    def wipe(self, extension):
+        # Drops every cache of ``extension`` ("cogs.name") and its submodules, e.g. when the
+        # cog is reloaded or unloaded. The reloaded module registers fresh caches.
+        prefix = extension + "."
+        for module, owner in self.owners.items():
+            if module == extension or module.startswith(prefix):
+                owner.wipe()
+
+    def stats(self):
+        # {cog: (hits, misses, evictions, coalesced, entries, bytes, budget)} for BotMetrics.
+        return {module[5:] if module.startswith("cogs.") else module: owner.stats() for module, owner in self.owners.items()}
+
+
+registry = CacheRegistry()
+
+
+class CachedFunction:
+    def __init__(self, func, ttl, maxsize, size):
+        self.func = func
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.size = size
+        self.is_async = asyncio.iscoroutinefunction(func)
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.owner = None
+        # Set once the module is reloaded; the old function then just calls through.
+        self.retired = False
+        functools.update_wrapper(self, func)
+        if self.is_async:
+            mark_coroutine(self)
+
+    def __get__(self, instance, owner=None):
+        # Lets the decorator sit on cog methods; ``self`` is part of the key.
+        if instance is None:
+            return self
+        return BoundCachedFunction(self, instance)
+
+    def _owner(self):
+        if self.owner is None:
+            self.owner = registry.owner(self.func.__module__)
+            self.owner.attach(self)
+        return self.owner
+
+    @staticmethod
+    def _key(args, kwargs):
+        key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _lookup(self, key):
+        owner = self._owner()
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry.expires is not None and entry.expires <= time.monotonic():
+                self.discard(key)
+                owner.order.pop((self, key), None)
+                owner.evictions += 1
+            else:
+                self.entries.move_to_end(key)
+                owner.order.move_to_end((self, key))
+                owner.hits += 1
+                return entry
+        return None
+
+    def _store(self, key, value):
+        owner = self._owner()
+        if key in self.entries:
+            self.discard(key)
+            owner.order.pop((self, key), None)
+        entry = CacheEntry(value, time.monotonic() + self.ttl if self.ttl else None, self.size(value))
+        self.entries[key] = entry
+        owner.order[(self, key)] = None
+        owner.bytes += entry.size
+        if self.maxsize and len(self.entries) > self.maxsize:
+            oldest = next(iter(self.entries))
+            self.discard(oldest)
+            owner.order.pop((self, oldest), None)
+            owner.evictions += 1
+        owner.evict_to_budget()
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None and self.owner is not None:
+            self.owner.bytes -= entry.size
+
+    def invalidate(self, *args, **kwargs):
+        # Forgets the result for exactly these arguments (including ``self`` for methods).
+        key = self._key(args, kwargs)
+        if key is not None and key in self.entries:
+            self.discard(key)
+            if self.owner is not None:
+                self.owner.order.pop((self, key), None)
+
+    def clear(self):
+        for key in list(self.entries):
+            self.discard(key)
+            if self.owner is not None:
+                self.owner.order.pop((self, key), None)
+
+    def __call__(self, *args, **kwargs):
+        key = None if self.retired else self._key(args, kwargs)
+        if key is None:
+            return self.func(*args, **kwargs)
+        if self.is_async:
+            return self._call_async(key, args, kwargs)
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry.value
+        self.owner.misses += 1
+        value = self.func(*args, **kwargs)
+        self._store(key, value)
+        return value
+
+    async def _call_async(self, key, args, kwargs):
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry.value
+        task = self.inflight.get(key)
+        if task is not None:
+            # An identical call is already running; share its result. Counted as coalesced
+            # only, not as a miss as well.
+            self.owner.coalesced += 1
+        else:
+            self.owner.misses += 1
+            task = self.inflight[key] = asyncio.ensure_future(self.func(*args, **kwargs))
+            task.add_done_callback(functools.partial(self._finished, key))
+        # Shielded so one caller giving up does not cancel the call for the others.
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        self.inflight.pop(key, None)
+        # Failures are left for the callers to see and are not cached.
+        if task.cancelled() or task.exception() is not None or self.retired:
+            return
+        self._store(key, task.result())
+
+
+class BoundCachedFunction:
+    # A cached method looked up on an instance: calls and invalidate() get the instance as
+    # their first argument, so self.leaderboard.invalidate(guild_id) works inside the cog.
+    # clear() drops the entries of every instance.
+    def __init__(self, cached, instance):
+        self.cached = cached
+        self.instance = instance
+        functools.update_wrapper(self, cached.func)
+        if cached.is_async:
+            mark_coroutine(self)
+
+    def __call__(self, *args, **kwargs):
+        return self.cached(self.instance, *args, **kwargs)
+
+    def invalidate(self, *args, **kwargs):
+        self.cached.invalidate(self.instance, *args, **kwargs)
+
+    def clear(self):
+        self.cached.clear()
+
+
+def cached(ttl=None, maxsize=128, size=estimate_size):
+    # Memoizes a function or cog method, sync or async:
+    #
+    #     @cached(ttl=60)
+    #     async def leaderboard(self, guild_id): ...
+    #
+    # Results live for ``ttl`` seconds (forever when None), at most ``maxsize`` per function
+    # (least recently used go first) and within the cog's CACHE_BUDGET_MB across all of its
+    # caches. Concurrent calls with the same arguments share one call. Arguments must be
+    # hashable or the call is not cached. self.leaderboard.invalidate(guild_id) and
+    # self.leaderboard.clear() drop entries; reloading the cog drops them all.
+    def decorate(func):
+        return CachedFunction(func, ttl, maxsize, size)
+    return decorate
@@ -0,0 +1,160 @@
+import os
+import threading
+from collections import namedtuple
+
+# One file or directory under the cogs directory. ``rel`` uses "/" separators and is ""
+# for the directory itself; ``key`` is (mtime_ns, size) and None for directories.
+CogEntry = namedtuple("CogEntry", "rel is_dir key")
+
+
+def _listed(entry):
+    if entry.name.startswith(".") or entry.name == "__pycache__":
+        return None
+    try:
+        if entry.is_dir():
+            return True
+        if entry.name.endswith(".py") and entry.is_file():
+            return False
+    except OSError:
+        pass
+    return None
+
+
+def _stat_key(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class CogIndex:
+    # Stat-cached model of the cogs directory, subdirectories included. refresh() only lists
+    # directories whose mtime changed, stats the files it already knows and returns what was
+    # added, removed or modified, so a view can update just those rows. Shared by the
+    # explorer, the hot reload hashes and the bot's startup.
+    def __init__(self, directory="cogs"):
+        self.directory = directory
+        self.entries = {}
+        self._listings = {}
+        self._extensions = None
+        self._lock = threading.Lock()
+
+    def path(self, rel):
+        return os.path.join(self.directory, *rel.split("/")) if rel else self.directory
+
+    @property
+    def directories(self):
+        with self._lock:
+            return [""] + [rel for rel, entry in self.entries.items() if entry.is_dir]
+
+    def refresh(self, dirs=None):
+        # ``dirs`` limits the walk to those directories plus any new ones below them, e.g.
+        # the ones a filesystem notification named. Without it the whole tree is checked.
+        changes = {"added": [], "removed": [], "modified": []}
+        with self._lock:
+            pending = [(rel, dirs is None) for rel in (dirs if dirs is not None else [""])]
+            done = set()
+            while pending:
+                rel, recursive = pending.pop()
+                if rel in done or rel and rel not in self.entries:
+                    continue
+                done.add(rel)
+                for child, new in self._refresh_dir(rel, changes):
+                    if recursive or new:
+                        pending.append((child, recursive))
+            if any(changes.values()):
+                self._extensions = None
+        changes["added"].sort(key=lambda entry: entry.rel)
+        changes["removed"].sort(reverse=True)
+        return changes
+
+    def _refresh_dir(self, rel, changes):
+        # Returns (subdirectory, is new) for every subdirectory of ``rel``.
+        path = self.path(rel)
+        mtime = _stat_key(path)
+        if mtime is None:
+            self._forget(rel, changes)
+            return []
+        cached = self._listings.get(rel)
+        if cached is not None and cached[0] == mtime[0]:
+            names = cached[1]
+        else:
+            try:
+                names = {}
+                with os.scandir(path) as it:
+                    for entry in it:
+                        is_dir = _listed(entry)
+                        if is_dir is not None:
+                            names[entry.name] = is_dir
+            except OSError:
+                names = {}
+            if cached is not None:
+                for name in cached[1].keys() - names.keys():
+                    self._forget(f"{rel}/{name}" if rel else name, changes)
+            self._listings[rel] = (mtime[0], names)
+        subdirs = []
+        for name, is_dir in names.items():
+            child = f"{rel}/{name}" if rel else name
+            old = self.entries.get(child)
+            if old is not None and old.is_dir != is_dir:
+                self._forget(child, changes)
+                old = None
+            if is_dir:
+                if old is None:
+                    self.entries[child] = entry = CogEntry(child, True, None)
+                    changes["added"].append(entry)
+                subdirs.append((child, old is None))
+                continue
+            key = _stat_key(self.path(child))
+            if key is None:
+                continue
+            if old is None:
+                self.entries[child] = entry = CogEntry(child, False, key)
+                changes["added"].append(entry)
+            elif old.key != key:
+                self.entries[child] = CogEntry(child, False, key)
+                changes["modified"].append(child)
+        return subdirs
+
+    def _forget(self, rel, changes):
+        prefix = rel + "/"
+        for child in [child for child in self.entries if child == rel or child.startswith(prefix)]:
+            del self.entries[child]
+            changes["removed"].append(child)
+        for child in [child for child in self._listings if child and (child == rel or child.startswith(prefix))]:
+            del self._listings[child]
+
+    def extension_files(self):
+        # {extension name: entries of its files}. Modules anywhere under plain directories are
+        # extensions of their own; a directory with an __init__.py is one extension as a whole.
+        with self._lock:
+            if self._extensions is None:
+                packages = {rel[:-12] for rel in self.entries if rel.endswith("/__init__.py")}
+                extensions = {}
+                for rel, entry in sorted(self.entries.items()):
+                    if entry.is_dir:
+                        continue
+                    parts = rel[:-3].split("/")
+                    package = next(("/".join(parts[:i]) for i in range(1, len(parts)) if "/".join(parts[:i]) in packages), None)
+                    if package is not None:
+                        name = package.replace("/", ".")
+                    elif parts[-1] != "__init__":
+                        name = ".".join(parts)
+                    else:
+                        continue
+                    if all(part.isidentifier() for part in name.split(".")):
+                        extensions.setdefault(name, []).append(entry)
+                self._extensions = {name: tuple(files) for name, files in extensions.items()}
+            return self._extensions
+
+    def extensions(self):
+        return sorted(self.extension_files())
+
+    def source(self, name):
+        # The file that defines ``setup`` for an extension.
+        files = self.extension_files().get(name, ())
+        for entry in files:
+            if entry.rel.endswith("/__init__.py"):
+                return self.path(entry.rel)
+        return self.path(files[0].rel) if files else None
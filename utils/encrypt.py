@@ -1,30 +1,138 @@
-from cryptography.fernet import Fernet
 import base64
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+import json
 import os
-import getpass
+import threading
+import time
 
-def derive_key(password):
-    salt = b'salt_discord_bot_manager'
+TOKEN_FILE_VERSION = 2
+DEFAULT_ITERATIONS = 600000
+SALT_SIZE = 16
+SESSION_TIMEOUT = 15 * 60
+# Files written before the versioned format: raw Fernet data, fixed salt, 100k iterations.
+LEGACY_SALT = b'salt_discord_bot_manager'
+LEGACY_ITERATIONS = 100000
+
+def derive_key(password, salt=LEGACY_SALT, iterations=LEGACY_ITERATIONS):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
         salt=salt,
-        iterations=100000,
+        iterations=iterations,
     )
     key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
     return key
 
-def get_master_password():
-    return getpass.getpass("Enter master password: ")
+def _fernet(key):
+    # cryptography is imported on first use, off the GUI's startup path.
+    from cryptography.fernet import Fernet
+    return Fernet(key)
+
+def parse_token_file(data):
+    # Returns (version, salt, iterations, fernet token).
+    if data.startswith(b"{"):
+        header = json.loads(data)
+        if header.get("version") != TOKEN_FILE_VERSION:
+            raise ValueError(f"Unsupported token file version {header.get('version')}")
+        return header["version"], base64.b64decode(header["salt"]), header["iterations"], header["token"].encode()
+    return 1, LEGACY_SALT, LEGACY_ITERATIONS, data
+
+def format_token_file(salt, iterations, encrypted):
+    return json.dumps({
+        "version": TOKEN_FILE_VERSION, "kdf": "pbkdf2-sha256", "iterations": iterations,
+        "salt": base64.b64encode(salt).decode(), "token": encrypted.decode(),
+    }).encode()
+
+def encrypt_token(token, password, iterations=DEFAULT_ITERATIONS):
+    salt = os.urandom(SALT_SIZE)
+    fernet = _fernet(derive_key(password, salt, iterations))
+    return format_token_file(salt, iterations, fernet.encrypt(token.encode()))
+
+def decrypt_token(data, password):
+    _, salt, iterations, encrypted = parse_token_file(data)
+    fernet = _fernet(derive_key(password, salt, iterations))
+    return fernet.decrypt(encrypted).decode()
+
+class KeySession:
+    # Keyring-style unlock: the master password is stretched once per session and the key
+    # is kept in memory until lock() or until it has been idle for ``timeout`` seconds.
+    # unlock() is slow by design; call it through unlock_async() from a GUI.
+    def __init__(self, path="token.enc", iterations=DEFAULT_ITERATIONS, timeout=SESSION_TIMEOUT):
+        self.path = path
+        self.iterations = iterations
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._fernet = None
+        self._salt = None
+        self._key_iterations = None
+        self._expires = 0.0
+
+    @property
+    def unlocked(self):
+        with self._lock:
+            if self._fernet is not None and time.monotonic() >= self._expires:
+                self._forget()
+            return self._fernet is not None
+
+    def _forget(self):
+        self._fernet = None
+        self._salt = None
+        self._key_iterations = None
+
+    def lock(self):
+        with self._lock:
+            self._forget()
+
+    def touch(self):
+        with self._lock:
+            if self._fernet is not None:
+                self._expires = time.monotonic() + self.timeout
+
+    def unlock(self, password):
+        # Returns the stored token, or None when there is no token file yet (the key is then
+        # derived with a fresh salt for the first save). Raises on a wrong password.
+        token = None
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                version, salt, iterations, encrypted = parse_token_file(f.read())
+            fernet = _fernet(derive_key(password, salt, iterations))
+            token = fernet.decrypt(encrypted).decode()
+            if version != TOKEN_FILE_VERSION or iterations != self.iterations:
+                # Re-key old or differently tuned files while the password is at hand.
+                salt, iterations = os.urandom(SALT_SIZE), self.iterations
+                fernet = _fernet(derive_key(password, salt, iterations))
+                self._write(salt, iterations, fernet.encrypt(token.encode()))
+        else:
+            salt, iterations = os.urandom(SALT_SIZE), self.iterations
+            fernet = _fernet(derive_key(password, salt, iterations))
+        with self._lock:
+            self._fernet, self._salt, self._key_iterations = fernet, salt, iterations
+            self._expires = time.monotonic() + self.timeout
+        return token
+
+    def unlock_async(self, password, callback):
+        # callback(token, error) runs on the worker thread.
+        def run():
+            try:
+                token = self.unlock(password)
+            except Exception as e:
+                callback(None, e)
+                return
+            callback(token, None)
+        threading.Thread(target=run, name="token-unlock", daemon=True).start()
 
-def encrypt_token(token, password):
-    key = derive_key(password)
-    fernet = Fernet(key)
-    return fernet.encrypt(token.encode())
+    def save(self, token):
+        with self._lock:
+            if self._fernet is None or time.monotonic() >= self._expires:
+                self._forget()
+                raise PermissionError("Session is locked")
+            salt, iterations, fernet = self._salt, self._key_iterations, self._fernet
+            self._expires = time.monotonic() + self.timeout
+        self._write(salt, iterations, fernet.encrypt(token.encode()))
 
-def decrypt_token(encrypted, password):
-    key = derive_key(password)
-    fernet = Fernet(key)
-    return fernet.decrypt(encrypted).decode()
\ No newline at end of file
+    def _write(self, salt, iterations, encrypted):
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(format_token_file(salt, iterations, encrypted))
+        os.replace(tmp, self.path)
@@ -1,7 +1,125 @@
-def save_file(path, content):
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(content)
+import hashlib
+import mmap
+import os
+import queue
+import stat
+import tempfile
+import threading
+
+# Files at least this large are decoded straight from a memory map instead of being read
+# into a bytes copy first.
+MMAP_THRESHOLD = 4 * 2**20
+CHUNK_SIZE = 1 << 20
+
+def content_digest(data):
+    # Same blake2b digest as utils.watcher.hash_files uses for hot reload.
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def read_file(path):
+    # (text, digest of the bytes on disk, newline). The text always uses "\n"; ``newline`` is
+    # the file's own style ("\r\n" or "\r" if it has them), which save_file writes back so an
+    # unchanged file still matches the digest, the baseline for save_file's dirty check.
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                digest = content_digest(data)
+                text = str(data, "utf-8")
+        else:
+            data = f.read()
+            digest = content_digest(data)
+            text = data.decode("utf-8")
+    newline = "\n"
+    if "\r" in text:
+        newline = "\r\n" if "\r\n" in text else "\r"
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text, digest, newline
 
 def load_file(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
\ No newline at end of file
+    return read_file(path)[0]
+
+def save_file(path, content, digest=None, newline="\n"):
+    # Writes atomically: a temporary file next to ``path`` is fsynced and renamed over it,
+    # so readers (and the bot's hot reload) see the old or the new file, never half of one.
+    # Line ends are written as ``newline``. When ``digest`` (from read_file or an earlier
+    # save) matches the new content nothing is written. Returns (digest, written).
+    if newline != "\n":
+        content = content.replace("\n", newline)
+    data = content.encode("utf-8")
+    new_digest = content_digest(data)
+    if new_digest == digest and os.path.exists(path):
+        return new_digest, False
+    directory, name = os.path.split(os.path.abspath(path))
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o644
+    # Dot-prefixed so the cog index and explorer ignore it.
+    fd, tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            view = memoryview(data)
+            for start in range(0, len(view), CHUNK_SIZE):
+                f.write(view[start:start + CHUNK_SIZE])
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        # Makes the rename itself durable.
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    return new_digest, True
+
+class FileWorker(threading.Thread):
+    # Runs file operations off the Tk thread, one at a time and in submission order, so
+    # two saves of the same file can never land out of order. callback(result, error)
+    # runs on the worker thread, like KeySession.unlock_async.
+    def __init__(self):
+        super().__init__(name="file-worker", daemon=True)
+        self.jobs = queue.Queue()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            func, args, callback = job
+            try:
+                result = func(*args)
+            except Exception as e:
+                if callback is not None:
+                    callback(None, e)
+                continue
+            if callback is not None:
+                callback(result, None)
+
+    def submit(self, func, *args, callback=None):
+        self.jobs.put((func, args, callback))
+
+    def load(self, path, callback):
+        # callback gets (text, digest, newline).
+        self.submit(read_file, path, callback=callback)
+
+    def save(self, path, content, callback=None, digest=None, newline="\n"):
+        # callback gets (digest, written).
+        self.submit(save_file, path, content, digest, newline, callback=callback)
+
+    def stop(self):
+        self.jobs.put(None)
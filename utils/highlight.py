@@ -0,0 +1,233 @@
+import queue
+import threading
+from array import array
+from collections import namedtuple
+
+TAGS = ("keyword", "builtin", "string", "comment", "number", "operator", "name")
+ROOT = ("root",)
+
+# pygments is imported on first use (on the worker thread) so opening the GUI does not pay for it.
+_tag_map = None
+_tag_cache = {}
+
+# A job carries a snapshot of the buffer plus the edits made since the previous job.
+HighlightJob = namedtuple("HighlightJob", "version text edits reset touch window fills")
+# ``updated`` and each entry of ``fills`` are (first, last, spans) where spans is a flat
+# array of (line, start column, end column, tag index) quadruples.
+HighlightResult = namedtuple("HighlightResult", "version window updated fills")
+
+
+def _load_tag_map():
+    global _tag_map
+    from pygments.token import Token
+    _tag_map = (
+        (Token.Keyword, TAGS.index("keyword")),
+        (Token.Name.Builtin, TAGS.index("builtin")),
+        (Token.String, TAGS.index("string")),
+        (Token.Comment, TAGS.index("comment")),
+        (Token.Number, TAGS.index("number")),
+        (Token.Operator, TAGS.index("operator")),
+        (Token.Name, TAGS.index("name")),
+    )
+    return _tag_map
+
+
+def token_tag(token):
+    try:
+        return _tag_cache[token]
+    except KeyError:
+        tag = -1
+        for parent, index in _tag_map or _load_tag_map():
+            if token in parent:
+                tag = index
+                break
+        _tag_cache[token] = tag
+        return tag
+
+
+def shift_line(line, start, removed, added):
+    # Maps a line index from before an edit at ``start`` to the same line after it.
+    if line <= start:
+        return line
+    if line <= start + removed:
+        return start + added
+    return line + added - removed
+
+
+class IncrementalHighlighter:
+    def __init__(self, lexer=None):
+        if lexer is None:
+            from pygments.lexers.python import PythonLexer
+            lexer = PythonLexer()
+        self.lexer = lexer
+        self.reset()
+
+    def reset(self, line_count=1):
+        # states[i] is the lexer stack at the start of line i, or None when the line
+        # starts inside a multi-line token. Only states[:frontier] are known.
+        self.states = [ROOT] + [None] * (line_count - 1)
+        self.frontier = 1
+        self.dirty = (0, line_count - 1)
+
+    def splice(self, line, removed, added):
+        self.states[line + 1:line + 1 + removed] = [None] * added
+        if self.frontier > line + 1:
+            self.frontier = max(line + 1, shift_line(self.frontier, line, removed, added))
+        if self.dirty is None:
+            self.dirty = (line, line + added)
+        else:
+            lo, hi = self.dirty
+            self.dirty = (min(lo, line), max(shift_line(hi, line, removed, added), line + added))
+
+    def touch(self, first, last):
+        if self.dirty is None:
+            self.dirty = (first, last)
+        else:
+            self.dirty = (min(self.dirty[0], first), max(self.dirty[1], last))
+
+    def update(self, text, first=0, last=None):
+        self._sync(text)
+        if self.dirty is None:
+            return None
+        lo, hi = self.dirty
+        self.dirty = None
+        # Dirty lines past the frontier are only lexed when they fall inside the window.
+        through = min(hi, max(self.frontier - 1, len(self.states) - 1 if last is None else last))
+        if lo > through:
+            return None
+        return self._run(text, min(lo, self.frontier - 1), through, first, last)
+
+    def spans(self, text, first, last):
+        self._sync(text)
+        return self._run(text, min(first, self.frontier - 1), last, first, last)
+
+    def _sync(self, text):
+        # Edits that bypassed splice() leave the line count out of step; start over.
+        line_count = text.count("\n") + 1
+        if line_count != len(self.states):
+            self.reset(line_count)
+
+    def _run(self, text, start, through, emit_lo, emit_hi):
+        states = self.states
+        line_count = len(states)
+        if emit_hi is None or emit_hi >= line_count:
+            emit_hi = line_count - 1
+        while states[start] is None:
+            start -= 1
+        old_frontier = self.frontier
+
+        pos = 0
+        for _ in range(start):
+            pos = text.index("\n", pos) + 1
+        stack = list(states[start])
+        line = tline = start
+        tline_start = pos
+        boundary = text.find("\n", pos) + 1 or len(text) + 1
+        spans = array("I")
+        stop = line_count
+
+        for end, tokens in self._scan(text, pos, stack):
+            for tpos, token, value in tokens:
+                tag = token_tag(token)
+                col = tpos - tline_start
+                piece_line = tline
+                for piece in value.split("\n"):
+                    if piece and tag >= 0 and emit_lo <= piece_line <= emit_hi:
+                        spans.extend((piece_line, col, col + len(piece), tag))
+                    piece_line += 1
+                    col = 0
+                newlines = value.count("\n")
+                if newlines:
+                    tline += newlines
+                    tline_start = tpos + value.rindex("\n") + 1
+            while boundary <= end:
+                line += 1
+                state = tuple(stack) if boundary == end else None
+                if line > through and (line >= old_frontier or (state is not None and state == states[line])):
+                    stop = line
+                    break
+                states[line] = state
+                boundary = text.find("\n", boundary) + 1 or len(text) + 1
+            else:
+                continue
+            break
+
+        self.frontier = max(old_frontier, stop)
+        return max(start, emit_lo), min(stop - 1, emit_hi), spans
+
+    def _scan(self, text, pos, stack):
+        # Same matching loop as RegexLexer.get_tokens_unprocessed, but yields once per
+        # match with ``stack`` already updated so the caller can checkpoint line states.
+        from pygments.token import Whitespace, Error, _TokenType
+        tokendefs = self.lexer._tokens
+        statetokens = tokendefs[stack[-1]]
+        while pos < len(text):
+            for rexmatch, action, new_state in statetokens:
+                m = rexmatch(text, pos)
+                if m:
+                    if action is None:
+                        tokens = ()
+                    elif type(action) is _TokenType:
+                        tokens = ((pos, action, m.group()),)
+                    else:
+                        tokens = list(action(self.lexer, m))
+                    pos = m.end()
+                    if new_state is not None:
+                        if isinstance(new_state, tuple):
+                            for state in new_state:
+                                if state == "#pop":
+                                    if len(stack) > 1:
+                                        stack.pop()
+                                elif state == "#push":
+                                    stack.append(stack[-1])
+                                else:
+                                    stack.append(state)
+                        elif isinstance(new_state, int):
+                            if abs(new_state) >= len(stack):
+                                del stack[1:]
+                            else:
+                                del stack[new_state:]
+                        elif new_state == "#push":
+                            stack.append(stack[-1])
+                        statetokens = tokendefs[stack[-1]]
+                    yield pos, tokens
+                    break
+            else:
+                if text[pos] == "\n":
+                    stack[:] = ["root"]
+                    statetokens = tokendefs["root"]
+                    yield pos + 1, ((pos, Whitespace, "\n"),)
+                else:
+                    yield pos + 1, ((pos, Error, text[pos]),)
+                pos += 1
+
+
+class HighlightWorker(threading.Thread):
+    # on_result(result) runs on the worker thread, like FileWorker callbacks.
+    def __init__(self, on_result, highlighter=None):
+        super().__init__(name="highlight-worker", daemon=True)
+        self.on_result = on_result
+        self.highlighter = highlighter
+        self.jobs = queue.Queue()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            if self.highlighter is None:
+                self.highlighter = IncrementalHighlighter()
+            highlighter = self.highlighter
+            if job.reset is not None:
+                highlighter.reset(job.reset)
+            else:
+                for edit in job.edits:
+                    highlighter.splice(*edit)
+            if job.touch is not None:
+                highlighter.touch(*job.touch)
+            updated = highlighter.update(job.text, *job.window)
+            fills = [highlighter.spans(job.text, first, last) for first, last in job.fills]
+            self.on_result(HighlightResult(job.version, job.window, updated, fills))
+
+    def stop(self):
+        self.jobs.put(None)
@@ -0,0 +1,85 @@
+import itertools
+import threading
+import time
+from collections import deque
+
+# Every message is a (kind, payload) tuple sent over a multiprocessing Pipe, which already
+# frames and pickles each message. Log records travel in batches to keep that cost low.
+LOG = "log"
+COMMAND = "cmd"
+ACK = "ack"
+STARTUP = "startup"
+SHARD = "shard"
+EXIT = "exit"
+METRICS = "metrics"
+# Sent by the supervisor itself when it kills a worker that hung or went over its limits.
+HEALTH = "health"
+
+LOG_FLUSH_INTERVAL = 0.05
+LOG_FLUSH_SIZE = 500
+
+
+class Channel:
+    def __init__(self, conn):
+        self.conn = conn
+        self.closed = False
+        self._send_lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def send(self, kind, payload=None):
+        if self.closed:
+            return False
+        try:
+            with self._send_lock:
+                self.conn.send((kind, payload))
+            return True
+        except (OSError, ValueError):
+            self.closed = True
+            return False
+
+    def request(self, op, name=None, **args):
+        request_id = next(self._ids)
+        if not self.send(COMMAND, {"id": request_id, "op": op, "name": name, "args": args, "sent": time.time()}):
+            return None
+        return request_id
+
+    def receive(self, limit):
+        messages = []
+        try:
+            while len(messages) < limit and not self.closed and self.conn.poll():
+                messages.append(self.conn.recv())
+        except (EOFError, OSError):
+            self.closed = True
+        return messages
+
+    def recv(self):
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            self.closed = True
+            return None
+
+    def close(self):
+        self.closed = True
+        self.conn.close()
+
+
+class RecordBatcher:
+    # Collects log records from any thread; flush() sends whatever is waiting as one message.
+    def __init__(self, channel):
+        self.channel = channel
+        self._records = deque()
+
+    def add(self, level, source, text):
+        self._records.append((time.time(), level, source, text))
+
+    def __len__(self):
+        return len(self._records)
+
+    def flush(self):
+        batch = []
+        while self._records and len(batch) < LOG_FLUSH_SIZE:
+            batch.append(self._records.popleft())
+        if batch:
+            self.channel.send(LOG, batch)
+        return len(batch)
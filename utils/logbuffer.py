@@ -0,0 +1,64 @@
+import time
+from collections import namedtuple
+
+LogEntry = namedtuple("LogEntry", "timestamp level source text")
+
+
+def format_entry(entry):
+    return f"{time.strftime('%H:%M:%S', time.localtime(entry.timestamp))} {entry.level} {entry.source} {entry.text}"
+
+
+class RingBuffer:
+    def __init__(self, capacity):
+        self._items = [None] * capacity
+        self._start = 0
+        self._size = 0
+        self.total = 0
+
+    @property
+    def capacity(self):
+        return len(self._items)
+
+    @property
+    def first_seq(self):
+        # Sequence number (count of items ever appended) of the oldest retained item.
+        return self.total - self._size
+
+    def __len__(self):
+        return self._size
+
+    def append(self, item):
+        capacity = len(self._items)
+        if self._size < capacity:
+            self._items[(self._start + self._size) % capacity] = item
+            self._size += 1
+        else:
+            self._items[self._start] = item
+            self._start = (self._start + 1) % capacity
+        self.total += 1
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("ring buffer index out of range")
+        return self._items[(self._start + index) % len(self._items)]
+
+    def slice(self, start, stop):
+        start, stop = max(0, start), min(self._size, stop)
+        return [self[i] for i in range(start, stop)]
+
+    def resize(self, capacity):
+        items = self.slice(max(0, self._size - capacity), self._size)
+        self._items = items + [None] * (capacity - len(items))
+        self._start = 0
+        self._size = len(items)
+
+    def clear(self):
+        self._items = [None] * len(self._items)
+        self._start = 0
+        self._size = 0
@@ -0,0 +1,360 @@
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import namedtuple
+
+from utils.logbuffer import LogEntry
+
+SEGMENT_RECORDS = 100000
+BLOCK_RECORDS = 1024
+BLOOM_BITS = 1 << 14
+BLOOM_HASHES = 3
+POSTING_LIMIT = 64
+MAX_SEGMENTS = 100
+INDEX_VERSION = 1
+LEVEL_BITS = {"DEBUG": 1, "INFO": 2, "WARNING": 4, "ERROR": 8, "CRITICAL": 16}
+
+_WORD = re.compile(r"\w+")
+_ESCAPED = re.compile(r"\\(.)")
+_UNESCAPE = {"n": "\n", "t": "\t"}
+
+# Segments are plain text files of one record per line, split into blocks of
+# BLOCK_RECORDS lines. Each block is summarised by its byte range, time range, a bitmask of
+# levels, the set of sources and a bloom filter of the words in its texts; queries read
+# only blocks whose summary can match. ``postings`` maps a level bit to the (offset, length)
+# of each of its lines when that level is rare in the block, so a search for errors reads
+# just those lines. ``bloom`` is None for the block still being written.
+Block = namedtuple("Block", "offset length count first last levels sources bloom postings")
+
+
+def words(text):
+    return set(_WORD.findall(text.lower()))
+
+
+def bloom_mask(tokens):
+    mask = 0
+    for token in tokens:
+        digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+        h1, h2 = digest & 0xFFFFFFFF, (digest >> 32) | 1
+        for i in range(BLOOM_HASHES):
+            mask |= 1 << ((h1 + i * h2) % BLOOM_BITS)
+    return mask
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace("\t", "\\t")
+
+
+def _unescape(value):
+    if "\\" not in value:
+        return value
+    return _ESCAPED.sub(lambda m: _UNESCAPE.get(m.group(1), m.group(1)), value)
+
+
+def encode_entry(entry):
+    return f"{entry.timestamp:.6f}\t{entry.level}\t{_escape(entry.source)}\t{_escape(entry.text)}\n".encode("utf-8")
+
+
+def decode_entry(line):
+    timestamp, level, source, text = line.split("\t", 3)
+    return LogEntry(float(timestamp), level, _unescape(source), _unescape(text))
+
+
+class BlockBuilder:
+    def __init__(self, offset):
+        self.offset = offset
+        self.length = 0
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.levels = 0
+        self.sources = set()
+        self.tokens = set()
+        self.postings = {}
+
+    def add(self, entry, size):
+        if self.count == 0:
+            self.first = self.last = entry.timestamp
+        else:
+            self.first = min(self.first, entry.timestamp)
+            self.last = max(self.last, entry.timestamp)
+        level = LEVEL_BITS.get(entry.level, LEVEL_BITS["INFO"])
+        lines = self.postings.get(level, ())
+        if lines is not None:
+            self.postings[level] = None if len(lines) >= POSTING_LIMIT else lines + ((self.offset + self.length, size),)
+        self.count += 1
+        self.length += size
+        self.levels |= level
+        self.sources.add(entry.source)
+        self.tokens.update(_WORD.findall(entry.text.lower()))
+
+    def block(self, sealed=True):
+        return Block(
+            self.offset, self.length, self.count, self.first, self.last, self.levels,
+            frozenset(self.sources), bloom_mask(self.tokens) if sealed else None,
+            {level: lines for level, lines in self.postings.items() if lines is not None},
+        )
+
+
+class Segment:
+    def __init__(self, path, first_seq):
+        self.path = path
+        self.first_seq = first_seq
+        self.blocks = []
+        self.count = 0
+        self.size = 0
+
+    @property
+    def index_path(self):
+        return self.path[:-4] + ".idx"
+
+    def save_index(self):
+        data = {
+            "version": INDEX_VERSION, "size": self.size, "count": self.count,
+            "blocks": [
+                [b.offset, b.length, b.count, b.first, b.last, b.levels, sorted(b.sources), format(b.bloom, "x"),
+                 {str(level): lines for level, lines in b.postings.items()}]
+                for b in self.blocks
+            ],
+        }
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.index_path)
+
+    def load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != INDEX_VERSION or data.get("size") != os.path.getsize(self.path):
+            return False
+        self.size = data["size"]
+        self.count = data["count"]
+        self.blocks = [
+            Block(offset, length, count, first, last, levels, frozenset(sources), int(bloom, 16),
+                  {int(level): tuple(map(tuple, lines)) for level, lines in postings.items()})
+            for offset, length, count, first, last, levels, sources, bloom, postings in data["blocks"]
+        ]
+        return True
+
+    def rebuild_index(self):
+        # Segments left without an up-to-date index (e.g. after a crash) are re-read once.
+        self.blocks, self.count, self.size = [], 0, 0
+        builder = BlockBuilder(0)
+        with open(self.path, "rb") as f:
+            for raw in f:
+                try:
+                    entry = decode_entry(raw.decode("utf-8", "replace").rstrip("\n"))
+                except ValueError:
+                    break
+                builder.add(entry, len(raw))
+                self.count += 1
+                self.size += len(raw)
+                if builder.count == BLOCK_RECORDS:
+                    self.blocks.append(builder.block())
+                    builder = BlockBuilder(self.size)
+        if builder.count:
+            self.blocks.append(builder.block())
+        self.save_index()
+
+
+QueryResult = namedtuple("QueryResult", "entries blocks_read blocks_total ms")
+
+
+class LogStore(threading.Thread):
+    # Append-only log history on disk. append() is cheap and may be called from the Tk
+    # thread; the writer thread encodes, writes and indexes. query() may run on any thread.
+    def __init__(self, directory="logs", segment_records=SEGMENT_RECORDS, max_segments=MAX_SEGMENTS):
+        super().__init__(name="log-store", daemon=True)
+        self.directory = directory
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.jobs = queue.Queue()
+        self._lock = threading.Lock()
+        # Existing segments are indexed on the writer thread; queries wait for that.
+        self._loaded = threading.Event()
+        self.segments = []
+        self._file = None
+        self._builder = None
+
+    def _load_segments(self):
+        os.makedirs(self.directory, exist_ok=True)
+        segments = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith("segment-") and name.endswith(".log"):
+                segment = Segment(os.path.join(self.directory, name), int(name[8:-4]))
+                if not segment.load_index():
+                    segment.rebuild_index()
+                segments.append(segment)
+        return segments
+
+    @property
+    def total(self):
+        return sum(segment.count for segment in self.segments)
+
+    def append(self, entries):
+        self.jobs.put(entries)
+
+    def run(self):
+        try:
+            segments = self._load_segments()
+        except OSError:
+            segments = []
+        with self._lock:
+            self.segments = segments
+        self._loaded.set()
+        while True:
+            batch = self.jobs.get()
+            if batch is None:
+                break
+            batch = list(batch)
+            stop = False
+            while not self.jobs.empty() and len(batch) < 50000:
+                more = self.jobs.get()
+                if more is None:
+                    stop = True
+                    break
+                batch.extend(more)
+            self._write(batch)
+            if stop:
+                break
+        with self._lock:
+            self._close_segment()
+
+    def close(self):
+        self.jobs.put(None)
+        self.join(timeout=5)
+
+    def _open_segment(self):
+        first_seq = self.segments[-1].first_seq + self.segments[-1].count if self.segments else 0
+        segment = Segment(os.path.join(self.directory, f"segment-{first_seq:012d}.log"), first_seq)
+        self._file = open(segment.path, "ab")
+        self._builder = BlockBuilder(0)
+        self.segments.append(segment)
+        while len(self.segments) > self.max_segments:
+            old = self.segments.pop(0)
+            for path in (old.path, old.index_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return segment
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        segment = self.segments[-1]
+        if self._builder.count:
+            segment.blocks.append(self._builder.block())
+        self._file.close()
+        self._file = None
+        self._builder = None
+        segment.save_index()
+
+    def _write(self, batch):
+        encoded = [encode_entry(entry) for entry in batch]
+        with self._lock:
+            pending = []
+            for entry, raw in zip(batch, encoded):
+                if self._file is None:
+                    segment = self._open_segment()
+                else:
+                    segment = self.segments[-1]
+                builder = self._builder
+                builder.add(entry, len(raw))
+                pending.append(raw)
+                segment.count += 1
+                segment.size += len(raw)
+                if builder.count == BLOCK_RECORDS:
+                    segment.blocks.append(builder.block())
+                    self._builder = BlockBuilder(segment.size)
+                if segment.count >= self.segment_records:
+                    self._file.write(b"".join(pending))
+                    pending = []
+                    self._close_segment()
+            if pending:
+                self._file.write(b"".join(pending))
+            if self._file is not None:
+                self._file.flush()
+
+    def _snapshot(self):
+        self._loaded.wait()
+        with self._lock:
+            snapshot = [(segment.path, list(segment.blocks)) for segment in self.segments]
+            if self._file is not None and self._builder.count:
+                snapshot[-1][1].append(self._builder.block(sealed=False))
+        return snapshot
+
+    def query(self, levels=None, source=None, keyword=None, since=None, until=None, limit=1000):
+        # Newest matches first until ``limit`` are found; returned in chronological order.
+        # ``keyword`` matches records containing all of its words (case-insensitive).
+        started = time.perf_counter()
+        level_mask = sum(LEVEL_BITS[level] for level in levels) if levels else 0
+        source = source.lower() if source else None
+        tokens = words(keyword) if keyword else set()
+        token_mask = bloom_mask(tokens)
+        matches, blocks_read, blocks_total = [], 0, 0
+        for path, blocks in reversed(self._snapshot()):
+            blocks_total += len(blocks)
+            if len(matches) >= limit:
+                continue
+            try:
+                f = open(path, "rb")
+            except OSError:
+                continue
+            with f:
+                for block in reversed(blocks):
+                    if since is not None and block.last < since or until is not None and block.first > until:
+                        continue
+                    if level_mask and not block.levels & level_mask:
+                        continue
+                    if source and not any(source in name.lower() for name in block.sources):
+                        continue
+                    if block.bloom is not None and block.bloom & token_mask != token_mask:
+                        continue
+                    blocks_read += 1
+                    for line in self._block_lines(f, block, level_mask):
+                        if not line:
+                            continue
+                        if tokens:
+                            lowered = line.lower()
+                            if not all(token in lowered for token in tokens):
+                                continue
+                        try:
+                            entry = decode_entry(line)
+                        except ValueError:
+                            continue
+                        if since is not None and entry.timestamp < since or until is not None and entry.timestamp > until:
+                            continue
+                        if level_mask and not LEVEL_BITS.get(entry.level, LEVEL_BITS["INFO"]) & level_mask:
+                            continue
+                        if source and source not in entry.source.lower():
+                            continue
+                        if tokens and not tokens <= words(entry.text):
+                            continue
+                        matches.append(entry)
+                        if len(matches) >= limit:
+                            break
+                    if len(matches) >= limit:
+                        break
+        matches.reverse()
+        return QueryResult(matches, blocks_read, blocks_total, (time.perf_counter() - started) * 1000)
+
+    @staticmethod
+    def _block_lines(f, block, level_mask):
+        # Newest line first. Reads single lines from the postings when every wanted level
+        # present in the block has them, otherwise the whole block.
+        wanted = [bit for bit in LEVEL_BITS.values() if bit & level_mask & block.levels]
+        if level_mask and all(bit in block.postings for bit in wanted):
+            for offset, length in sorted((line for bit in wanted for line in block.postings[bit]), reverse=True):
+                f.seek(offset)
+                yield f.read(length).decode("utf-8", "replace").rstrip("\n")
+            return
+        f.seek(block.offset)
+        yield from reversed(f.read(block.length).decode("utf-8", "replace").split("\n"))
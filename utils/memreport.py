@@ -0,0 +1,95 @@
+import itertools
+import sys
+from collections import deque
+
+# Objects measured per cache type; the total is extrapolated from the sample.
+SAMPLE_SIZE = 500
+_PRIMITIVES = (str, bytes, bytearray, int, float, bool, type(None))
+_CONTAINERS = (list, tuple, dict, set, frozenset, deque)
+# Attributes pointing at state shared by every model.
+_SHARED = ("__dict__", "__weakref__", "_state", "_http")
+
+
+def _slots(cls):
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get("__slots__", ())
+        yield from (slots,) if isinstance(slots, str) else slots
+
+
+def owned_size(value, depth=3, top=True):
+    # Bytes held by one cached object: itself, its attribute values and builtin containers,
+    # but not other Discord models it points to (anything with an ``id``), which are
+    # counted under their own cache. An estimate, not an exact account.
+    if isinstance(value, _PRIMITIVES):
+        return sys.getsizeof(value)
+    if not top and hasattr(value, "id"):
+        return 0
+    size = sys.getsizeof(value, 64)
+    if depth <= 0:
+        return size
+    depth -= 1
+    if isinstance(value, dict):
+        return size + sum(owned_size(k, depth, False) + owned_size(v, depth, False) for k, v in value.items())
+    if isinstance(value, _CONTAINERS):
+        return size + sum(owned_size(item, depth, False) for item in value)
+    if hasattr(value, "__dict__"):
+        size += sum(owned_size(v, depth, False) for k, v in vars(value).items() if k not in _SHARED)
+    for slot in _slots(type(value)):
+        if slot not in _SHARED:
+            size += owned_size(getattr(value, slot, None), depth, False)
+    return size
+
+
+def sampled_size(items, count):
+    # owned_size of up to SAMPLE_SIZE evenly spaced items, scaled up to ``count``.
+    if not count:
+        return 0
+    step = max(1, count // SAMPLE_SIZE)
+    sample = [owned_size(item) for item in itertools.islice(items, 0, None, step)]
+    return int(sum(sample) / len(sample) * count) if sample else 0
+
+
+def memory_report(bot, rss, cog_caches, profile):
+    # Runs in the bot process on request. Counting walks the caches, but only samples of
+    # them are sized, so the report stays cheap on large bots.
+    guilds = bot.guilds
+    member_count = sum(len(guild.members) for guild in guilds)
+    channel_count = sum(len(guild.channels) + len(guild.threads) for guild in guilds) + len(bot.private_channels)
+
+    def channels():
+        for guild in guilds:
+            yield from guild.channels
+            yield from guild.threads
+        yield from bot.private_channels
+
+    messages = bot.cached_messages
+    users = bot.users
+    emojis = list(bot.emojis) + list(bot.stickers)
+    role_count = sum(len(guild.roles) for guild in guilds)
+    caches = [
+        ["messages", len(messages), sampled_size(iter(messages), len(messages))],
+        ["members", member_count, sampled_size(bot.get_all_members(), member_count)],
+        ["users", len(users), sampled_size(iter(users), len(users))],
+        ["guilds", len(guilds), sampled_size(iter(guilds), len(guilds))],
+        ["channels", channel_count, sampled_size(channels(), channel_count)],
+        ["roles", role_count, sampled_size((role for guild in guilds for role in guild.roles), role_count)],
+        ["emojis & stickers", len(emojis), sampled_size(iter(emojis), len(emojis))],
+        ["cog caches", sum(stats[4] for stats in cog_caches.values()), sum(stats[5] for stats in cog_caches.values())],
+    ]
+    storage = getattr(bot, "storage", None)
+    if storage is not None:
+        entries = list(storage.cache.items())
+        caches.append(["storage cache", len(entries), sampled_size(iter(entries), len(entries)) + sys.getsizeof(storage.cache)])
+    return {"rss": rss, "profile": profile, "caches": caches}
+
+
+def format_memory_report(name, worker, report):
+    # Lines for the manager console and botctl.
+    rss = report["rss"]
+    lines = [f"{name} w{worker}: RSS {f'{rss / 2**20:.1f} MB' if rss else 'unknown'}, cache profile {report['profile']}"]
+    for cache, count, size in report["caches"]:
+        lines.append(f"  {cache:<18} {count:>10}  {size / 2**20:>8.1f} MB")
+    if rss:
+        rest = rss - sum(size for _, _, size in report["caches"])
+        lines.append(f"  {'everything else':<18} {'':>10}  {rest / 2**20:>8.1f} MB")
+    return lines
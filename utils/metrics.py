@@ -0,0 +1,335 @@
+import threading
+import time
+from bisect import bisect_left
+
+
+def _bucket_bounds(low_exp=-4, high_exp=16, sub_buckets=4):
+    # HDR-style layout: every power of two from 1/16 ms to ~65 s is split into equal steps,
+    # so the relative error stays under 25% at any scale with a fixed number of buckets.
+    bounds = []
+    for exp in range(low_exp, high_exp):
+        base = 2.0 ** exp
+        bounds.extend(base * (1 + (i + 1) / sub_buckets) for i in range(sub_buckets))
+    return tuple(bounds)
+
+
+BUCKETS = _bucket_bounds()
+
+
+class Histogram:
+    # Millisecond values counted into BUCKETS; the last slot catches everything above.
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(self.max, BUCKETS[index]) if index < len(BUCKETS) else self.max
+        return self.max
+
+    def snapshot(self):
+        return ({i: c for i, c in enumerate(self.counts) if c}, self.count, self.total, self.max)
+
+    def merge(self, snapshot):
+        counts, count, total, maximum = snapshot
+        for index, value in counts.items():
+            self.counts[index] += value
+        self.count += count
+        self.total += total
+        self.max = max(self.max, maximum)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        histogram = cls()
+        histogram.merge(snapshot)
+        return histogram
+
+
+class CommandStats:
+    __slots__ = ("calls", "errors", "latency")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+
+
+class SendStats:
+    # Outbound messages through utils.sender.SendScheduler. ``depth`` is the current queue
+    # length, the rest count up since the process started.
+    __slots__ = ("sent", "merged", "rate_limited", "throttled", "depth", "wait")
+
+    def __init__(self):
+        self.sent = 0
+        self.merged = 0
+        self.rate_limited = 0
+        self.throttled = 0
+        self.depth = 0
+        self.wait = Histogram()
+
+    def snapshot(self):
+        return (self.sent, self.merged, self.rate_limited, self.throttled, self.depth, self.wait.snapshot())
+
+
+class BotMetrics:
+    # Lives in the bot process. Counters are cumulative since the process started, so
+    # snapshots from several workers can simply be summed.
+    def __init__(self):
+        self.started = time.time()
+        self.commands = {}
+        self.loop_lag = Histogram()
+        self.sender = SendStats()
+        # Set by the bot to utils.cache.registry.stats: per cog (hits, misses, evictions,
+        # coalesced, entries, bytes, budget).
+        self.caches = None
+
+    def _stats(self, cog, command):
+        key = (cog, command)
+        stats = self.commands.get(key)
+        if stats is None:
+            stats = self.commands[key] = CommandStats()
+        return stats
+
+    def record_command(self, cog, command, ms, failed):
+        stats = self._stats(cog, command)
+        stats.calls += 1
+        stats.latency.record(ms)
+        if failed:
+            stats.errors += 1
+
+    def record_error(self, cog, command):
+        # Failures raised before the command body ran (checks, conversion, cooldowns).
+        stats = self._stats(cog, command)
+        stats.calls += 1
+        stats.errors += 1
+
+    def snapshot(self):
+        return {
+            "uptime": time.time() - self.started,
+            "commands": {key: (s.calls, s.errors, s.latency.snapshot()) for key, s in self.commands.items()},
+            "loop_lag": self.loop_lag.snapshot(),
+            "sender": self.sender.snapshot(),
+            "caches": self.caches() if self.caches is not None else {},
+        }
+
+
+def encode_snapshot(snapshot):
+    # BotMetrics.snapshot() as plain JSON types, for clients of the daemon.
+    def histogram(data):
+        counts, count, total, maximum = data
+        return [sorted(counts.items()), count, total, maximum]
+    return {
+        "uptime": snapshot["uptime"],
+        "commands": [[cog, command, calls, errors, histogram(latency)] for (cog, command), (calls, errors, latency) in snapshot["commands"].items()],
+        "loop_lag": histogram(snapshot["loop_lag"]),
+        "sender": list(snapshot["sender"][:5]) + [histogram(snapshot["sender"][5])],
+        "caches": {cog: list(stats) for cog, stats in snapshot.get("caches", {}).items()},
+    }
+
+
+def decode_snapshot(data):
+    def histogram(value):
+        counts, count, total, maximum = value
+        return ({int(index): c for index, c in counts}, count, total, maximum)
+    return {
+        "uptime": data["uptime"],
+        "commands": {(cog, command): (calls, errors, histogram(latency)) for cog, command, calls, errors, latency in data["commands"]},
+        "loop_lag": histogram(data["loop_lag"]),
+        "sender": tuple(data["sender"][:5]) + (histogram(data["sender"][5]),),
+        "caches": {cog: tuple(stats) for cog, stats in data.get("caches", {}).items()},
+    }
+
+
+class MetricsSummary:
+    # Manager-side view: the latest snapshot of each worker, merged on demand.
+    def __init__(self):
+        self.snapshots = {}
+
+    def update(self, worker, snapshot):
+        self.snapshots[worker] = snapshot
+
+    def clear(self, bot=None):
+        # Keys are (bot, worker index); without ``bot`` everything is dropped.
+        if bot is None:
+            self.snapshots = {}
+        else:
+            self.snapshots = {key: snapshot for key, snapshot in self.snapshots.items() if key[0] != bot}
+
+    def merged(self):
+        commands = {}
+        loop_lag = Histogram()
+        for snapshot in list(self.snapshots.values()):
+            for key, (calls, errors, latency) in snapshot["commands"].items():
+                entry = commands.get(key)
+                if entry is None:
+                    entry = commands[key] = [0, 0, Histogram()]
+                entry[0] += calls
+                entry[1] += errors
+                entry[2].merge(latency)
+            loop_lag.merge(snapshot["loop_lag"])
+        return commands, loop_lag
+
+    def sender(self):
+        # SendStats summed over every worker.
+        stats = SendStats()
+        for snapshot in list(self.snapshots.values()):
+            sent, merged, rate_limited, throttled, depth, wait = snapshot["sender"]
+            stats.sent += sent
+            stats.merged += merged
+            stats.rate_limited += rate_limited
+            stats.throttled += throttled
+            stats.depth += depth
+            stats.wait.merge(wait)
+        return stats
+
+    def caches(self):
+        # Per cog cache counters summed over every worker; budgets add up too, as each
+        # worker has its own.
+        totals = {}
+        for snapshot in list(self.snapshots.values()):
+            for cog, stats in snapshot.get("caches", {}).items():
+                entry = totals.get(cog)
+                if entry is None:
+                    entry = totals[cog] = [0] * len(stats)
+                for index, value in enumerate(stats):
+                    entry[index] += value
+        return totals
+
+    def cogs(self, commands):
+        totals = {}
+        for (cog, _), (calls, errors, latency) in commands.items():
+            entry = totals.get(cog)
+            if entry is None:
+                entry = totals[cog] = [0, 0, Histogram()]
+            entry[0] += calls
+            entry[1] += errors
+            entry[2].merge(latency.snapshot())
+        return totals
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _histogram_lines(name, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels}le="{bound / 1000:g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {histogram.count}')
+    series = f"{{{labels.rstrip(',')}}}" if labels else ""
+    lines.append(f"{name}_sum{series} {histogram.total / 1000:.6f}")
+    lines.append(f"{name}_count{series} {histogram.count}")
+    return lines
+
+
+def render_prometheus(summary):
+    commands, loop_lag = summary.merged()
+    lines = [
+        "# HELP discord_bot_command_calls_total Commands invoked.",
+        "# TYPE discord_bot_command_calls_total counter",
+    ]
+    labels = {key: f'cog="{_label(key[0])}",command="{_label(key[1])}",' for key in commands}
+    for key, (calls, _, _) in commands.items():
+        lines.append(f"discord_bot_command_calls_total{{{labels[key].rstrip(',')}}} {calls}")
+    lines += [
+        "# HELP discord_bot_command_errors_total Commands that raised or failed a check.",
+        "# TYPE discord_bot_command_errors_total counter",
+    ]
+    for key, (_, errors, _) in commands.items():
+        lines.append(f"discord_bot_command_errors_total{{{labels[key].rstrip(',')}}} {errors}")
+    lines += [
+        "# HELP discord_bot_command_duration_seconds Time spent in command bodies and hooks.",
+        "# TYPE discord_bot_command_duration_seconds histogram",
+    ]
+    for key, (_, _, latency) in commands.items():
+        lines += _histogram_lines("discord_bot_command_duration_seconds", labels[key], latency)
+    lines += [
+        "# HELP discord_bot_event_loop_lag_seconds How late the bot's event loop woke a timer.",
+        "# TYPE discord_bot_event_loop_lag_seconds histogram",
+    ]
+    lines += _histogram_lines("discord_bot_event_loop_lag_seconds", "", loop_lag)
+    sender = summary.sender()
+    for name, kind, text, value in (
+        ("discord_bot_messages_sent_total", "counter", "Messages sent through the send scheduler.", sender.sent),
+        ("discord_bot_messages_merged_total", "counter", "Replies merged into another message.", sender.merged),
+        ("discord_bot_rate_limited_total", "counter", "429 responses to REST requests.", sender.rate_limited),
+        ("discord_bot_send_throttled_total", "counter", "Times a channel queue waited for its rate limit bucket.", sender.throttled),
+        ("discord_bot_send_queue_depth", "gauge", "Messages waiting in send queues.", sender.depth),
+    ):
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    lines += [
+        "# HELP discord_bot_send_wait_seconds Time messages spent queued before being sent.",
+        "# TYPE discord_bot_send_wait_seconds histogram",
+    ]
+    lines += _histogram_lines("discord_bot_send_wait_seconds", "", sender.wait)
+    caches = summary.caches()
+    for index, name, kind, text in (
+        (0, "discord_bot_cache_hits_total", "counter", "Cached calls answered from a cog's cache."),
+        (1, "discord_bot_cache_misses_total", "counter", "Cached calls that ran the function."),
+        (2, "discord_bot_cache_evictions_total", "counter", "Cache entries dropped for size, age or the memory budget."),
+        (3, "discord_bot_cache_coalesced_total", "counter", "Calls that shared an identical call already running."),
+        (4, "discord_bot_cache_entries", "gauge", "Entries held in a cog's caches."),
+        (5, "discord_bot_cache_bytes", "gauge", "Estimated size of a cog's cached values."),
+        (6, "discord_bot_cache_budget_bytes", "gauge", "A cog's cache memory budget."),
+    ):
+        lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        for cog, stats in caches.items():
+            lines.append(f'{name}{{cog="{_label(cog)}"}} {stats[index]}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer(threading.Thread):
+    # Serves render() as Prometheus text on http://host:port/metrics.
+    def __init__(self, render, host="127.0.0.1", port=9464):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        super().__init__(name="metrics-server", daemon=True)
+        render_text = render
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,51 @@
+import time
+
+MODES = ("all", "commands", "sample", "rate", "off")
+
+
+class MessageLogPolicy:
+    # Decides in on_message whether a message gets a log line at all, before anything is
+    # formatted or queued. Messages dropped by the rate limit are counted so a periodic
+    # summary can report them.
+    def __init__(self, prefix="!", mode="all", sample_every=100, rate=20.0, burst=None):
+        self.prefix = prefix
+        self.suppressed = 0
+        self.configure(mode, sample_every, rate, burst)
+
+    def configure(self, mode="all", sample_every=100, rate=20.0, burst=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown message log mode {mode}")
+        self.mode = mode
+        self.sample_every = max(1, int(sample_every))
+        self.rate = max(0.0, float(rate))
+        self.burst = max(1.0, float(burst) if burst is not None else self.rate * 2)
+        self.tokens = self.burst
+        self._refilled = time.monotonic()
+        self._seen = 0
+
+    def settings(self):
+        return {"mode": self.mode, "sample_every": self.sample_every, "rate": self.rate, "burst": self.burst}
+
+    def allow(self, content):
+        mode = self.mode
+        if mode == "all":
+            return True
+        if mode == "off":
+            return False
+        if mode == "commands":
+            return content.startswith(self.prefix)
+        if mode == "sample":
+            self._seen += 1
+            return self._seen % self.sample_every == 1 % self.sample_every
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def take_suppressed(self):
+        suppressed, self.suppressed = self.suppressed, 0
+        return suppressed
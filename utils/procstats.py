@@ -0,0 +1,15 @@
+import os
+
+
+def process_stats(pid):
+    # (cpu seconds, rss bytes) from /proc; None where that is not available. Used by the
+    # supervisor for its workers and by the workers themselves for their metrics.
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            resident = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    return (int(fields[11]) + int(fields[12])) / ticks, resident * os.sysconf("SC_PAGE_SIZE")
@@ -0,0 +1,222 @@
+import asyncio
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.01
+# A forgotten profiler stops sampling on its own; what it collected is kept until stop().
+MAX_DURATION = 600.0
+MAX_DEPTH = 128
+# Distinct stacks kept; further new ones are counted under their task as "(truncated)".
+MAX_STACKS = 50000
+IDLE = "(idle)"
+CALLBACKS = "(callbacks)"
+_DEFAULT_TASK_NAME = re.compile(r"Task-\d+$")
+_PSEUDO_FRAMES = ("task:", "cog:", "command:")
+# Every callback on the loop runs under this frame; what is above it is the same each time.
+_LOOP_ENTRY = asyncio.events.Handle._run.__code__
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def task_label(task):
+    # Tasks left with asyncio's numbered default name are labelled by their coroutine, so
+    # samples from many short-lived tasks of the same kind add up.
+    name = task.get_name()
+    if _DEFAULT_TASK_NAME.match(name):
+        coro = task.get_coro()
+        name = getattr(coro, "__qualname__", None) or type(coro).__name__
+    return name
+
+
+class SamplingProfiler:
+    # Looks at the event loop thread's stack from a background thread every ``interval``
+    # seconds and counts each distinct stack, flamegraph style: root first, frames joined by
+    # ";". The stack is prefixed with pseudo-frames for the running task and, where one is
+    # on the stack, the cog module and the command being invoked. Nothing is installed while
+    # the profiler is off, so it costs nothing until started.
+    #
+    # Samples only land when the loop thread lets go of the GIL, mostly in select(), so they
+    # overstate idle time badly. How busy the loop was is measured separately: the time spent
+    # in the loop's selector is idle, the rest is busy.
+    def __init__(self):
+        self.stacks = Counter()
+        self.samples = 0
+        self.interval = DEFAULT_INTERVAL
+        self.started = None
+        self.sampling_stopped = None
+        self.idle_seconds = None
+        self._loop = None
+        self._selector = None
+        self._thread_id = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=DEFAULT_INTERVAL):
+        # Called on the event loop thread; that is the thread that gets sampled.
+        if self.running:
+            raise RuntimeError("The profiler is already running")
+        self.stacks = Counter()
+        self.samples = 0
+        self.interval = max(0.001, float(interval))
+        self.started = time.monotonic()
+        self.sampling_stopped = None
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._time_selector()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # {"samples", "seconds", "interval", "stacks": [[stack, count], ...]}
+        if not self.running:
+            raise RuntimeError("The profiler is not running")
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self._selector is not None:
+            # Uncovers the selector class's own select() again.
+            del self._selector.select
+            self._selector = None
+        ended = self.sampling_stopped or time.monotonic()
+        seconds = ended - self.started
+        result = {
+            "samples": self.samples, "seconds": seconds, "interval": self.interval,
+            # Loop time outside the selector; None where the loop has no selector (uvloop).
+            "busy_seconds": None if self.idle_seconds is None else max(0.0, seconds - self.idle_seconds),
+            "stacks": [[stack, count] for stack, count in self.stacks.items()],
+        }
+        self.stacks = Counter()
+        return result
+
+    def _time_selector(self):
+        self.idle_seconds = None
+        selector = getattr(self._loop, "_selector", None)
+        if selector is None:
+            return
+        select = selector.select
+        self.idle_seconds = 0.0
+
+        def timed_select(timeout=None):
+            started = time.monotonic()
+            try:
+                return select(timeout)
+            finally:
+                if self.sampling_stopped is None:
+                    self.idle_seconds += time.monotonic() - started
+
+        selector.select = timed_select
+        self._selector = selector
+
+    def _run(self):
+        deadline = self.started + MAX_DURATION
+        while not self._stop.wait(self.interval):
+            if time.monotonic() >= deadline:
+                self.sampling_stopped = deadline
+                return
+            self.sample()
+
+    def sample(self):
+        frame = sys._current_frames().get(self._thread_id)
+        if frame is None:
+            return
+        frames = []
+        cog = command = None
+        while frame is not None and frame.f_code is not _LOOP_ENTRY:
+            frames.append(frame)
+            module = frame.f_globals.get("__name__", "")
+            if module.startswith("cogs."):
+                # The outermost cog frame wins: the cog that was entered, not its helpers.
+                cog = module[5:]
+            elif command is None and frame.f_code.co_name == "invoke" and module == "discord.ext.commands.core":
+                ctx = frame.f_locals.get("ctx")
+                if ctx is not None and ctx.command is not None:
+                    command = ctx.command.qualified_name
+            frame = frame.f_back
+        task = asyncio.current_task(self._loop)
+        if task is not None:
+            root = "task:" + task_label(task)
+        elif frames and frames[0].f_globals.get("__name__") == "selectors":
+            # Waiting for I/O: counted, but not worth a stack.
+            self._add(IDLE)
+            return
+        else:
+            root = "task:" + CALLBACKS
+        parts = [root]
+        if cog is not None:
+            parts.append("cog:" + cog)
+        if command is not None:
+            parts.append("command:" + command)
+        parts.extend(frame_label(frame) for frame in reversed(frames[:MAX_DEPTH]))
+        self._add(";".join(parts), root)
+
+    def _add(self, stack, root=None):
+        self.samples += 1
+        if stack not in self.stacks and len(self.stacks) >= MAX_STACKS:
+            stack = f"{root or IDLE};(truncated)"
+        self.stacks[stack] += 1
+
+
+def collapsed_lines(stacks):
+    # The stacks as a .folded file for flamegraph.pl, speedscope or inferno.
+    return [f"{stack} {count}" for stack, count in sorted(stacks.items())]
+
+
+def summarize(stacks, top=15):
+    # Busiest tasks, cogs and commands (samples anywhere under them) and functions (samples
+    # where they were the innermost frame), as [[name, samples], ...]. Idle samples are only
+    # counted in "idle".
+    tasks, cogs, commands, functions = Counter(), Counter(), Counter(), Counter()
+    idle = 0
+    for stack, count in stacks.items():
+        parts = stack.split(";")
+        if parts[-1] == IDLE:
+            idle += count
+            continue
+        for part in parts:
+            if part.startswith("task:"):
+                tasks[part[5:]] += count
+            elif part.startswith("cog:"):
+                cogs[part[4:]] += count
+            elif part.startswith("command:"):
+                commands[part[8:]] += count
+        if not parts[-1].startswith(_PSEUDO_FRAMES):
+            functions[parts[-1]] += count
+    return {
+        "idle": idle,
+        "tasks": [list(item) for item in tasks.most_common(top)],
+        "cogs": [list(item) for item in cogs.most_common(top)],
+        "commands": [list(item) for item in commands.most_common(top)],
+        "functions": [list(item) for item in functions.most_common(top)],
+    }
+
+
+def format_summary(name, result):
+    # Lines for botctl and the manager.
+    samples = result["samples"]
+    if result.get("busy") is not None:
+        load = f"event loop {result['busy'] * 100:.0f}% busy"
+    else:
+        # Only the share of samples; idle is overstated, see SamplingProfiler.
+        load = f"~{result['top']['idle'] * 100 / samples if samples else 0:.0f}% of samples idle (approximate)"
+    lines = [f"{name}: {samples} samples over {result['seconds']:.1f} s, {load}"]
+    if result.get("path"):
+        lines.append(f"Collapsed stacks: {result['path']}")
+    for section, title in (("cogs", "Cogs"), ("commands", "Commands"), ("tasks", "Tasks"), ("functions", "Functions (self)")):
+        rows = result["top"][section]
+        if not rows:
+            continue
+        lines.append(title)
+        for label, count in rows:
+            lines.append(f"  {count * 100 / samples:5.1f}%  {count:>7}  {label}")
+    return lines
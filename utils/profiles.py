@@ -0,0 +1,65 @@
+import json
+import os
+
+# Named bot profiles shared by the GUI, the daemon and the CLI.
+COG_LOAD_CONCURRENCY = 8
+BOTS_FILE = "bots.json"
+DEFAULT_BOT = "main"
+DEFAULT_LAUNCH_OPTIONS = {
+    "cog_concurrency": COG_LOAD_CONCURRENCY, "sharded": False, "shard_count": None, "processes": 1,
+    "message_log": {"mode": "all", "sample_every": 100, "rate": 20.0},
+    # None loads every cog; limits are enforced by the supervisor.
+    "cogs": None, "max_rss_mb": 0, "nice": 0,
+    # Paces and optionally merges cog replies per channel (utils.sender).
+    "send_scheduler": True,
+    # One of CACHE_PROFILES.
+    "cache_profile": "balanced",
+}
+# What the gateway connection keeps in memory, set together because they depend on each
+# other: members are only cached for the events the intents deliver, and guilds can only be
+# chunked with the members intent. Intents are discord.Intents.default() plus message_content,
+# adjusted by "intents_on" and "intents_off". "member_cache" names discord.MemberCacheFlags,
+# None meaning whatever the intents allow.
+CACHE_PROFILES = {
+    # Prefix commands only: no message cache, no member cache, no chunking.
+    "minimal": {
+        "intents_on": [],
+        "intents_off": [
+            "typing", "reactions", "voice_states", "invites", "integrations", "webhooks",
+            "guild_scheduled_events", "auto_moderation", "polls",
+        ],
+        "max_messages": None, "member_cache": [], "chunk_guilds": False,
+    },
+    # discord.py's defaults without privileged intents.
+    "balanced": {"intents_on": [], "intents_off": [], "max_messages": 1000, "member_cache": None, "chunk_guilds": False},
+    # Every member of every guild, fetched at startup. Needs the Server Members Intent enabled
+    # for the bot in the Discord developer portal.
+    "full": {"intents_on": ["members"], "intents_off": [], "max_messages": 5000, "member_cache": None, "chunk_guilds": True},
+}
+
+
+def load_bot_profiles(path=BOTS_FILE):
+    # {bot name: launch options}. Tokens are not stored here but in the encrypted token file.
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)["bots"]
+    except (OSError, ValueError, KeyError, TypeError):
+        stored = {}
+    profiles = {name: dict(DEFAULT_LAUNCH_OPTIONS, **options) for name, options in stored.items()}
+    return profiles or {DEFAULT_BOT: dict(DEFAULT_LAUNCH_OPTIONS)}
+
+
+def save_bot_profiles(profiles, path=BOTS_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"bots": profiles}, f, indent=2)
+    os.replace(tmp, path)
+
+
+def parse_tokens(stored, default):
+    # The token file holds a JSON map of bot name to token; older files hold a single token.
+    if not stored:
+        return {}
+    if stored.startswith("{"):
+        return json.loads(stored)
+    return {default: stored}
@@ -0,0 +1,188 @@
+import itertools
+import json
+import os
+import secrets
+import socket
+import sys
+import threading
+import time
+
+# Newline-delimited JSON over a Unix socket (TCP on localhost where AF_UNIX is missing).
+# Requests are {"id", "method", "params"}, replies {"id", "result"} or {"id", "error"},
+# and the daemon pushes {"event", "data"} frames to subscribed clients.
+DEFAULT_ADDRESS = "bot-daemon.sock" if hasattr(socket, "AF_UNIX") and sys.platform != "win32" else "127.0.0.1:9465"
+MAX_FRAME = 64 * 2**20
+SPAWN_TIMEOUT = 10.0
+# Anyone can reach a TCP port, so TCP clients first send {"method": "auth"} with a shared
+# secret: BOT_DAEMON_SECRET if set, else the contents of SECRET_FILE, which the daemon
+# creates readable by its own user only.
+SECRET_ENV = "BOT_DAEMON_SECRET"
+SECRET_FILE = "bot-daemon.secret"
+
+
+class RpcError(Exception):
+    pass
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+def tcp_address(address):
+    # (host, port) for "host:port", None for a Unix socket path.
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address and os.sep not in address:
+        return host, int(port)
+    return None
+
+
+def load_secret(create=False):
+    secret = os.environ.get(SECRET_ENV)
+    if secret:
+        return secret
+    try:
+        with open(SECRET_FILE, encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        if not create:
+            raise RpcError(f"No daemon secret: set {SECRET_ENV} or copy the daemon's {SECRET_FILE} here")
+    secret = secrets.token_urlsafe(32)
+    try:
+        fd = os.open(SECRET_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return load_secret()
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(secret + "\n")
+    return secret
+
+
+def connect(address, timeout=5.0):
+    tcp = tcp_address(address)
+    if tcp is not None:
+        return socket.create_connection(tcp, timeout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(address)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class RpcClient:
+    # Connection to a running daemon. call() does not block: its callback gets
+    # (result, error) on the reader thread, like on_event(event, data) and on_close().
+    # request() blocks until the reply arrives.
+    def __init__(self, address=DEFAULT_ADDRESS, on_event=None, on_close=None, timeout=5.0):
+        self.address = address
+        self.on_event = on_event
+        self.on_close = on_close
+        self.closed = False
+        self.sock = connect(address, timeout)
+        self.sock.settimeout(None)
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, name="rpc-reader", daemon=True)
+        self._reader.start()
+        if tcp_address(address) is not None:
+            try:
+                self.request("auth", timeout=timeout, secret=load_secret())
+            except RpcError:
+                # Not connected as far as the caller knows, so no on_close either.
+                self.on_close = None
+                self.close()
+                raise
+
+    def call(self, method, callback=None, **params):
+        request_id = next(self._ids)
+        if callback is not None:
+            with self._lock:
+                self._pending[request_id] = callback
+        try:
+            with self._send_lock:
+                self.sock.sendall(encode({"id": request_id, "method": method, "params": params}))
+        except OSError as e:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            if callback is not None:
+                callback(None, f"Daemon connection lost: {e}")
+
+    def request(self, method, timeout=30.0, **params):
+        done = threading.Event()
+        reply = {}
+
+        def finished(result, error):
+            reply.update(result=result, error=error)
+            done.set()
+
+        self.call(method, finished, **params)
+        if not done.wait(timeout):
+            raise RpcError(f"{method} timed out")
+        if reply["error"] is not None:
+            raise RpcError(reply["error"])
+        return reply["result"]
+
+    def _read(self):
+        try:
+            with self.sock.makefile("rb") as f:
+                for line in f:
+                    message = json.loads(line)
+                    if "event" in message:
+                        if self.on_event is not None:
+                            self.on_event(message["event"], message.get("data"))
+                        continue
+                    with self._lock:
+                        callback = self._pending.pop(message.get("id"), None)
+                    if callback is not None:
+                        callback(message.get("result"), message.get("error"))
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.closed = True
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            for callback in pending.values():
+                callback(None, "Daemon connection closed")
+            if self.on_close is not None:
+                self.on_close()
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def spawn_daemon(address=DEFAULT_ADDRESS):
+    # Starts daemon.py in its own session so it outlives the client that started it.
+    import subprocess
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "daemon.py")
+    with open(os.devnull, "wb") as devnull:
+        return subprocess.Popen(
+            [sys.executable, script, "--address", address], stdin=subprocess.DEVNULL, stdout=devnull, stderr=devnull,
+            start_new_session=True,
+        )
+
+
+def connect_or_spawn(address=DEFAULT_ADDRESS, timeout=SPAWN_TIMEOUT, **client_args):
+    # Connects to the daemon at ``address``, starting one first when nobody is listening.
+    try:
+        return RpcClient(address, **client_args)
+    except OSError:
+        pass
+    process = spawn_daemon(address)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return RpcClient(address, **client_args)
+        except OSError:
+            if process.poll() is not None:
+                raise RpcError(f"Daemon exited with code {process.returncode}")
+            if time.monotonic() >= deadline:
+                raise RpcError("Daemon did not start in time")
+            time.sleep(0.1)
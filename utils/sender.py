@@ -0,0 +1,154 @@
+import asyncio
+import re
+import time
+from collections import deque
+
+# Discord's documented limit for message content.
+MAX_CONTENT = 2000
+# Assumed for a channel until its first response carries X-RateLimit headers.
+DEFAULT_LIMIT = 5
+DEFAULT_PERIOD = 5.0
+_MESSAGES_ROUTE = re.compile(r"/channels/(\d+)/messages$")
+
+
+class RouteBucket:
+    # What Discord last reported for one channel's message route, plus the sends made since.
+    __slots__ = ("limit", "remaining", "reset_at")
+
+    def __init__(self):
+        self.limit = DEFAULT_LIMIT
+        self.remaining = DEFAULT_LIMIT
+        self.reset_at = 0.0
+
+    def delay(self, now):
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + DEFAULT_PERIOD
+            return 0.0
+        return 0.0 if self.remaining > 0 else self.reset_at - now
+
+
+class PendingSend:
+    __slots__ = ("destination", "content", "kwargs", "merge", "future", "queued")
+
+    def __init__(self, destination, content, kwargs, merge, future):
+        self.destination = destination
+        self.content = content
+        self.kwargs = kwargs
+        self.merge = merge
+        self.future = future
+        self.queued = time.perf_counter()
+
+
+class SendScheduler:
+    # Outbound messages go through one queue per channel, drained by one task per busy channel
+    # in order. Sends are paced from the X-RateLimit headers Discord returned for that channel
+    # (read through an aiohttp trace), so a burst waits in the queue instead of running into
+    # 429s. While sends wait, queued replies sent with merge=True are joined into one message.
+    # Counters go to BotMetrics.sender and from there to the manager with the other metrics.
+    def __init__(self, stats, enabled=True):
+        self.stats = stats
+        self.enabled = enabled
+        self.queues = {}
+        self.buckets = {}
+        self.global_reset_at = 0.0
+        self._tasks = {}
+
+    def trace_config(self):
+        # Passed to the bot as http_trace; sees every REST response with its headers.
+        import aiohttp
+        trace = aiohttp.TraceConfig()
+        trace.on_request_end.append(self._on_request_end)
+        return trace
+
+    async def _on_request_end(self, session, context, params):
+        response = params.response
+        headers = response.headers
+        if response.status == 429 and headers.get("X-RateLimit-Global"):
+            self.stats.rate_limited += 1
+            self.global_reset_at = time.monotonic() + float(headers.get("Retry-After") or 1)
+            return
+        match = _MESSAGES_ROUTE.search(params.url.path)
+        if params.method != "POST" or match is None or "X-RateLimit-Remaining" not in headers:
+            return
+        channel_id = int(match.group(1))
+        bucket = self.buckets.get(channel_id)
+        if bucket is None:
+            bucket = self.buckets[channel_id] = RouteBucket()
+        bucket.limit = int(headers.get("X-RateLimit-Limit", bucket.limit))
+        bucket.remaining = int(headers["X-RateLimit-Remaining"])
+        bucket.reset_at = time.monotonic() + float(headers.get("X-RateLimit-Reset-After", DEFAULT_PERIOD))
+        if response.status == 429:
+            self.stats.rate_limited += 1
+            bucket.remaining = 0
+
+    def send(self, destination, content=None, merge=False, **kwargs):
+        # Queues a message for ``destination`` (a channel or a Context) and returns a future
+        # for the discord.Message that carried it. Only plain text can be merged; with merge
+        # the content may share a message with other merged replies.
+        if not self.enabled:
+            self.stats.sent += 1
+            return asyncio.ensure_future(destination.send(content, **kwargs))
+        future = asyncio.get_running_loop().create_future()
+        channel = getattr(destination, "channel", destination)
+        channel_id = channel.id
+        queue = self.queues.get(channel_id)
+        if queue is None:
+            queue = self.queues[channel_id] = deque()
+        merge = merge and not kwargs and content is not None and len(str(content)) <= MAX_CONTENT
+        queue.append(PendingSend(destination, content, kwargs, merge, future))
+        self.stats.depth += 1
+        if channel_id not in self._tasks:
+            self._tasks[channel_id] = asyncio.create_task(self._drain(channel_id, queue))
+        return future
+
+    def _take(self, queue):
+        # The next message to send: one queued send, or several merged ones in order.
+        first = queue.popleft()
+        batch = [first]
+        if first.merge:
+            length = len(str(first.content))
+            while queue and queue[0].merge and length + 1 + len(str(queue[0].content)) <= MAX_CONTENT:
+                length += 1 + len(str(queue[0].content))
+                batch.append(queue.popleft())
+        return batch
+
+    async def _drain(self, channel_id, queue):
+        try:
+            while queue:
+                now = time.monotonic()
+                bucket = self.buckets.get(channel_id)
+                delay = max(self.global_reset_at - now, bucket.delay(now) if bucket is not None else 0.0)
+                if delay > 0:
+                    self.stats.throttled += 1
+                    await asyncio.sleep(delay)
+                    continue
+                batch = self._take(queue)
+                self.stats.depth -= len(batch)
+                started = time.perf_counter()
+                for item in batch:
+                    self.stats.wait.record((started - item.queued) * 1000)
+                if bucket is not None:
+                    bucket.remaining -= 1
+                first = batch[0]
+                content = "\n".join(str(item.content) for item in batch) if len(batch) > 1 else first.content
+                try:
+                    message = await first.destination.send(content, **first.kwargs)
+                except Exception as e:
+                    for item in batch:
+                        if not item.future.done():
+                            item.future.set_exception(e)
+                    continue
+                self.stats.sent += 1
+                self.stats.merged += len(batch) - 1
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_result(message)
+        finally:
+            del self._tasks[channel_id]
+            if not queue:
+                self.queues.pop(channel_id, None)
+
+    def close(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+BATCH_SIZE = 1000
+CACHE_SIZE = 10000
+_MISSING = object()
+
+
+class StorageError(Exception):
+    pass
+
+
+class Namespace:
+    # The key/value view a cog gets from Storage.namespace(); keys are strings, values
+    # anything json can encode.
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.name = name
+
+    async def get(self, key, default=None):
+        return await self.storage.get(self.name, key, default)
+
+    def set(self, key, value):
+        return self.storage.set(self.name, key, value)
+
+    def delete(self, key):
+        return self.storage.delete(self.name, key)
+
+    async def update(self, key, func, default=None):
+        return await self.storage.update(self.name, key, func, default)
+
+    async def incr(self, key, amount=1):
+        return await self.storage.update(self.name, key, lambda value: value + amount, 0)
+
+    async def items(self):
+        return await self.storage.items(self.name)
+
+
+class Storage:
+    # SQLite-backed state for cogs, shared through bot.storage. Every statement runs on one
+    # writer thread, in submission order: whatever is queued when it wakes up goes into a
+    # single transaction, and repeated writes to a key inside it collapse into one. set() and
+    # delete() update the read-through cache at once, so get() sees them before they are on
+    # disk; await their result to wait for the commit. Nothing here blocks the event loop.
+    # The cache is per process: shard workers share the file but not each other's writes.
+    def __init__(self, path, batch_size=BATCH_SIZE, cache_size=CACHE_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.batches = 0
+        self.writes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # (namespace, key) -> [asyncio.Lock, holders and waiters], for update().
+        self._locks = {}
+        self._jobs = queue.Queue()
+        self._loop = None
+        self._thread = None
+        # Set when the writer could not open the database.
+        self._error = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    def namespace(self, name):
+        return Namespace(self, name)
+
+    def _submit(self, op, *args):
+        if self._error is not None:
+            raise StorageError(f"Storage is unavailable: {self._error}") from self._error
+        if self._thread is None:
+            raise StorageError("Storage is not running")
+        future = self._loop.create_future()
+        self._jobs.put((op, args, future))
+        return future
+
+    def _cache_put(self, key, encoded):
+        self.cache[key] = encoded
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def get(self, namespace, key, default=None):
+        cache_key = (namespace, key)
+        encoded = self.cache.get(cache_key, _MISSING)
+        if encoded is _MISSING:
+            self.cache_misses += 1
+            # Queued behind any earlier writes, so the row read is never older than the cache.
+            encoded = await self._submit("get", namespace, key)
+            # A set() or delete() made while the read was queued is newer than the row.
+            cached = self.cache.get(cache_key, _MISSING)
+            if cached is _MISSING:
+                self._cache_put(cache_key, encoded)
+            else:
+                encoded = cached
+        else:
+            self.cache_hits += 1
+            self.cache.move_to_end(cache_key)
+        return default if encoded is None else json.loads(encoded)
+
+    def set(self, namespace, key, value):
+        encoded = json.dumps(value, separators=(",", ":"))
+        self._cache_put((namespace, key), encoded)
+        return self._submit("put", namespace, key, encoded)
+
+    def delete(self, namespace, key):
+        self._cache_put((namespace, key), None)
+        return self._submit("put", namespace, key, None)
+
+    async def update(self, namespace, key, func, default=None):
+        # Read-modify-write of one key: stores and returns func(current value). Updates of the
+        # same key run one after another, so none is lost; returns once the write is committed.
+        lock_key = (namespace, key)
+        entry = self._locks.get(lock_key)
+        if entry is None:
+            entry = self._locks[lock_key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                value = func(await self.get(namespace, key, default))
+                committed = self.set(namespace, key, value)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[lock_key]
+        await committed
+        return value
+
+    async def items(self, namespace):
+        rows = await self._submit("query", "SELECT key, value FROM kv WHERE namespace = ? ORDER BY key", (namespace,))
+        return {key: json.loads(value) for key, value in rows}
+
+    def execute(self, sql, params=()):
+        # For a cog's own tables: CREATE TABLE IF NOT EXISTS, INSERT, UPDATE... Batched with
+        # everything else; resolves to the number of changed rows once committed.
+        return self._submit("execute", sql, params)
+
+    def executemany(self, sql, rows):
+        return self._submit("executemany", sql, list(rows))
+
+    async def fetchall(self, sql, params=()):
+        return await self._submit("query", sql, params)
+
+    async def close(self):
+        # Commits everything queued so far and stops the writer.
+        if self._thread is None:
+            return
+        thread, self._thread = self._thread, None
+        self._jobs.put(None)
+        await self._loop.run_in_executor(None, thread.join)
+
+    def _connect(self):
+        import sqlite3
+        db = sqlite3.connect(self.path, isolation_level=None)
+        # WAL keeps the file consistent after a crash; NORMAL skips an fsync per commit.
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA busy_timeout=5000")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS kv (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        return db
+
+    def _run(self):
+        try:
+            db = self._connect()
+        except Exception as e:
+            self._loop.call_soon_threadsafe(self._writer_failed, e)
+            return
+        try:
+            stopping = False
+            while not stopping:
+                batch = [self._jobs.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._jobs.get_nowait())
+                    except queue.Empty:
+                        break
+                if None in batch:
+                    stopping = True
+                    batch = [job for job in batch if job is not None]
+                if batch:
+                    self._apply(db, batch)
+        finally:
+            db.close()
+
+    def _apply(self, db, batch):
+        results = []
+        puts = {}
+
+        def flush_puts():
+            # Only the last write to each key in a batch reaches SQLite.
+            deletes = [key for key, value in puts.items() if value is None]
+            if deletes:
+                db.executemany("DELETE FROM kv WHERE namespace = ? AND key = ?", deletes)
+            upserts = [key + (value,) for key, value in puts.items() if value is not None]
+            if upserts:
+                db.executemany("INSERT OR REPLACE INTO kv (namespace, key, value) VALUES (?, ?, ?)", upserts)
+            self.writes += len(puts)
+            puts.clear()
+
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for op, args, future in batch:
+                if op == "put":
+                    namespace, key, encoded = args
+                    puts[(namespace, key)] = encoded
+                    results.append((future, None, None))
+                    continue
+                flush_puts()
+                try:
+                    if op == "get":
+                        row = db.execute("SELECT value FROM kv WHERE namespace = ? AND key = ?", args).fetchone()
+                        result = row[0] if row else None
+                    elif op == "query":
+                        result = db.execute(*args).fetchall()
+                    elif op == "execute":
+                        result = db.execute(*args).rowcount
+                    else:
+                        result = db.executemany(*args).rowcount
+                    results.append((future, result, None))
+                except Exception as e:
+                    # One bad statement fails its own caller, not the rest of the batch.
+                    results.append((future, None, e))
+            flush_puts()
+            db.execute("COMMIT")
+            self.batches += 1
+        except Exception as e:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            results = [(future, None, e) for _, _, future in batch]
+            failed = [(args[0], args[1]) for op, args, _ in batch if op == "put"]
+            self._loop.call_soon_threadsafe(self._finish, results, failed)
+            return
+        self._loop.call_soon_threadsafe(self._finish, results, ())
+
+    def _writer_failed(self, error):
+        # Runs on the event loop, like _submit, so no job can slip in after the queue is
+        # drained: everything queued fails with the error and later calls raise.
+        self._error = error
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None and not job[2].done():
+                job[2].set_exception(StorageError(f"Storage is unavailable: {error}"))
+
+    def _finish(self, results, failed):
+        # Runs on the event loop. Cached values of writes that were rolled back are dropped.
+        for key in failed:
+            self.cache.pop(key, None)
+        for future, result, error in results:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
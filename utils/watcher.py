@@ -0,0 +1,176 @@
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+EVENT_SIZE = struct.calcsize("iIII")
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+def hash_files(paths):
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        digest.update(os.fsencode(path) + b"\0")
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+    return digest.digest()
+
+
+class CogHashes:
+    # Content hashes of the cogs the bot has loaded. scan() reads the stat data of a CogIndex,
+    # only re-hashes extensions whose files changed and reports which ones need a reload,
+    # load or unload. A package extension is hashed over all of its files.
+    def __init__(self, index):
+        self.index = index
+        self.hashes = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def scan(self):
+        changes = {"reload": [], "load": [], "unload": []}
+        with self._lock:
+            extensions = self.index.extension_files()
+            for name, files in extensions.items():
+                key = tuple((entry.rel, entry.key) for entry in files)
+                if self._stats.get(name) == key:
+                    continue
+                self._stats[name] = key
+                try:
+                    digest = hash_files([self.index.path(entry.rel) for entry in files])
+                except OSError:
+                    continue
+                old = self.hashes.get(name)
+                if old != digest:
+                    self.hashes[name] = digest
+                    changes["reload" if old is not None else "load"].append(name)
+            for name in list(self.hashes):
+                if name not in extensions:
+                    del self.hashes[name]
+                    self._stats.pop(name, None)
+                    changes["unload"].append(name)
+        return changes
+
+    def reset(self):
+        with self._lock:
+            self.hashes.clear()
+            self._stats.clear()
+
+
+def _inotify():
+    # (libc, fd) for an inotify instance, or None where inotify is not available.
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        return libc, fd
+    except (OSError, AttributeError):
+        return None
+
+
+class CogWatcher(threading.Thread):
+    # Keeps a CogIndex current: waits for inotify events on every directory of the index on
+    # Linux (stat polling elsewhere), refreshes only the directories they name once things
+    # have been quiet for ``debounce`` seconds and reports the index changes.
+    def __init__(self, index, callback, debounce=0.2, poll_interval=0.5):
+        super().__init__(name="cog-watcher", daemon=True)
+        self.index = index
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._watches = {}
+        self._libc, self._fd = _inotify() or (None, None)
+        if self._fd is not None and not self._watch(index.directories):
+            os.close(self._fd)
+            self._fd = None
+
+    @property
+    def mode(self):
+        return "inotify" if self._fd is not None else "polling"
+
+    def _watch(self, dirs):
+        for rel in dirs:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(self.index.path(rel)), WATCH_MASK)
+            if wd < 0:
+                return False
+            self._watches[wd] = rel
+        return True
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                if self._fd is None:
+                    self._stop_event.wait(self.poll_interval)
+                    changes = self.index.refresh()
+                else:
+                    dirs = self._wait_for_events()
+                    if not dirs:
+                        continue
+                    changes = self.index.refresh(None if None in dirs else dirs)
+                    new_dirs = [entry.rel for entry in changes["added"] if entry.is_dir]
+                    if new_dirs and not self._watch(new_dirs):
+                        self._watches.clear()
+                        os.close(self._fd)
+                        self._fd = None
+                if any(changes.values()):
+                    self.callback(changes)
+        finally:
+            if self._fd is not None:
+                os.close(self._fd)
+
+    def _wait_for_events(self):
+        # Directories named by the events; None in the set means the queue overflowed.
+        readable, _, _ = select.select([self._fd], [], [], self.poll_interval)
+        if not readable:
+            return None
+        # Editors often write a file in several steps; wait until the events stop.
+        dirs = set()
+        deadline = time.monotonic() + self.debounce
+        while not self._stop_event.is_set():
+            self._drain(dirs)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return dirs
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if readable:
+                deadline = time.monotonic() + self.debounce
+        return None
+
+    def _drain(self, dirs):
+        try:
+            while True:
+                data = os.read(self._fd, 65536)
+                if not data:
+                    break
+                offset = 0
+                while offset + EVENT_SIZE <= len(data):
+                    wd, mask, _, length = struct.unpack_from("iIII", data, offset)
+                    offset += EVENT_SIZE + length
+                    if mask & IN_Q_OVERFLOW:
+                        dirs.add(None)
+                    elif mask & IN_IGNORED:
+                        self._watches.pop(wd, None)
+                    elif wd in self._watches:
+                        dirs.add(self._watches[wd])
+        except BlockingIOError:
+            pass
+
+    def stop(self):
+        self._stop_event.set()